@@ -0,0 +1,251 @@
+"""
+Профилирование выделений памяти мира (включается по требованию).
+
+Пока профилировщик подключён к миру (world.profiler), каждая фаза тика
+(клетки, физика, органика, сетка веществ, статистика) и сборка кадра
+измеряются:
+  * созданные объекты моделей — счётчики в конструкторах из COUNTED
+    (методы подменяются только на время профилирования);
+  * выделенные блоки памяти (sys.getallocatedblocks);
+  * прирост / пик памяти по tracemalloc (ALLOC_PROFILE_TRACEMALLOC —
+    трассировка замедляет тик в разы, без неё профилировщик можно
+    держать включённым неделями ради RSS).
+Раз в ALLOC_PROFILE_RSS_PERIOD тиков записывается RSS процесса, по ним
+считается скорость роста. В отчёт попадают места в коде, где память
+выросла сильнее всего с момента включения (сравнение снимков tracemalloc).
+
+Счётчики и tracemalloc общие для процесса: в воркере миры считаются по
+одному, поэтому фаза видит только свои выделения, а объекты, созданные
+в других потоках (пул миров, статистика), могут попасть в чужую фазу.
+"""
+import os
+import sys
+import time
+import tracemalloc
+from collections import Counter, deque
+
+from config import ALLOC_PROFILE_RSS_PERIOD, ALLOC_PROFILE_RSS_SAMPLES, ALLOC_PROFILE_TOP, \
+    ALLOC_PROFILE_TRACE_FRAMES, ALLOC_PROFILE_TRACEMALLOC
+from models.action import Action
+from models.cell import Cell
+from models.env_stats import EnvStats
+from models.gene import Gene
+from models.substance import Substance
+from models.trigger import Trigger
+
+# класс -> методы, которые создают экземпляры (Substance.from_id обходит __init__)
+COUNTED = {
+    Cell: ("__init__",),
+    Gene: ("__init__",),
+    Trigger: ("__init__",),
+    Action: ("__init__",),
+    Substance: ("__init__", "from_id"),
+    EnvStats: ("__init__",),
+}
+
+# созданные объекты по имени класса (пока подключён хотя бы один профилировщик)
+ALLOCATIONS: Counter = Counter()
+_active_profilers = 0
+_originals: dict = {}
+
+
+def _counting(name: str, method):
+    if isinstance(method, classmethod):
+        func = method.__func__
+
+        def counted_classmethod(cls, *args, **kwargs):
+            ALLOCATIONS[name] += 1
+            return func(cls, *args, **kwargs)
+        return classmethod(counted_classmethod)
+
+    def counted_init(self, *args, **kwargs):
+        ALLOCATIONS[name] += 1
+        return method(self, *args, **kwargs)
+    return counted_init
+
+
+def _install_counters():
+    for cls, methods in COUNTED.items():
+        for attr in methods:
+            original = cls.__dict__[attr]
+            _originals[cls, attr] = original
+            setattr(cls, attr, _counting(cls.__name__, original))
+
+
+def _uninstall_counters():
+    for (cls, attr), original in _originals.items():
+        setattr(cls, attr, original)
+    _originals.clear()
+
+
+def read_rss() -> int:
+    """Resident set size процесса в байтах (Linux — /proc, иначе пик из getrusage)."""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        import resource
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return rss if sys.platform == "darwin" else rss * 1024
+
+
+class PhaseStats:
+    __slots__ = ("calls", "seconds", "blocks", "net_bytes", "peak_bytes", "objects")
+
+    def __init__(self):
+        self.calls = 0
+        self.seconds = 0.0
+        self.blocks = 0       # сумма прироста числа выделенных блоков
+        self.net_bytes = 0    # сумма прироста памяти по tracemalloc
+        self.peak_bytes = 0   # наибольший пик внутри одного вызова
+        self.objects: Counter = Counter()
+
+    def to_dict(self) -> dict:
+        calls = max(self.calls, 1)
+        return {
+            "calls": self.calls,
+            "ms_per_call": round(self.seconds * 1000 / calls, 3),
+            "blocks_per_call": round(self.blocks / calls, 1),
+            "net_bytes_per_call": round(self.net_bytes / calls, 1),
+            "peak_bytes": self.peak_bytes,
+            "objects_per_call": {name: round(n / calls, 1) for name, n in self.objects.most_common()},
+        }
+
+
+class AllocationProfiler:
+    """Профилировщик одного мира: World.update вызывает фазы через measure()."""
+
+    def __init__(self, trace: bool = ALLOC_PROFILE_TRACEMALLOC):
+        self.trace = trace
+        self.phases: dict[str, PhaseStats] = {}
+        self.ticks = 0
+        self.started_at = 0.0
+        self.rss_samples: deque = deque(maxlen=ALLOC_PROFILE_RSS_SAMPLES)
+        self.baseline = None
+        self.owns_tracing = False
+        self.running = False
+
+    def start(self):
+        global _active_profilers
+        if self.running:
+            return
+        if self.trace and not tracemalloc.is_tracing():
+            tracemalloc.start(ALLOC_PROFILE_TRACE_FRAMES)
+            self.owns_tracing = True
+        if _active_profilers == 0:
+            _install_counters()
+        _active_profilers += 1
+        self.running = True
+        self.started_at = time.monotonic()
+        self.baseline = tracemalloc.take_snapshot() if self.trace else None
+        self.rss_samples.append((0, 0.0, read_rss()))
+
+    def stop(self):
+        global _active_profilers
+        if not self.running:
+            return
+        self.running = False
+        _active_profilers -= 1
+        if _active_profilers == 0:
+            _uninstall_counters()
+        if self.owns_tracing:
+            tracemalloc.stop()
+            self.owns_tracing = False
+        self.baseline = None
+
+    def measure(self, name: str, fn, *args):
+        """Выполняет фазу fn(*args) и записывает её выделения."""
+        if not self.running:
+            return fn(*args)
+        stats = self.phases.get(name)
+        if stats is None:
+            stats = self.phases[name] = PhaseStats()
+
+        trace = self.trace
+        objects_before = ALLOCATIONS.copy()
+        blocks_before = sys.getallocatedblocks()
+        if trace:
+            traced_before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        start = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            stats.seconds += time.perf_counter() - start
+            stats.calls += 1
+            stats.blocks += sys.getallocatedblocks() - blocks_before
+            stats.objects.update(ALLOCATIONS - objects_before)
+            if trace:
+                traced_after, peak = tracemalloc.get_traced_memory()
+                stats.net_bytes += traced_after - traced_before
+                stats.peak_bytes = max(stats.peak_bytes, peak - traced_before)
+
+    def end_tick(self, tick: int):
+        if not self.running:
+            return
+        self.ticks += 1
+        if self.ticks % ALLOC_PROFILE_RSS_PERIOD == 0:
+            self.rss_samples.append((self.ticks, time.monotonic() - self.started_at, read_rss()))
+
+    def rss_report(self) -> dict:
+        current = read_rss()
+        first_ticks, first_time, first_rss = self.rss_samples[0] if self.rss_samples else (0, 0.0, current)
+        elapsed = time.monotonic() - self.started_at - first_time
+        ticks = self.ticks - first_ticks
+        growth = current - first_rss
+        return {
+            "current": current,
+            "start": first_rss,
+            "growth": growth,
+            "growth_per_hour": round(growth * 3600 / elapsed) if elapsed > 0 else 0,
+            "growth_per_1000_ticks": round(growth * 1000 / ticks) if ticks else 0,
+            "samples": list(self.rss_samples),
+        }
+
+    def top_growth(self, limit: int = ALLOC_PROFILE_TOP) -> list:
+        """Места в коде с наибольшим приростом памяти с момента start()."""
+        if self.baseline is None:
+            return []
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ))
+        return [
+            {
+                "where": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+                "size_diff": stat.size_diff,
+                "count_diff": stat.count_diff,
+            }
+            for stat in snapshot.compare_to(self.baseline, "lineno")[:limit]
+        ]
+
+    def report(self) -> dict:
+        return {
+            "running": self.running,
+            "tracemalloc": self.trace,
+            "ticks": self.ticks,
+            "phases": {name: stats.to_dict() for name, stats in self.phases.items()},
+            "rss": self.rss_report(),
+            "top_growth": self.top_growth(),
+        }
+
+
+def format_report(report: dict) -> str:
+    """Текстовый вид отчёта для консоли."""
+    lines = [f"🧠 Выделения памяти за {report['ticks']} тиков:"]
+    for name, phase in report["phases"].items():
+        objects = ", ".join(f"{k}={v}" for k, v in phase["objects_per_call"].items()) or "-"
+        lines.append(
+            f"  {name:<10} {phase['ms_per_call']:8.3f} ms | {phase['blocks_per_call']:9.1f} blocks | "
+            f"{phase['net_bytes_per_call'] / 1024:8.1f} KiB net | peak {phase['peak_bytes'] / 1024:.1f} KiB | {objects}"
+        )
+    rss = report["rss"]
+    lines.append(
+        f"  RSS: {rss['current'] / 2**20:.1f} MiB (+{rss['growth'] / 2**20:.1f} MiB, "
+        f"{rss['growth_per_hour'] / 2**20:.1f} MiB/h, {rss['growth_per_1000_ticks'] / 1024:.1f} KiB/1000 ticks)"
+    )
+    if report["top_growth"]:
+        lines.append("  наибольший прирост памяти:")
+        for item in report["top_growth"]:
+            lines.append(f"    {item['size_diff'] / 1024:+10.1f} KiB {item['count_diff']:+8d} blocks  {item['where']}")
+    return "\n".join(lines)
@@ -0,0 +1,78 @@
+"""
+Замер памяти модели: сколько байт занимает одна клетка (с генами)
+и одна ячейка сетки веществ. Нужен для оценки, сколько миров
+поместится на одном сервере.
+
+    python benchmark.py [ticks]
+"""
+import random
+import sys
+import tracemalloc
+
+import config
+from config import WORLD_WIDTH, WORLD_HEIGHT
+from helpers import populate_world
+from models.substance_grid import SubstanceGrid
+from models.world import World
+
+
+def _traced_bytes(factory):
+    """Возвращает (результат factory(), сколько байт он занял)."""
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        result = factory()
+        after = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    return result, after - before
+
+
+def measure_memory(world: World) -> dict:
+    """
+    Меряет память клеток и сетки мира через tracemalloc:
+    клетки и сетка пересоздаются под трассировкой, чтобы учесть
+    все вложенные объекты (гены, триггеры, словари ячеек, индекс чанков).
+    """
+    env = world.env
+
+    cells, cells_bytes = _traced_bytes(lambda: [c.clone() for c in env.cells])
+    genes_total = sum(len(c.genes) for c in cells)
+
+    grid_data = env.grid.to_dict()
+    grid, grid_bytes = _traced_bytes(lambda: SubstanceGrid.from_dict(grid_data, env.config))
+    tiles = len(grid.grid)
+    substances_total = sum(len(t) for t in grid.grid.values())
+
+    return {
+        "cells": len(cells),
+        "genes_per_cell": genes_total / len(cells) if cells else 0.0,
+        "bytes_per_cell": cells_bytes / len(cells) if cells else 0.0,
+        "tiles": tiles,
+        "substances_per_tile": substances_total / tiles if tiles else 0.0,
+        "bytes_per_tile": grid_bytes / tiles if tiles else 0.0,
+        "world_bytes": cells_bytes + grid_bytes,
+    }
+
+
+def run_memory_benchmark(ticks: int = 500, seed: int = 1):
+    config.AUTO_SAVE = False
+    random.seed(seed)
+
+    world = World(WORLD_WIDTH, WORLD_HEIGHT)
+    populate_world(world)
+    for _ in range(ticks):
+        world.update()
+
+    report = measure_memory(world)
+    print(f"🧮 Память мира после {world.tick} тиков ({WORLD_WIDTH}×{WORLD_HEIGHT}):")
+    print(f"  cells: {report['cells']:6d} | {report['genes_per_cell']:.1f} genes/cell | "
+          f"{report['bytes_per_cell']:.0f} B/cell")
+    print(f"  tiles: {report['tiles']:6d} | {report['substances_per_tile']:.2f} subs/tile | "
+          f"{report['bytes_per_tile']:.0f} B/tile")
+    print(f"  total: {report['world_bytes'] / 1024:.1f} KiB (cells + grid)")
+    return report
+
+
+if __name__ == "__main__":
+    run_memory_benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 500)
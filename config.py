@@ -39,6 +39,14 @@ ACCELERATION_FACTOR: float = 0.07
 # максимальное изменение скорости за тик (кап по акселерации)
 MAX_ACCELERATION: float = 0.85
 
+# сон неподвижных клеток: клетка, у которой скорость SLEEP_TICKS тиков подряд ниже
+# SLEEP_VELOCITY и нет соседей в контакте, засыпает — движение и проверки
+# столкновений с другими спящими пропускаются, а остаточная скорость сохраняется:
+# проснувшись (контакт с соседом или ускорение от гена), клетка продолжает с ней.
+# 0 — сон выключен.
+SLEEP_VELOCITY: float = 0.005
+SLEEP_TICKS: int = 10
+
 # =============================================================================
 # ВРЕМЯ / ШАГИ СИМУЛЯЦИИ
 # =============================================================================
@@ -47,15 +55,100 @@ SIMULATION_STEPS: int = 1000  # сколько тиков просчитыват
 
 FPS: int = 60                 # целевой FPS для визуализации/цикла
 FRAME_TIME: float = 1 / FPS   # длительность кадра в секундах
+# кадры по сети: тики считаются каждые FRAME_TIME, а кадр клиенту уходит не чаще
+# NETWORK_FPS раз в секунду; фронт сглаживает движение клеток между кадрами по их
+# скорости (0 — кадр на каждый цикл, как раньше)
+NETWORK_FPS: float = 15
+
+MAX_TICKS_PER_FRAME: int = 100  # предел множителя скорости (тиков на кадр) для команды speed
+MAX_STEP_TICKS: int = 10000     # предел тиков за одну команду step
 
 SAVES_DIR: str = "saves/"     # директория для сохранений снапшотов мира
 
 AUTO_SAVE = True
 TICK_SAVE_PERIOD = 10000
 
+# заранее подготовленные миры для новых WebSocket-подключений (world_pool.py)
+WORLD_POOL_SIZE: int = 2
+WORLD_POOL_TEMPLATE: str | None = None  # путь к сохранению-шаблону; None — populate_world
+
+# планировщик миров (scheduler.py)
+SCHEDULER_WORKERS: int = 2           # процессов-воркеров с мирами; 0 — миры считаются в процессе сервера
+SCHEDULER_MAX_TPS: float = 600.0     # предел тиков в секунду на мир по умолчанию (0 — без предела)
+SCHEDULER_IDLE_SECONDS: float = 15.0     # клиент столько не подтверждал кадры — мир притормаживается
+SCHEDULER_IDLE_TPS: float = 5.0
+SCHEDULER_SUSPEND_SECONDS: float = 120.0  # ... а после этого ставится на паузу
+SCHEDULER_STATS_WINDOW: float = 10.0     # окно (сек) для загрузки воркеров и TPS в /admin/load
+# конвейер кадров:
+#   "serial"        — воркер после тиков сам собирает и кодирует кадр, а следующий
+#                     тик мира ждёт, пока кадр будет готов;
+#   "double_buffer" — воркер снимает с мира лёгкий неизменяемый снимок тика
+#                     (render.FrameView), JSON собирается и отправляется в потоке
+#                     сервера, пока воркер уже считает следующий тик. Кодирование
+#                     кадров всех миров переезжает в процесс сервера; числа снимка
+#                     лежат колонками array, из процесса-воркера он приходит одним
+#                     блоком байт почти без затрат на pickle.
+FRAME_PIPELINE: str = "serial"
+ADMIN_TOKEN: str | None = None       # если задан — нужен в заголовке X-Admin-Token для /admin/*
+# сессии: после отключения клиента мир сессии ждёт переподключения по токену (вкладка
+# хранит его в sessionStorage, перезагрузка страницы продолжает тот же мир). Мир без
+# клиента дольше SESSION_HIBERNATE_SECONDS выгружается из воркера в сжатый снимок
+# SAVES_DIR/sessions/<токен>.json.gz и загружается обратно при следующем обращении
+SESSION_HIBERNATE_SECONDS: float = 60.0
+SESSION_EXPIRE_SECONDS: float = 7 * 24 * 3600.0  # снимок брошенной сессии удаляется
+# оценка памяти миров в воркерах (байт); сверх неё выгружаются давно не использованные
+# миры без клиента или на паузе (см. SCHEDULER_SUSPEND_SECONDS); 0 — без предела
+SESSION_MEMORY_BUDGET: int = 1024 * 2**20
+SESSION_CELL_BYTES: int = 2400       # оценка памяти клетки и ячейки веществ (python benchmark.py)
+SESSION_TILE_BYTES: int = 420
+SESSION_SWEEP_SECONDS: float = 5.0   # как часто проверять простой и бюджет памяти
+
+# передача сохранений по HTTP (snapshots.py): по WebSocket идёт только одноразовый
+# токен, сам снимок скачивается / загружается потоком через /snapshots/<token>
+SNAPSHOT_TOKEN_TTL: float = 300.0         # сколько секунд токен действителен
+SNAPSHOT_CHUNK_BYTES: int = 256 * 1024    # размер куска при потоковой передаче
+SNAPSHOT_GZIP_LEVEL: int = 1              # сжатие файла снимка (1 — быстрое)
+
+# бинарный журнал событий (рождения, смерти, мутации, крупные выделения, органика)
+# пишется в SAVES_DIR/events_<uuid>.evlog; ключевой кадр — раз в EVENT_LOG_KEYFRAME_PERIOD тиков
+EVENT_LOG: bool = False
+EVENT_LOG_KEYFRAME_PERIOD: int = 500
+# позиции и скорости клеток пишутся раз в EVENT_LOG_MOTION_PERIOD тиков (0 — не писать):
+# между записями воспроизведение двигает клетки по скорости
+EVENT_LOG_MOTION_PERIOD: int = 10
+EVENT_LOG_EMIT_THRESHOLD: float = 5.0  # выделения меньше этого количества не пишутся
+
+# родословная клеток и видов (models/lineage.py); ветви без живых потомков
+# удаляются раз в LINEAGE_PRUNE_PERIOD тиков
+LINEAGE: bool = True
+LINEAGE_PRUNE_PERIOD: int = 200
+
+# расчёт статистики мира:
+#   "inline"  — каждый тик в основном потоке (как раньше);
+#   "thread" / "process" — раз в STATS_PERIOD тиков по снимку данных в фоновом пуле,
+#   результат попадает в кадр, когда готов
+STATS_MODE: str = "inline"
+STATS_PERIOD: int = 10
+# дорогие метрики: разнообразие видов и геномов, распределение энергии по видам
+STATS_EXTENDED: bool = False
+
+# профилирование выделений памяти по фазам тика (alloc_profile.py): новые миры
+# воркеров сразу подключают профилировщик; иначе — командой alloc_profile или main.py --alloc-profile
+ALLOC_PROFILE: bool = False
+ALLOC_PROFILE_RSS_PERIOD: int = 100       # раз во сколько тиков записывать RSS процесса
+ALLOC_PROFILE_RSS_SAMPLES: int = 1000     # сколько последних замеров RSS хранить
+ALLOC_PROFILE_TOP: int = 10               # мест в коде с наибольшим приростом памяти в отчёте
+ALLOC_PROFILE_TRACEMALLOC: bool = True    # прирост / пик памяти и места роста (замедляет тик в разы)
+ALLOC_PROFILE_TRACE_FRAMES: int = 1       # глубина стека tracemalloc
+
 # Включать ли базовый набор генов при инициализации
 INCLUDE_BASE_GENES: bool = True
 
+# представление генома при вычислении:
+#   "objects" — каждый ген вычисляется объектом Gene по очереди;
+#   "numpy"   — гены всей популяции проверяются одной маской (models/genome.py, нужен numpy)
+GENOME_BACKEND: str = "objects"
+
 # =============================================================================
 # ВЕЩЕСТВА / ГЕНЕРАЦИЯ И РАССЕИВАНИЕ
 # =============================================================================
@@ -77,6 +170,40 @@ ORGANIC_SPAWN_PROBABILITY_PER_CELL_PER_TICK: float = 0.0008
 # скорость рассеивания веществ (0.0 = нет диффузии, 0.1 = 10% уходит соседям)
 SUBSTANCE_DIFFUSION_RATE: float = 0.1
 
+# размер чанка сетки веществ (в ячейках); чанки без клеток и без заметных
+# концентраций пропускаются в update/diffuse
+CHUNK_SIZE: int = 8
+
+# порог концентрации, выше которого чанк считается активным
+# (0.01 совпадает с порогом удаления веществ, т.е. поведение не меняется)
+SUBSTANCE_ACTIVE_THRESHOLD: float = 0.01
+
+# запись веществ во время фазы клеток (emit / смерть) и появления органики:
+#   True  — записи (x, y, id, количество) копятся в буфере и применяются одним
+#           проходом в конце фазы; гены и поглощение в этом тике видят сетку
+#           в состоянии на начало фазы (результат не зависит от порядка клеток);
+#   False — запись сразу попадает в сетку: клетки, обработанные позже,
+#           видят вещества, выделенные в этом же тике.
+DEFERRED_SUBSTANCE_WRITES: bool = True
+
+# кэш срабатывания триггеров генов, реагирующих на вещества: результат проверки
+# хранится по (ячейка, версия ячейки, вещество, порог, режим) и переиспользуется
+# клетками-клонами на той же ячейке, пока в ячейку ничего не записали
+TRIGGER_CACHE: bool = True
+
+# обслуживание генома при делении (Cell.maintain_genome): у потомка одинаковые
+# гены сливаются, удаляются гены, которые не срабатывали GENOME_SILENT_TICKS
+# тиков жизни линии (в том числе выключенные), и геном обрезается до
+# GENOME_MAX_GENES генов (первыми уходят самые давно молчащие)
+GENOME_MAINTENANCE: bool = False
+GENOME_SILENT_TICKS: int = 5000   # 0 — молчащие гены не удаляются
+GENOME_MAX_GENES: int = 32        # 0 — без предела длины
+
+# профиль активации генов (models/gene_profile.py): проверки, срабатывания и время
+# по типу действия / режиму движения / категории рецептора; попадает в статистику мира
+GENE_PROFILE: bool = False
+GENE_PROFILE_WINDOW: int = 100    # тиков в окне, по которому считаются значения на тик
+
 # =============================================================================
 # ТИПЫ ВЕЩЕСТВ
 # =============================================================================
@@ -139,6 +266,3 @@ ALL_SUBSTANCE_NAMES = [
     "TOXIN_2",
     *[f"INORGANIC_{i}" for i in range(UNIQUE_INORGANIC_COUNT)],
 ]
-
-# Глобальный словарь для хранения параметров конкретных веществ (если нужен)
-SUBSTANCES: dict = {}
@@ -2,60 +2,29 @@ import os
 import random
 import time
 
+from alloc_profile import AllocationProfiler, format_report
 from config import CELL_COUNT, WORLD_WIDTH, WORLD_HEIGHT, SIMULATION_STEPS, SAVES_DIR, \
-    ORGANIC_TYPES, TOXIN_TYPES, INORGANIC_TYPES, SUBSTANCE_DISTRIBUTION, INCLUDE_BASE_GENES, SUBSTANCES
+    ORGANIC_TYPES, SUBSTANCE_DISTRIBUTION, INCLUDE_BASE_GENES, ALLOC_PROFILE
 from models.gene import Gene
 from models.trigger import Trigger
 from models.action import Action
 from models.cell import Cell
+from models.gene_profile import GeneProfiler, format_gene_profile
 from models.substance import Substance
+from models.substance_registry import SubstanceRegistry
 from models.world import World
 
-def generate_substances(container: dict):
-    """
-    Генерирует глобальный словарь SUBSTANCES из всех категорий веществ.
-    Формат:
-        {
-            "ORGANIC_0": {"type": "ORGANIC", "energy": 1.5},
-            "TOXIN_2":   {"type": "TOXIN",   "energy": -4.0},
-            "INORGANIC_15": {"type": "INORGANIC", "energy": 0.5},
-            ...
-        }
-    """
-    container.clear()
-
-    # === Органика ===
-    for data in ORGANIC_TYPES:
-        container[data["name"]] = {
-            "type": Substance.ORGANIC,
-            "energy": data["energy"]
-        }
-
-    # === Токсины ===
-    for data in TOXIN_TYPES:
-        container[data["name"]] = {
-            "type": Substance.TOXIN,
-            "energy": data["energy"]
-        }
-
-    # === Неорганика ===
-    for data in INORGANIC_TYPES:
-        container[data["name"]] = {
-            "type": Substance.INORGANIC,
-            "energy": data["energy"]
-        }
-
-def random_substance(type_: str = None) -> Substance | None:
-    """Создаёт случайное вещество из SUBSTANCES (можно указать тип)."""
+def random_substance(registry: SubstanceRegistry, type_: str = None) -> Substance | None:
+    """Создаёт случайное вещество из таблицы веществ мира (можно указать тип)."""
     if type_:
-        candidates = [n for n, v in SUBSTANCES.items() if v["type"] == type_]
+        candidates = [n for n, v in registry.items() if v["type"] == type_]
         if not candidates:
             return None
         name = random.choice(candidates)
     else:
-        name = random.choice(list(SUBSTANCES.keys()))
+        name = random.choice(list(registry.keys()))
 
-    data = SUBSTANCES[name]
+    data = registry[name]
     concentration = random.uniform(0.1, 100.0)
 
     return Substance(
@@ -63,6 +32,7 @@ def random_substance(type_: str = None) -> Substance | None:
         type_=data["type"],
         concentration=concentration,
         energy=data["energy"],
+        registry=registry,
     )
 
 
@@ -100,8 +70,8 @@ def base_genes() -> list[Gene]:
     return genes
 
 
-def random_cell(x: int, y: int, include_base_genes=INCLUDE_BASE_GENES) -> Cell:
-    """Создаёт клетку с случайным набором генов и начальными параметрами."""
+def random_cell(x: int, y: int, include_base_genes=INCLUDE_BASE_GENES, substance_names: list[str] | None = None) -> Cell:
+    """Создаёт клетку с случайным набором генов и начальными параметрами (substance_names — вещества мира)."""
     # Случайное смещение внутри клетки (чтобы не стояли ровно по сетке)
     cell = Cell(position=(x + random.random(), y + random.random()))
 
@@ -118,7 +88,7 @@ def random_cell(x: int, y: int, include_base_genes=INCLUDE_BASE_GENES) -> Cell:
     )[0]
 
     for _ in range(gene_count):
-        random_gene = Gene.create_random_gene()
+        random_gene = Gene.create_random_gene(substance_names)
         cell.genes.append(random_gene)
 
     return cell
@@ -127,28 +97,38 @@ def random_cell(x: int, y: int, include_base_genes=INCLUDE_BASE_GENES) -> Cell:
 def populate_world(world: 'World'):
     """Заполняет мир веществами и клетками."""
     env = world.env
-    generate_substances(SUBSTANCES)
+    substances = env.config.substances
 
     # 1. Заполнение сетки веществ
     for category, count in SUBSTANCE_DISTRIBUTION.items():
         for _ in range(count):
             x = random.randint(0, env.grid.width - 1)
             y = random.randint(0, env.grid.height - 1)
-            env.add_substance(x, y, random_substance(category))
+            substance = random_substance(substances, category)
+            if substance is not None:  # в таблице мира может не быть веществ этой категории
+                env.add_substance(x, y, substance)
 
     # 2. Создание клеток
     for _ in range(CELL_COUNT):
         x = random.randint(0, env.grid.width - 1)
         y = random.randint(0, env.grid.height - 1)
-        cell = random_cell(x, y)
+        cell = random_cell(x, y, substance_names=substances.visible_names())
         env.add_cell_to_buffer(cell)
 
 
-def run_simulation():
-    """Основной цикл симуляции."""
+def run_simulation(alloc_profile: bool = ALLOC_PROFILE, gene_profile: bool | None = None):
+    """
+    Основной цикл симуляции (alloc_profile — профилировать выделения памяти по фазам тика,
+    gene_profile — профиль активации генов; None — как в параметрах мира).
+    """
     print("🔬 Инициализация мира...")
     world = World(WORLD_WIDTH, WORLD_HEIGHT)
     populate_world(world)
+    if alloc_profile:
+        world.profiler = AllocationProfiler()
+        world.profiler.start()
+    if gene_profile and world.env.gene_profiler is None:
+        world.env.gene_profiler = GeneProfiler(world.config.substances, world.config.gene_profile_window)
 
     print(f"🌎 Мир создан: {len(world.env.cells)} клеток, "
           f"{len(world.env.grid.grid)} активных ячеек веществ")
@@ -177,6 +157,21 @@ def run_simulation():
     print("⏱️ Всего времени:", f"{total_time:.2f}s")
     print("⚡ Средняя скорость:", f"{1/avg_tick_time:.2f} тиков/сек ({avg_tick_time*1000:.2f} мс/тик)")
 
+    if world.env.gene_profiler is not None:
+        print(format_gene_profile(world.env.gene_profiler.report()))
+
+    if world.config.genome_maintenance:
+        stats = world.env.env_stats
+        # подписи — как в панели статистики клиента
+        print("🧬 Обслуживание генома:")
+        print(f"   Avg. genes: {stats.avg_genes:.2f}")
+        print(f"   Trimmed genes: {stats.genes_trimmed} ({stats.genes_trimmed_bytes / 1024:.1f} KiB)")
+        print(f"   Gene checks saved per tick: {stats.gene_checks_saved}")
+
+    if world.profiler is not None:
+        print(format_report(world.profiler.report()))
+        world.profiler.stop()
+
     # === Сохранение ===
     os.makedirs(SAVES_DIR, exist_ok=True)
     save_path = os.path.join(SAVES_DIR, "simulation_state.json")
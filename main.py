@@ -1,4 +1,12 @@
+import sys
+
 from helpers import run_simulation
 
 if __name__ == "__main__":
-    run_simulation()
+    # python main.py [--alloc-profile] [--gene-profile]
+    options = {}
+    if "--alloc-profile" in sys.argv[1:]:
+        options["alloc_profile"] = True
+    if "--gene-profile" in sys.argv[1:]:
+        options["gene_profile"] = True
+    run_simulation(**options)
@@ -0,0 +1,192 @@
+"""
+Метрики сервера в текстовом формате Prometheus (GET /metrics).
+
+Счётчики обновляются в горячем коде (каждый кадр, каждый тик), поэтому
+устроены максимально просто: значение — число в словаре по набору меток,
+гистограмма — список счётчиков корзин и bisect. Никаких блокировок: всё
+обновляется из event loop сервера (тики воркеров приходят вместе с кадром).
+"""
+from bisect import bisect_left
+from typing import Dict, List, Tuple
+
+# корзины по умолчанию (секунды): от 0.5 мс до 2.5 с
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+def _format_labels(names: Tuple[str, ...], values: tuple, extra: str = "") -> str:
+    parts = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """Метрика с необязательными метками; labels(...) возвращает значение для набора меток."""
+
+    type = "untyped"
+
+    def __init__(self, name: str, help_: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help_
+        self.labelnames = tuple(labelnames)
+        self.children: Dict[tuple, object] = {}
+        if not self.labelnames:
+            self._default = self.labels()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values):
+        key = tuple(str(v) for v in values)
+        child = self.children.get(key)
+        if child is None:
+            child = self.children[key] = self._new_child()
+        return child
+
+    def remove(self, *values):
+        """Убирает ряд (например, метрики закрытой сессии)."""
+        self.children.pop(tuple(str(v) for v in values), None)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        for key, child in self.children.items():
+            lines.extend(self._render_child(key, child))
+        return lines
+
+    def _render_child(self, key: tuple, child) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(child.value)}"]
+
+
+class _Value:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+    def dec(self, amount: float = 1.0):
+        self.value -= amount
+
+    def set(self, value: float):
+        self.value = value
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount: float = 1.0):
+        self._default.value += amount
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount: float = 1.0):
+        self._default.value += amount
+
+    def dec(self, amount: float = 1.0):
+        self._default.value -= amount
+
+    def set(self, value: float):
+        self._default.value = value
+
+
+class _HistogramValue:
+    __slots__ = ("bounds", "counts", "sum")
+
+    def __init__(self, bounds: tuple):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # последняя — +Inf
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, help_: str, labelnames: Tuple[str, ...] = (), buckets: tuple = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, help_, labelnames)
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value: float):
+        self._default.observe(value)
+
+    def _render_child(self, key: tuple, child: _HistogramValue) -> List[str]:
+        lines = []
+        total = 0
+        for bound, count in zip(self.buckets + (float("inf"),), child.counts):
+            total += count
+            labels = _format_labels(self.labelnames, key, f'le="{_format_value(float(bound))}"')
+            lines.append(f"{self.name}_bucket{labels} {total}")
+        labels = _format_labels(self.labelnames, key)
+        lines.append(f"{self.name}_sum{labels} {_format_value(child.sum)}")
+        lines.append(f"{self.name}_count{labels} {total}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: List[Metric] = []
+
+    def register(self, metric: Metric) -> Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+# === Метрики сервера ===
+
+REGISTRY = Registry()
+
+CLIENTS = REGISTRY.register(Gauge("evolution_clients_connected", "Connected WebSocket clients"))
+WORLDS = REGISTRY.register(Gauge("evolution_worlds", "Worlds owned by the scheduler"))
+HIBERNATED = REGISTRY.register(Gauge("evolution_worlds_hibernated", "Worlds hibernated to disk snapshots"))
+WORLDS_MEMORY = REGISTRY.register(Gauge(
+    "evolution_worlds_memory_bytes", "Estimated memory of worlds resident in workers"
+))
+TICKS = REGISTRY.register(Counter("evolution_ticks_total", "Simulated ticks", ("world",)))
+TICKS_PER_SECOND = REGISTRY.register(Gauge(
+    "evolution_ticks_per_second", "Ticks per second over the scheduler stats window", ("world",)
+))
+TICK_SECONDS = REGISTRY.register(Histogram("evolution_tick_duration_seconds", "Duration of one tick", ("world",)))
+POPULATION = REGISTRY.register(Gauge("evolution_population", "Living cells", ("world",)))
+FRAME_ENCODE_SECONDS = REGISTRY.register(Histogram(
+    "evolution_frame_encode_seconds", "Time to build and JSON-encode a frame"
+))
+FRAME_BYTES = REGISTRY.register(Histogram(
+    "evolution_frame_bytes", "Bytes sent per frame",
+    buckets=(1024, 4096, 16384, 65536, 262144, 1048576, 4194304),
+))
+FRAMES_DROPPED = REGISTRY.register(Counter(
+    "evolution_frames_dropped_total", "Frame slots missed because the client loop overran FRAME_TIME"
+))
+SNAPSHOT_WRITE_SECONDS = REGISTRY.register(Histogram(
+    "evolution_snapshot_write_seconds", "Time to write a world snapshot (kind: download, hibernate, autosave)",
+    ("kind",),
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0),
+))
@@ -1,37 +1,57 @@
 import math
 import random
+import sys
 from typing import Optional
 
 
 class Action:
-    DIVIDE = 'DIVIDE'  # деление клетки
-    EMIT = 'EMIT'  # выделение вещества
-    ABSORB = 'ABSORB'  # поглощение вещества
-    MOVE = 'MOVE'  # движение
-    HEALS = 'HEALS'  # лечения
+    __slots__ = ("type", "power", "substance_name", "move_mode")
 
-    MOVE_RANDOM = 'RANDOM'
-    MOVE_TOWARD = 'TOWARD'
-    MOVE_AWAY = 'AWAY'
-    MOVE_AROUND = 'AROUND'
+    # типы действий и режимы движения хранятся как маленькие int,
+    # в сохранениях и сигнатурах — по имени (TYPE_NAMES / MOVE_MODE_NAMES)
+    DIVIDE = 0  # деление клетки
+    EMIT = 1  # выделение вещества
+    ABSORB = 2  # поглощение вещества
+    MOVE = 3  # движение
+    HEALS = 4  # лечения
+
+    TYPE_NAMES = ('DIVIDE', 'EMIT', 'ABSORB', 'MOVE', 'HEALS')
+    TYPE_IDS = {name: i for i, name in enumerate(TYPE_NAMES)}
+
+    # 0 зарезервирован под «нет режима» (move_mode=None)
+    MOVE_RANDOM = 1
+    MOVE_TOWARD = 2
+    MOVE_AWAY = 3
+    MOVE_AROUND = 4
+
+    MOVE_MODE_NAMES = (None, 'RANDOM', 'TOWARD', 'AWAY', 'AROUND')
+    MOVE_MODE_IDS = {name: i for i, name in enumerate(MOVE_MODE_NAMES) if name}
 
     def __init__(
             self,
-            type_: str,
+            type_: int | str,
             power: float = 1.0,
             substance_name: Optional[str] = None,
-            move_mode: Optional[str] = None
+            move_mode: Optional[int | str] = None
     ):
         """
-        :param type_: тип действия
+        :param type_: тип действия (Action.DIVIDE ... или имя 'DIVIDE' ...)
         :param power: сила действия (энергия, объём, дальность)
         :param substance_name: имя вещества (для EMIT/ABSORB)
         :param move_mode: тип движения: TOWARD / AWAY / RANDOM / AROUND
         """
-        self.type = type_
+        self.type = Action.TYPE_IDS[type_] if isinstance(type_, str) else type_
         self.power = power
-        self.substance_name = substance_name
-        self.move_mode = move_mode
+        self.substance_name = sys.intern(substance_name) if substance_name else substance_name
+        self.move_mode = Action.MOVE_MODE_IDS[move_mode] if isinstance(move_mode, str) else move_mode
+
+    @property
+    def type_name(self) -> str:
+        return Action.TYPE_NAMES[self.type]
+
+    @property
+    def move_mode_name(self) -> Optional[str]:
+        return Action.MOVE_MODE_NAMES[self.move_mode] if self.move_mode else None
 
     def execute(self, cell: 'Cell', environment: "Environment"):
         """Выполняет действие"""
@@ -60,7 +80,7 @@ class Action:
 
     def _execute_absorb(self, cell: 'Cell', environment: "Environment"):
         x, y = cell.get_int_position()
-        substance = environment.grid.get_substance(x, y, self.substance_name)
+        substance = environment.grid.take_substance(x, y, self.substance_name)
         cell.absorb(substance)
 
     def _execute_heals(self, cell: 'Cell'):
@@ -147,25 +167,25 @@ class Action:
             # Если длина 0, не двигаемся
             return
 
-        cell.calculate_new_velocity(dx, dy)
+        cell.calculate_new_velocity(dx, dy, environment)
 
     def clone(self) -> 'Action':
-        return Action.from_dict(self.to_dict())
+        return Action(self.type, self.power, self.substance_name, self.move_mode)
 
     def __repr__(self):
-        info = [f"type={self.type}", f"power={self.power:.2f}"]
+        info = [f"type={self.type_name}", f"power={self.power:.2f}"]
         if self.substance_name:
             info.append(f"substance={self.substance_name}")
         if self.move_mode:
-            info.append(f"move_mode={self.move_mode}")
+            info.append(f"move_mode={self.move_mode_name}")
         return f"Action({', '.join(info)})"
 
     def to_dict(self):
         return {
-            "type": self.type,
+            "type": self.type_name,
             "power": self.power,
             "substance_name": self.substance_name,
-            "move_mode": self.move_mode,
+            "move_mode": self.move_mode_name,
         }
 
     @classmethod
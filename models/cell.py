@@ -1,13 +1,15 @@
 import hashlib
 import math
 import random
+import threading
 from typing import List
 
-from config import ORGANIC_TYPES, CELLS_LIMIT, CELL_RADIUS, FRICTION, MAX_VELOCITY, MAX_ACCELERATION, \
-    ACCELERATION_FACTOR
 from models.gene import Gene
 from models.substance import Substance
 
+# в кэше триггеров: результата для гена ещё нет
+_MISSING = object()
+
 
 class Cell:
     """
@@ -15,6 +17,18 @@ class Cell:
     Хранит гены, вещества, энергию, здоровье и позицию.
     """
 
+    # следующие свободные идентификаторы клетки и вида (уникальны в пределах процесса)
+    _next_id = 1
+    _next_species_id = 1
+    # миры могут создаваться в фоновом потоке (world_pool.py)
+    _ids_lock = threading.Lock()
+
+    __slots__ = (
+        "id", "position", "velocity", "energy", "health", "age", "alive",
+        "genes", "color_hex", "mutation_rate", "species_duration", "genome",
+        "species_id", "rest_ticks", "genome_checked_age", "genes_trimmed", "gene_checks_saved",
+    )
+
     def __init__(
         self,
         position: tuple = (0.0, 0.0),
@@ -26,8 +40,12 @@ class Cell:
         color_hex: str | None = None,
         mutation_rate: float = 0.1,
         velocity: tuple = (0.0, 0.0),
-        species_duration = 0
+        species_duration = 0,
+        species_id: int | None = None,
     ):
+        self.id = Cell.new_id()
+        # вид: наследуется при делении, новый — при мутации генома
+        self.species_id = species_id if species_id is not None else Cell.new_species_id()
         self.position = position
         self.velocity = velocity  # (vx, vy) - скорость
         self.energy = energy
@@ -38,6 +56,17 @@ class Cell:
         self.color_hex = color_hex
         self.mutation_rate = mutation_rate
         self.species_duration = species_duration
+        # тиков подряд в покое (медленно и без контактов); больше sleep_ticks — клетка спит
+        self.rest_ticks = 0
+        # обслуживание генома: возраст при последнем учёте срабатываний генов, сколько
+        # генов линия потеряла при обслуживании (наследуется) и сколько активных генов
+        # убрано из генома самой клетки (столько проверок генов за тик она не делает)
+        self.genome_checked_age = 0
+        self.genes_trimmed = 0
+        self.gene_checks_saved = 0
+        # кэш генов в виде строк структурного массива (только для GENOME_BACKEND="numpy");
+        # строится лениво из genes, общий у клеток-копий, на месте не меняется
+        self.genome = None
 
         if not color_hex:
             self.update_color()
@@ -50,16 +79,65 @@ class Cell:
         if not self.alive:
             return
 
+        self.begin_update(environment)
+
+        # активация генов
+        if environment.gene_profiler is not None:
+            environment.gene_profiler.activate(self, environment)
+        elif environment.grid.trigger_cache is not None:
+            self.activate_genes_cached(environment)
+        else:
+            for gene in self.genes:
+                gene.try_activate(self, environment)
+
+        self.finish_update(environment)
+
+    def activate_genes_cached(self, environment: "Environment"):
+        """
+        Активация генов через кэш триггеров ячейки (SubstanceGrid.trigger_results):
+        гены с одинаковыми рецептором, порогом и режимом у клеток на одной ячейке
+        проверяются один раз, пока в ячейку ничего не записали. Результат тот же,
+        что у Gene.try_activate по очереди.
+        """
+        grid = environment.grid
+        x, y = self.get_int_position()
+        results = grid.trigger_results(x, y)
+
+        for gene in self.genes:
+            if not gene.active:
+                continue
+            receptor = gene.receptor
+            trigger = gene.trigger
+            if results is None or receptor == "energy" or receptor == "health":
+                triggered = None
+            else:
+                key = (receptor, trigger.threshold, trigger.mode)
+                triggered = results.get(key, _MISSING)
+                if triggered is _MISSING:
+                    value = grid.find_concentration(x, y, receptor)
+                    triggered = results[key] = None if value is None else trigger.check(value)
+
+            if triggered is None:
+                # вещества в ячейке нет — рецептор может быть параметром клетки (как в Gene.try_activate)
+                value = getattr(self, receptor, None)
+                triggered = value is not None and trigger.check(value)
+
+            if triggered:
+                gene.fired = True
+                gene.action.execute(self, environment)
+                # действие могло записать в ячейку (поглощение) — кэш её новой версии
+                results = grid.trigger_results(x, y)
+
+    def begin_update(self, environment: "Environment"):
+        """Начало тика: возраст, базовое потребление, урон от токсинов."""
         self.age += 1
         self.energy -= 0.1  # базовое потребление
         self.species_duration += 1
 
         self.apply_toxin_damage(environment)
 
-        # активация генов
-        for gene in self.genes:
-            gene.try_activate(self, environment)
-
+    def finish_update(self, environment: "Environment"):
+        """Конец тика: движение и проверка смерти."""
         # применение скорости для движения
         self.move(environment)
 
@@ -73,18 +151,21 @@ class Cell:
         Урон пропорционален энергии и концентрации токсина.
         """
         cx, cy = self.get_int_position()
-        local_subs = environment.grid.get_substances(cx, cy)
+        local_subs = environment.grid.grid.get((cx, cy))
 
         if not local_subs:
             return
 
         total_damage = 0.0
+        substances = environment.config.substances
+        types = substances.types
+        energies = substances.energies
 
-        for sub in local_subs:
-            if sub.type == Substance.TOXIN and sub.concentration > 0.01:
+        for sid, concentration in local_subs.items():
+            if types[sid] == Substance.TOXIN and concentration > 0.01:
                 # Урон = концентрация × энергия токсина
                 # Чем сильнее токсин, тем больше энергия
-                damage = sub.energy * sub.concentration
+                damage = energies[sid] * concentration
                 total_damage += damage
 
         if total_damage > 0:
@@ -94,7 +175,7 @@ class Cell:
                 self.health = 0
 
     def absorb(self, substance: Substance):
-        """Поглощает вещество"""
+        """Поглощает вещество (снятое с сетки через SubstanceGrid.take_substance)"""
         if not substance or substance.concentration <= 0.01:
             return
 
@@ -109,25 +190,19 @@ class Cell:
         if self.energy <= 0.001 or amount <= 0.001:
             return
 
-        data = Substance.find_substance(substance_name)
+        substances = environment.config.substances
+        substance_id = substances.id_of(substance_name)
+        substance_energy = substances.energies[substance_id]
 
         # === Энергозатраты ===
-        energy_cost = amount * data["energy"]  # стоимость пропорциональна энергетике вещества
+        energy_cost = amount * substance_energy  # стоимость пропорциональна энергетике вещества
         if self.energy < energy_cost:
             # уменьшаем объём выделения, если энергии не хватает
-            amount = self.energy / data["energy"]
-            energy_cost = amount * data["energy"]
+            amount = self.energy / substance_energy
+            energy_cost = amount * substance_energy
 
         self.energy -= energy_cost
 
-        # создаём вещество, которое будет распределено вокруг
-        emitted_total = Substance(
-            name=substance_name,
-            type_=data["type"],
-            concentration=amount,
-            energy=data["energy"],
-        )
-
         # координата клетки
         cx, cy = self.get_int_position()
 
@@ -138,22 +213,17 @@ class Cell:
             (-1, -1), (-1, 1), (1, -1), (1, 1),
         ]
 
-        spread_concentration = emitted_total.concentration / len(directions)
+        spread_concentration = amount / len(directions)
 
         for dx, dy in directions:
             x, y = cx + dx, cy + dy
             if not (0 <= x < environment.grid.width and 0 <= y < environment.grid.height):
                 continue
 
-            environment.add_substance(
-                x, y,
-                Substance(
-                    name=substance_name,
-                    type_=data["type"],
-                    concentration=spread_concentration,
-                    energy=data["energy"],
-                )
-            )
+            environment.grid.add_concentration(x, y, substance_id, spread_concentration)
+
+        if environment.event_log is not None:
+            environment.event_log.emit(self, substance_id, cx, cy, amount)
 
     def move(self, environment: "Environment"):
         """
@@ -161,17 +231,27 @@ class Cell:
         Также применяет трение для постепенного замедления.
         """
         
+        config = environment.config
+        sleep_ticks = config.sleep_ticks
+        if sleep_ticks and self.rest_ticks > sleep_ticks:
+            # спящая клетка стоит: остаточная скорость (ниже sleep_velocity) хранится до пробуждения
+            return
+
+        friction = config.friction
+        max_velocity = config.max_velocity
+        cell_radius = config.cell_radius
+
         vx, vy = self.velocity
         
         # Применяем трение
-        vx *= FRICTION
-        vy *= FRICTION
+        vx *= friction
+        vy *= friction
         
         # Ограничиваем максимальную скорость
         speed = math.hypot(vx, vy)
-        if speed > MAX_VELOCITY:
-            vx = (vx / speed) * MAX_VELOCITY
-            vy = (vy / speed) * MAX_VELOCITY
+        if speed > max_velocity:
+            vx = (vx / speed) * max_velocity
+            vy = (vy / speed) * max_velocity
         
         # Обновляем позицию на основе скорости
         new_x = self.position[0] + vx
@@ -181,16 +261,16 @@ class Cell:
         max_x = environment.grid.width
         max_y = environment.grid.height
         if new_x < 0:
-            new_x = CELL_RADIUS
+            new_x = cell_radius
             vx = 0  # останавливаем при столкновении со стеной
         elif new_x > max_x:
-            new_x = max_x - CELL_RADIUS
+            new_x = max_x - cell_radius
             vx = 0
         if new_y < 0:
-            new_y = CELL_RADIUS
+            new_y = cell_radius
             vy = 0
         elif new_y > max_y:
-            new_y = max_y - CELL_RADIUS
+            new_y = max_y - cell_radius
             vy = 0
         
         self.position = (new_x, new_y)
@@ -200,7 +280,14 @@ class Cell:
         movement_cost = 0.05 * speed
         self.energy -= movement_cost
 
-    def calculate_new_velocity(self, dx: float, dy: float):
+        if sleep_ticks:
+            # засыпание подтверждает apply_physics, если в этом тике не было контактов
+            if speed < config.sleep_velocity:
+                self.rest_ticks = min(self.rest_ticks + 1, sleep_ticks)
+            else:
+                self.rest_ticks = 0
+
+    def calculate_new_velocity(self, dx: float, dy: float, environment: "Environment"):
         """
         Применяет силу к скорости клетки вместо мгновенного перемещения.
         """
@@ -208,21 +295,28 @@ class Cell:
         # Нормализуем направление если оно не нулевое
         direction_length = math.hypot(dx, dy)
         if direction_length > 0:
+            max_acceleration = environment.config.max_acceleration
+            acceleration_factor = environment.config.acceleration_factor
+
             # Нормализуем и умножаем на максимальное ускорение
-            norm_dx = (dx / direction_length) * MAX_ACCELERATION
-            norm_dy = (dy / direction_length) * MAX_ACCELERATION
+            norm_dx = (dx / direction_length) * max_acceleration
+            norm_dy = (dy / direction_length) * max_acceleration
             
             # Применяем ускорение к скорости (интерполяция)
             vx, vy = self.velocity
-            vx = vx * (1 - ACCELERATION_FACTOR) + norm_dx * ACCELERATION_FACTOR
-            vy = vy * (1 - ACCELERATION_FACTOR) + norm_dy * ACCELERATION_FACTOR
+            vx = vx * (1 - acceleration_factor) + norm_dx * acceleration_factor
+            vy = vy * (1 - acceleration_factor) + norm_dy * acceleration_factor
             
             self.velocity = (vx, vy)
+            self.rest_ticks = 0
 
     def divide(self, environment: "Environment"):
         """Создает копию клетки с возможной мутацией."""
-        if self.energy < 0.1 or (len(environment.cells) + len(environment.buffer_cells) > CELLS_LIMIT):
+        config = environment.config
+        if self.energy < 0.1 or (len(environment.cells) + len(environment.buffer_cells) > config.cells_limit):
             return None
+        if config.genome_maintenance:
+            self.account_gene_silence()
         new_cell = self.clone()
         cell_energy = self.energy / 2
         new_cell.age = 0
@@ -238,21 +332,106 @@ class Cell:
             random.uniform(-0.5, 0.5)
         )
 
+        if environment.event_log is not None:
+            environment.event_log.birth(new_cell, self)
+        if environment.lineage is not None:
+            environment.lineage.birth(new_cell, self)
+
         if self.is_triggered_mutation():
-            mutated = new_cell.mutate()
-            if mutated:
-                new_cell.species_duration = 0
-                new_cell.update_color()
+            if environment.genome_engine is not None:
+                # мутация всех новорождённых тика одним пакетом (см. GenomeEngine)
+                environment.genome_engine.schedule_mutation(new_cell)
+            elif new_cell.mutate(config.substances.visible_names()):
+                new_cell.speciate(environment)
+
+        if config.genome_maintenance and new_cell.maintain_genome(config.genome_silent_ticks, config.genome_max_genes):
+            new_cell.speciate(environment)
 
         return new_cell
 
-    def mutate(self):
-        """Мутация всей клетки (генов и параметров)."""
+    def account_gene_silence(self):
+        """Переносит срабатывания генов с последнего учёта в их счётчики молчания."""
+        elapsed = self.age - self.genome_checked_age
+        self.genome_checked_age = self.age
+        for gene in self.genes:
+            if gene.fired:
+                gene.fired = False
+                gene.silent = 0
+            else:
+                gene.silent += elapsed
+
+    def maintain_genome(self, silent_ticks: int, max_genes: int) -> int:
+        """
+        Обслуживание генома новорождённого: слияние одинаковых генов, удаление
+        давно молчащих (silent_ticks) и обрезка до max_genes генов (первыми уходят
+        самые давно молчащие). Возвращает число удалённых генов.
+        """
+        genes = []
+        kept = {}
+        for gene in self.genes:
+            key = gene.identity()
+            twin = kept.get(key)
+            if twin is None:
+                kept[key] = gene
+                genes.append(gene)
+            else:
+                # одинаковые гены срабатывают вместе: оставшийся молчит не дольше любого из них
+                twin.silent = min(twin.silent, gene.silent)
+
+        if silent_ticks > 0:
+            genes = [g for g in genes if g.silent < silent_ticks]
+
+        if 0 < max_genes < len(genes):
+            keep = set(map(id, sorted(genes, key=lambda g: g.silent)[:max_genes]))
+            genes = [g for g in genes if id(g) in keep]
+
+        removed = len(self.genes) - len(genes)
+        if removed:
+            self.gene_checks_saved = sum(g.active for g in self.genes) - sum(g.active for g in genes)
+            self.genes = genes
+            self.genome = None
+            self.genes_trimmed += removed
+        return removed
+
+    def speciate(self, environment: "Environment"):
+        """Геном изменился: новый цвет и новый вид, потомок прежнего."""
+        parent_species = self.species_id
+        self.species_id = Cell.new_species_id()
+        self.species_duration = 0
+        self.update_color()
+        if environment.lineage is not None:
+            environment.lineage.speciate(self, parent_species)
+        if environment.event_log is not None:
+            environment.event_log.mutation(self)
+
+    @staticmethod
+    def new_id() -> int:
+        with Cell._ids_lock:
+            cell_id = Cell._next_id
+            Cell._next_id += 1
+        return cell_id
+
+    @staticmethod
+    def new_species_id() -> int:
+        with Cell._ids_lock:
+            species_id = Cell._next_species_id
+            Cell._next_species_id += 1
+        return species_id
+
+    @staticmethod
+    def reserve_ids(cell_id: int, species_id: int):
+        """Загруженные id больше не выдаются новым клеткам и видам."""
+        with Cell._ids_lock:
+            Cell._next_id = max(Cell._next_id, cell_id + 1)
+            Cell._next_species_id = max(Cell._next_species_id, species_id + 1)
+
+    def mutate(self, substance_names: List[str] | None = None):
+        """Мутация всей клетки (генов и параметров); substance_names — вещества мира для новых рецепторов."""
         changed = False
         new_genes = []
         for gene in self.genes:
             before = gene.to_dict()
-            created = gene.mutate()
+            created = gene.mutate(substance_names)
             if created:
                 new_genes.append(created)
                 changed = True
@@ -263,6 +442,9 @@ class Cell:
             self.genes.extend(new_genes)
             changed = True
 
+        if changed:
+            self.genome = None
+
         return changed
 
     def is_triggered_mutation(self):
@@ -272,29 +454,27 @@ class Cell:
         """Прекращает жизнь клетки и выделяет вещества в окружающую среду."""
 
         self.alive = False
+        if environment.event_log is not None:
+            environment.event_log.death(self)
+        if environment.lineage is not None:
+            environment.lineage.death(self)
         cx, cy = self.get_int_position()
         total_cell_energy = self.energy
 
         # === 2. Конвертировать энергию в органику ===
         if total_cell_energy > 0:
-            # случайный тип органики из конфигурации
-            org_data = random.choice(ORGANIC_TYPES)
+            # случайный тип органики из конфигурации мира
+            org_data = random.choice(environment.config.organic_types)
             organic_name = org_data["name"]
             organic_energy = org_data["energy"]
 
             # расчёт концентрации по энергии
             organic_concentration = total_cell_energy / organic_energy
 
-            # создание органического вещества
-            organic = Substance(
-                name=organic_name,
-                type_=Substance.ORGANIC,
-                concentration=organic_concentration,
-                energy=organic_energy,
-            )
-
             # добавить всё в текущую ячейку
-            environment.add_substance(cx, cy, organic)
+            environment.grid.add_concentration(
+                cx, cy, environment.config.substances.id_of(organic_name), organic_concentration
+            )
 
         # === 3. Очистка и обнуление клетки ===
         self.energy = 0
@@ -341,10 +521,31 @@ class Cell:
 
     def clone(self) -> 'Cell':
         """Создаёт копию без мутации."""
-        return Cell.from_dict(self.to_dict())
+        new_cell = Cell(
+            position=self.position,
+            energy=self.energy,
+            health=self.health,
+            age=self.age,
+            genes=[g.clone() for g in self.genes],
+            color_hex=self.color_hex,
+            mutation_rate=self.mutation_rate,
+            velocity=self.velocity,
+            species_duration=self.species_duration,
+            species_id=self.species_id,
+        )
+        new_cell.genome = self.genome
+        new_cell.genes_trimmed = self.genes_trimmed
+        return new_cell
+
+    def genome_key(self) -> tuple:
+        """Содержимое генома как ключ: у клеток с одинаковым ключом одинаковые гены в сохранении."""
+        return tuple((g.identity(), g.mutation_rate) for g in self.genes)
 
-    def to_dict(self):
-        return {
+    def to_dict(self, genome: int | None = None):
+        """genome — номер генома в таблице сохранения (Environment.to_dict), тогда гены не пишутся."""
+        data = {
+            "id": self.id,
+            "species_id": self.species_id,
             "position": self.position,
             "velocity": self.velocity,
             "species_duration": self.species_duration,
@@ -353,24 +554,54 @@ class Cell:
             "age": self.age,
             "color_hex": self.color_hex,
             "mutation_rate": self.mutation_rate,
-            "genes": [g.to_dict() for g in self.genes],
         }
+        if genome is None:
+            data["genes"] = [g.to_dict() for g in self.genes]
+        else:
+            data["genome"] = genome
+        return data
 
     def get_int_position(self):
         cx, cy = int(self.position[0]), int(self.position[1])
         return cx, cy
 
     @classmethod
-    def from_dict(cls, data):
-        cell = cls(position=tuple(data["position"]))
+    def from_dict(cls, data, genomes: List[List["Gene"]] | None = None, copy_genes: bool = False):
+        """
+        genomes — таблица геномов сохранения (Environment.from_dict): клетка получает
+        гены своего генома по номеру. Параметры генов живой клетки не меняются (мутирует
+        только копия при делении), поэтому объекты генов общие у клеток одного генома;
+        но флаги fired / silent у общих генов смешиваются — copy_genes даёт отдельные
+        копии (обслуживание генома; при его включении позже — Environment.unshare_genes).
+        """
+        # без __init__: id из сохранения не тратят счётчики, цвет не пересчитывается (SHA1 генома)
+        cell = cls.__new__(cls)
+        cell_id = data.get("id")
+        species_id = data.get("species_id")
+        cell.id = cell_id if cell_id is not None else Cell.new_id()
+        cell.species_id = species_id if species_id is not None else Cell.new_species_id()
+        Cell.reserve_ids(cell.id, cell.species_id)
+        cell.position = tuple(data["position"])
         cell.velocity = tuple(data.get("velocity", (0.0, 0.0)))
         cell.energy = data["energy"]
         cell.health = data["health"]
         cell.age = data["age"]
-        cell.genes = [Gene.from_dict(g) for g in data.get("genes", [])]
+        cell.alive = True
+        if "genome" in data and genomes is not None:
+            genes = genomes[data["genome"]]
+            cell.genes = [g.clone() for g in genes] if copy_genes else list(genes)
+        else:
+            cell.genes = [Gene.from_dict(g) for g in data.get("genes", [])]
         cell.color_hex = data["color_hex"]
         cell.mutation_rate = data["mutation_rate"]
         cell.species_duration = data["species_duration"]
+        cell.rest_ticks = 0
+        cell.genome_checked_age = 0
+        cell.genes_trimmed = 0
+        cell.gene_checks_saved = 0
+        cell.genome = None
+        if not cell.color_hex:
+            cell.update_color()
         return cell
 
     def __repr__(self):
@@ -1,64 +1,139 @@
+import math
+import random
 import statistics
 from collections import defaultdict, Counter
 from typing import Dict, List
 
-from config import CELLS_LIMIT
-
 
 class EnvStats:
-    """Хранит и обновляет статистику по состоянию окружения."""
+    """
+    Хранит и обновляет статистику по состоянию окружения.
+
+    Расчёт разделён на два шага: capture() снимает лёгкую копию данных
+    (кортежи клеток, копии ячеек сетки), compute() считает по ней статистику.
+    compute() не обращается к живому миру, поэтому может выполняться в другом
+    потоке или процессе (см. StatsWorker).
+    """
+
+    # сколько видов сравнивается попарно при оценке разнообразия геномов
+    GENOME_DIVERSITY_SAMPLE = 32
 
-    def __init__(self):
+    def __init__(self, cells_limit: int = 0):
         self.cells_total = 0
-        self.cells_limit = CELLS_LIMIT
+        self.cells_limit = cells_limit
         self.unique_cells = 0
         self.avg_energy = 0.0
         self.avg_health = 0.0
         self.avg_age = 0.0
         self.avg_genes = 0.0
         self.avg_active_genes = 0.0
+        # обслуживание генома: сколько генов линии живых клеток потеряли при обслуживании
+        # и сколько памяти это экономит; сколько проверок генов за тик живые клетки не
+        # делают, потому что гены убраны из их собственных геномов
+        self.genes_trimmed = 0
+        self.genes_trimmed_bytes = 0
+        self.gene_checks_saved = 0
         self.top_cells: List[Dict] = []
         self.top_cells_by_species_duration = {}
         self.total_unique_substances = 0
         self.total_substances_by_type: Dict[str, int] = {}
         self.total_substances_concentration_by_type: Dict[str, float] = {}
 
-    def update(self, env: "Environment"):
+        # тик, по состоянию на который посчитана статистика
+        self.stats_tick = 0
+
+        # расширенные (дорогие) метрики, считаются при stats_extended в параметрах мира
+        self.species_shannon = 0.0
+        self.species_simpson = 0.0
+        self.genome_diversity = 0.0
+        self.species_energy: List[Dict] = []
+
+        # профиль активации генов (GeneProfiler.report), если включён
+        self.gene_profile: Dict | None = None
+
+    def update(self, env: "Environment", tick: int = 0, extended: bool | None = None):
         """Обновляет статистику на основе текущего состояния окружения."""
+        if extended is None:
+            extended = env.config.stats_extended
+        stats = EnvStats.compute(EnvStats.capture(env, tick, extended, copy=False))
+        self.__dict__.update(stats.__dict__)
+
+    @staticmethod
+    def capture(env: "Environment", tick: int = 0, extended: bool = False, copy: bool = True) -> dict:
+        """
+        Снимок данных для расчёта статистики (только простые типы — можно
+        передать в другой процесс). copy=False — ячейки сетки не копируются
+        (для расчёта на месте).
+        """
         cells = env.cells
-        grid = env.grid
+        rows = [
+            (c.energy, c.health, c.age, len(c.genes), sum(1 for g in c.genes if g.active),
+             c.color_hex, c.species_duration, c.genes_trimmed, c.gene_checks_saved)
+            for c in cells if c.alive
+        ]
+        gene_bytes = next((c.genes[0].nbytes() for c in cells if c.genes), 0)
+
+        tiles = env.grid.grid.values()
+        tiles = [t.copy() for t in tiles] if copy else tiles
 
-        self.cells_total = len(cells)
+        species_genes = None
+        if extended:
+            # один представитель на вид: набор ключей его генов
+            species_genes = {}
+            for c in cells:
+                if c.alive and c.color_hex not in species_genes:
+                    species_genes[c.color_hex] = [g.to_tuple() for g in c.genes]
+
+        return {
+            "tick": tick,
+            "cells_total": len(cells),
+            "cells_limit": env.config.cells_limit,
+            "cells": rows,
+            "gene_bytes": gene_bytes,
+            "tiles": tiles,
+            "substance_types": list(env.config.substances.types),
+            "species_genes": species_genes,
+            "gene_profile": env.gene_profiler.report() if env.gene_profiler is not None else None,
+        }
+
+    @classmethod
+    def compute(cls, snapshot: dict) -> "EnvStats":
+        """Считает статистику по снимку capture()."""
+        stats = cls(snapshot["cells_limit"])
+        stats.stats_tick = snapshot["tick"]
+        stats.cells_total = snapshot["cells_total"]
+        stats.gene_profile = snapshot["gene_profile"]
 
         # === 1. Клетки ===
-        alive_cells = [c for c in cells if c.alive]
+        alive_cells = snapshot["cells"]
         if alive_cells:
-            self.avg_energy = statistics.fmean(c.energy for c in alive_cells)
-            self.avg_health = statistics.fmean(c.health for c in alive_cells)
-            self.avg_age = statistics.fmean(c.age for c in alive_cells)
-            self.avg_genes = statistics.fmean(len(c.genes) for c in alive_cells)
-            self.avg_active_genes = statistics.fmean(
-                sum(1 for g in c.genes if g.active) for c in alive_cells
-            )
+            stats.avg_energy = statistics.fmean(c[0] for c in alive_cells)
+            stats.avg_health = statistics.fmean(c[1] for c in alive_cells)
+            stats.avg_age = statistics.fmean(c[2] for c in alive_cells)
+            stats.avg_genes = statistics.fmean(c[3] for c in alive_cells)
+            stats.avg_active_genes = statistics.fmean(c[4] for c in alive_cells)
         else:
-            self.avg_energy = self.avg_health = self.avg_age = self.avg_genes = 0.0
+            stats.avg_energy = stats.avg_health = stats.avg_age = stats.avg_genes = 0.0
+        stats.genes_trimmed = sum(c[7] for c in alive_cells)
+        stats.genes_trimmed_bytes = stats.genes_trimmed * snapshot["gene_bytes"]
+        stats.gene_checks_saved = sum(c[8] for c in alive_cells)
 
         # --- 1.1. Топ видов по численности ---
-        gene_counter = Counter(c.color_hex for c in alive_cells)
-        self.unique_cells = len(gene_counter)
-        self.top_cells = [{"key": k, "count": v} for k, v in gene_counter.most_common(5)]
+        gene_counter = Counter(c[5] for c in alive_cells)
+        stats.unique_cells = len(gene_counter)
+        stats.top_cells = [{"key": k, "count": v} for k, v in gene_counter.most_common(5)]
 
         # --- 1.2. Топ видов по максимальному species_duration ---
         species_duration_map = defaultdict(int)
 
         for c in alive_cells:
-            key = c.color_hex
+            key = c[5]
             # берём максимум по виду
-            if c.species_duration > species_duration_map[key]:
-                species_duration_map[key] = c.species_duration
+            if c[6] > species_duration_map[key]:
+                species_duration_map[key] = c[6]
 
         # сортируем виды по максимальному species_duration и берём топ-5
-        self.top_cells_by_species_duration = [
+        stats.top_cells_by_species_duration = [
             {"key": key, "species_duration": species_duration}
             for key, species_duration in sorted(
                 species_duration_map.items(),
@@ -68,28 +143,72 @@ class EnvStats:
         ]
 
         # === 2. Вещества ===
-        unique_substances = {}  # key=(name, type) → total_concentration
+        unique_substances = {}  # key=id вещества → total_concentration
 
-        for substances in grid.grid.values():
-            for s in substances:
-                key = (s.name, s.type)
-                unique_substances[key] = unique_substances.get(key, 0.0) + s.concentration
+        for substances in snapshot["tiles"]:
+            for sid, concentration in substances.items():
+                unique_substances[sid] = unique_substances.get(sid, 0.0) + concentration
 
-        self.total_unique_substances = len(unique_substances)
+        stats.total_unique_substances = len(unique_substances)
 
         by_type_count = defaultdict(int)
         by_type_conc = defaultdict(float)
 
-        for (_, t), total_conc in unique_substances.items():
+        types = snapshot["substance_types"]
+        for sid, total_conc in unique_substances.items():
+            t = types[sid]
             by_type_count[t] += 1
             by_type_conc[t] += total_conc
 
         all_types = ["ORGANIC", "INORGANIC", "TOXIN"]
-        self.total_substances_by_type = {t: by_type_count.get(t, 0) for t in all_types}
-        self.total_substances_concentration_by_type = {
+        stats.total_substances_by_type = {t: by_type_count.get(t, 0) for t in all_types}
+        stats.total_substances_concentration_by_type = {
             t: round(by_type_conc.get(t, 0.0), 3) for t in all_types
         }
 
+        # === 3. Расширенные метрики ===
+        if snapshot["species_genes"] is not None:
+            stats._compute_extended(alive_cells, gene_counter, snapshot["species_genes"])
+
+        return stats
+
+    def _compute_extended(self, alive_cells, species_counts: Counter, species_genes: Dict[str, list]):
+        total = sum(species_counts.values())
+        if total:
+            shares = [n / total for n in species_counts.values()]
+            self.species_shannon = round(-sum(p * math.log(p) for p in shares), 4)
+            self.species_simpson = round(1.0 - sum(p * p for p in shares), 4)
+
+        # среднее расстояние Жаккара между наборами генов видов (на выборке видов)
+        gene_sets = [frozenset(genes) for genes in species_genes.values()]
+        if len(gene_sets) > self.GENOME_DIVERSITY_SAMPLE:
+            gene_sets = random.Random(len(gene_sets)).sample(gene_sets, self.GENOME_DIVERSITY_SAMPLE)
+        distances = [
+            1.0 - len(a & b) / len(a | b) if (a or b) else 0.0
+            for i, a in enumerate(gene_sets) for b in gene_sets[i + 1:]
+        ]
+        self.genome_diversity = round(statistics.fmean(distances), 4) if distances else 0.0
+
+        # распределение энергии в крупнейших видах
+        energy_by_species = defaultdict(list)
+        for c in alive_cells:
+            energy_by_species[c[5]].append(c[0])
+
+        self.species_energy = []
+        for key, count in species_counts.most_common(5):
+            energies = sorted(energy_by_species[key])
+            quantiles = statistics.quantiles(energies, n=10) if len(energies) > 1 else energies * 9
+            self.species_energy.append({
+                "key": key,
+                "count": count,
+                "mean": round(statistics.fmean(energies), 3),
+                "min": round(energies[0], 3),
+                "p10": round(quantiles[0], 3),
+                "p50": round(quantiles[4], 3),
+                "p90": round(quantiles[8], 3),
+                "max": round(energies[-1], 3),
+            })
+
     @classmethod
     def from_dict(cls, data: dict) -> "EnvStats":
         """Создаёт объект статистики из словаря (например, при загрузке мира)."""
@@ -102,6 +221,9 @@ class EnvStats:
         obj.avg_age = data.get("avg_age", 0.0)
         obj.avg_genes = data.get("avg_genes", 0.0)
         obj.avg_active_genes = data.get("avg_active_genes", 0.0)
+        obj.genes_trimmed = data.get("genes_trimmed", 0)
+        obj.genes_trimmed_bytes = data.get("genes_trimmed_bytes", 0)
+        obj.gene_checks_saved = data.get("gene_checks_saved", 0)
 
         obj.top_cells = data.get("top_cells", [])
         obj.top_cells_by_species_duration = data.get("top_cells_by_species_duration", [])
@@ -111,6 +233,13 @@ class EnvStats:
         obj.total_substances_concentration_by_type = data.get(
             "substances_concentration_by_type", {}
         )
+
+        obj.stats_tick = data.get("stats_tick", 0)
+        obj.species_shannon = data.get("species_shannon", 0.0)
+        obj.species_simpson = data.get("species_simpson", 0.0)
+        obj.genome_diversity = data.get("genome_diversity", 0.0)
+        obj.species_energy = data.get("species_energy", [])
+        obj.gene_profile = data.get("gene_profile")
         return obj
 
     def to_dict(self):
@@ -123,11 +252,20 @@ class EnvStats:
             "avg_age": self.avg_age,
             "avg_genes": self.avg_genes,
             "avg_active_genes": self.avg_active_genes,
+            "genes_trimmed": self.genes_trimmed,
+            "genes_trimmed_bytes": self.genes_trimmed_bytes,
+            "gene_checks_saved": self.gene_checks_saved,
             "top_cells": self.top_cells,
             "top_cells_by_species_duration": self.top_cells_by_species_duration,
             "total_unique_substances": self.total_unique_substances,
             "substances_by_type": self.total_substances_by_type,
             "substances_concentration_by_type": self.total_substances_concentration_by_type,
+            "stats_tick": self.stats_tick,
+            "species_shannon": self.species_shannon,
+            "species_simpson": self.species_simpson,
+            "genome_diversity": self.genome_diversity,
+            "species_energy": self.species_energy,
+            "gene_profile": self.gene_profile,
         }
 
     def __repr__(self):
@@ -143,3 +281,57 @@ class EnvStats:
             f"total_substances_by_type={self.total_substances_by_type}, "
             f"total_substances_concentration_by_type={self.total_substances_concentration_by_type})"
         )
+
+
+def _compute_stats(snapshot: dict) -> EnvStats:
+    """Точка входа для пула (функция уровня модуля — сериализуется для процессов)."""
+    return EnvStats.compute(snapshot)
+
+
+class StatsWorker:
+    """
+    Асинхронный расчёт статистики (STATS_MODE = "thread" / "process").
+
+    Раз в STATS_PERIOD тиков снимается копия данных (EnvStats.capture) и
+    отдаётся в общий для всех миров пул; готовый результат подменяет
+    env.env_stats на одном из следующих тиков. Пока расчёт не завершён,
+    новый снимок не снимается — статистика может отставать (см. stats_tick).
+    """
+
+    _executors = {}
+
+    def __init__(self, mode: str, period: int, extended: bool = False):
+        self.mode = mode
+        self.period = max(1, period)
+        self.extended = extended
+        self.pending = None
+        self.ticks = 0
+
+    @classmethod
+    def executor(cls, mode: str):
+        executor = cls._executors.get(mode)
+        if executor is None:
+            if mode == "process":
+                from concurrent.futures import ProcessPoolExecutor
+                executor = ProcessPoolExecutor(max_workers=1)
+            else:
+                from concurrent.futures import ThreadPoolExecutor
+                executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="env-stats")
+            cls._executors[mode] = executor
+        return executor
+
+    def step(self, env: "Environment", tick: int):
+        """Вызывается каждый тик вместо EnvStats.update."""
+        self.ticks += 1
+
+        if self.pending is not None and self.pending.done():
+            future, self.pending = self.pending, None
+            try:
+                env.env_stats = future.result()
+            except Exception as e:
+                print(f"❌ Stats computation failed: {e}")
+
+        if self.pending is None and self.ticks >= self.period:
+            self.ticks = 0
+            snapshot = EnvStats.capture(env, tick, self.extended)
+            self.pending = self.executor(self.mode).submit(_compute_stats, snapshot)
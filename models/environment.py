@@ -1,21 +1,43 @@
 import math
 import random
-from typing import List
+from bisect import bisect_right
+from typing import Dict, List, Tuple
 from models.cell import Cell
-from models.env_stats import EnvStats
+from models.env_stats import EnvStats, StatsWorker
+from models.gene import Gene
+from models.gene_profile import GeneProfiler
+from models.lineage import Lineage
 from models.substance_grid import SubstanceGrid
-from models.substance import Substance
-from config import CELL_RADIUS, CELL_REPULSION_FORCE, ORGANIC_TYPES, ORGANIC_SPAWN_PROBABILITY_PER_CELL_PER_TICK
+from models.world_config import WorldConfig
 
 
 class Environment:
     """Среда мира: хранит вещества, клетки и API для взаимодействия."""
 
-    def __init__(self, width: int, height: int):
-        self.grid = SubstanceGrid(width, height)
+    def __init__(self, width: int, height: int, config: WorldConfig | None = None):
+        # параметры мира (физика, пределы, таблица веществ); модели читают их через environment.config
+        self.config = config = config or WorldConfig()
+        self.grid = SubstanceGrid(width, height, config)
         self.cells: List[Cell] = []
         self.buffer_cells: List[Cell] = []
-        self.env_stats = EnvStats()
+        self.env_stats = EnvStats(config.cells_limit)
+        self.stats_worker = None
+        if config.stats_mode != "inline":
+            self.stats_worker = StatsWorker(config.stats_mode, config.stats_period, config.stats_extended)
+        # журнал событий (models/event_log.EventLogWriter), если мир записывается
+        self.event_log = None
+        self.lineage = Lineage() if config.lineage else None
+        # профиль активации генов (models/gene_profile.py), если включён
+        self.gene_profiler = GeneProfiler(config.substances, config.gene_profile_window) if config.gene_profile else None
+        # клетки по чанкам сетки для выборки по области (см. cells_in), перестраивается раз в тик
+        self._cell_index: Dict[Tuple[int, int], List[Cell]] = {}
+        self._cell_index_version = None
+        self.genome_engine = None
+        # гены загруженных клеток общие у клеток одного генома (см. from_dict, unshare_genes)
+        self.genes_shared = False
+        if config.genome_backend == "numpy":
+            from models.genome import GenomeEngine
+            self.genome_engine = GenomeEngine(config.substances)
 
     def add_cell_to_buffer(self, cell: Cell):
         self.buffer_cells.append(cell)
@@ -29,48 +51,112 @@ class Environment:
         if cell in self.cells:
             self.cells.remove(cell)
 
+    def cells_in(self, x0: float, y0: float, x1: float, y1: float, version) -> List[Cell]:
+        """
+        Клетки в прямоугольнике [x0, x1) × [y0, y1). Индекс по чанкам строится
+        один раз на version (тик мира): повторные выборки за тот же тик его переиспользуют.
+        """
+        size = self.grid.chunk_size
+        if self._cell_index_version != version:
+            index = {}
+            for cell in self.cells:
+                x, y = cell.position
+                index.setdefault((int(x) // size, int(y) // size), []).append(cell)
+            self._cell_index = index
+            self._cell_index_version = version
+
+        index = self._cell_index
+        result = []
+        for cx in range(int(x0) // size, int(x1) // size + 1):
+            for cy in range(int(y0) // size, int(y1) // size + 1):
+                for cell in index.get((cx, cy), ()):
+                    x, y = cell.position
+                    if x0 <= x < x1 and y0 <= y < y1:
+                        result.append(cell)
+        return result
+
     def add_substance(self, x: int, y: int, substance):
         """Добавляет вещество в сетку."""
         self.grid.add_substance(x, y, substance)
 
     def spawn_random_organic(self):
-        for x in range(self.grid.width):
-            for y in range(self.grid.height):
-                if random.random() < ORGANIC_SPAWN_PROBABILITY_PER_CELL_PER_TICK:
-                    # Выбираем случайный тип органики
-                    org_data = random.choice(ORGANIC_TYPES)
-                    organic_name = org_data["name"]
-                    organic_energy = org_data["energy"]
-                    
-                    # Создаём органическое вещество с концентрацией 10.0 и volatility = 0 (не распадается)
-                    organic = Substance(
-                        name=organic_name,
-                        type_=Substance.ORGANIC,
-                        concentration=10.0,
-                        energy=organic_energy,
-                    )
-                    
-                    # Добавляем в ячейку
-                    self.add_substance(x, y, organic)
+        """
+        Случайное появление органики.
+        Вместо броска монетки в каждой ячейке разыгрываем расстояние до
+        следующей удачной ячейки (геометрическое распределение) — результат
+        тот же, но работа пропорциональна числу появлений, а не площади мира.
+        """
+        p = self.config.organic_spawn_probability
+        if p <= 0:
+            return
+
+        area = self.grid.width * self.grid.height
+        log_miss = math.log1p(-p) if p < 1 else None
+        index = -1
+        organic_types = self.config.organic_types
+        substances = self.config.substances
+        self.grid.begin_writes()
+
+        while True:
+            if log_miss is None:
+                index += 1
+            else:
+                index += 1 + int(math.log(1.0 - random.random()) / log_miss)
+            if index >= area:
+                break
+
+            x, y = divmod(index, self.grid.height)
+
+            # Выбираем случайный тип органики
+            org_data = random.choice(organic_types)
+
+            # Добавляем органику с концентрацией 10.0 (чанк при этом просыпается)
+            substance_id = substances.id_of(org_data["name"])
+            self.grid.add_concentration(x, y, substance_id, 10.0)
+            if self.event_log is not None:
+                self.event_log.spawn(substance_id, x, y, 10.0)
+
+        self.grid.flush_writes()
 
     def update_sub_grid(self):
+        # чанки, в которых есть клетки, всегда обрабатываются
+        self.grid.set_occupied(c.get_int_position() for c in self.cells)
         self.grid.update()
 
-    def update_env_stats(self):
-        self.env_stats.update(self)
+    def update_env_stats(self, tick: int = 0):
+        if self.stats_worker is not None:
+            self.stats_worker.step(self, tick)
+        else:
+            self.env_stats.update(self, tick)
 
     def apply_physics(self):
-        if len(self.cells) < 2:
+        cells = self.cells
+        if not cells:
             return
 
-        min_distance = 1.8 * CELL_RADIUS  # минимальное расстояние между центрами клеток
+        min_distance = 1.8 * self.config.cell_radius  # минимальное расстояние между центрами клеток
+        repulsion_force = self.config.cell_repulsion_force
+        sleep_ticks = self.config.sleep_ticks
+
+        # Спящие клетки неподвижны и засыпали без контактов, поэтому две спящие не
+        # пересекаются: пары из двух спящих пропускаются. Остальные пары проверяются
+        # в том же порядке, что и без сна.
+        awake = None
+        if sleep_ticks:
+            awake = [i for i, c in enumerate(cells) if c.rest_ticks <= sleep_ticks]
+            if len(awake) == len(cells):
+                awake = None
 
         # Проходим по всем парам клеток
-        for i in range(len(self.cells)):
-            cell1 = self.cells[i]
+        for i in range(len(cells)):
+            cell1 = cells[i]
+            if awake is not None and cell1.rest_ticks > sleep_ticks:
+                others = awake[bisect_right(awake, i):]
+            else:
+                others = range(i + 1, len(cells))
 
-            for j in range(i + 1, len(self.cells)):
-                cell2 = self.cells[j]
+            for j in others:
+                cell2 = cells[j]
 
                 # Вычисляем расстояние между клетками
                 dx = cell1.position[0] - cell2.position[0]
@@ -81,7 +167,7 @@ class Environment:
                 if min_distance > distance > 0:
                     # Сила отталкивания пропорциональна степени перекрытия
                     overlap = min_distance - distance
-                    force = overlap * CELL_REPULSION_FORCE
+                    force = overlap * repulsion_force
 
                     # Нормализуем направление (единичный вектор)
                     if distance > 0:
@@ -106,33 +192,97 @@ class Environment:
                     v2y += -ny * force
                     cell2.velocity = (v2x, v2y)
 
+                    # контакт будит обе клетки
+                    cell1.rest_ticks = 0
+                    cell2.rest_ticks = 0
+
+        if sleep_ticks:
+            # покоились sleep_ticks тиков и в этом тике без контактов — засыпают
+            for cell in cells if awake is None else (cells[i] for i in awake):
+                if cell.rest_ticks == sleep_ticks:
+                    cell.rest_ticks = sleep_ticks + 1
 
     def update_cells(self):
-        for cell in self.cells:
-            if cell.alive:
-                cell.update(self)
+        # выделения и органика от погибших клеток копятся и пишутся в сетку одним проходом
+        self.grid.begin_writes()
+        if self.genome_engine is not None:
+            self.genome_engine.update_cells(self)
+        else:
+            for cell in self.cells:
+                if cell.alive:
+                    cell.update(self)
+        self.grid.flush_writes()
+        if self.gene_profiler is not None:
+            self.gene_profiler.end_tick()
 
         self.load_from_buffer()
         self.cells = [c for c in self.cells if c.alive]
 
+    def unshare_genes(self):
+        """
+        Отдельные копии генов у каждой клетки. Нужны перед включением обслуживания
+        генома: флаги fired / silent — учёт по клетке, у общих генов они смешиваются.
+        """
+        if not self.genes_shared:
+            return
+        for cell in self.cells + self.buffer_cells:
+            cell.genes = [g.clone() for g in cell.genes]
+        self.genes_shared = False
+
     def to_dict(self) -> dict:
-        """Преобразует среду в сериализуемый словарь."""
-        return {
+        """
+        Преобразует среду в сериализуемый словарь. Каждый различный геном
+        пишется один раз в таблицу "genomes" (ключ — содержимое генов),
+        клетки ссылаются на него номером.
+        """
+        genome_index: Dict[tuple, int] = {}
+        genomes = []
+        cells = []
+        for c in self.cells:
+            key = c.genome_key()
+            index = genome_index.get(key)
+            if index is None:
+                index = genome_index[key] = len(genomes)
+                genomes.append([g.to_dict() for g in c.genes])
+            cells.append(c.to_dict(index))
+        data = {
             "grid": self.grid.to_dict(),
-            "cells": [c.to_dict() for c in self.cells],
+            "genomes": genomes,
+            "cells": cells,
             "env_stats": self.env_stats.to_dict(),
         }
+        if self.lineage is not None:
+            data["lineage"] = self.lineage.to_dict()
+        return data
 
     @classmethod
-    def from_dict(cls, data: dict) -> "Environment":
-        """Создаёт среду из сериализованных данных."""
+    def from_dict(cls, data: dict, config: WorldConfig | None = None) -> "Environment":
+        """Создаёт среду из сериализованных данных (config — параметры мира, по умолчанию из config.py)."""
         grid_data = data.get("grid", {})
         cells_data = data.get("cells", [])
         stats_data = data.get("env_stats")
 
-        env = cls(grid_data["width"], grid_data["height"])
-        env.grid = SubstanceGrid.from_dict(grid_data)
-        env.cells = [Cell.from_dict(c) for c in cells_data]
+        env = cls(grid_data["width"], grid_data["height"], config)
+        env.grid = SubstanceGrid.from_dict(grid_data, env.config)
+        # гены каждого генома разбираются один раз и общие у его клеток (при обслуживании
+        # генома у каждой клетки свои копии: в генах ведётся учёт срабатываний);
+        # в бэкенде "numpy" клетки одного генома делят и его массив (Cell.genome)
+        genomes = [[Gene.from_dict(g) for g in genes] for genes in data.get("genomes", [])]
+        copy_genes = env.config.genome_maintenance
+        encoded = {}
+        env.cells = []
+        for c in cells_data:
+            cell = Cell.from_dict(c, genomes, copy_genes)
+            index = c.get("genome")
+            if env.genome_engine is not None and index is not None:
+                genome = encoded.get(index)
+                if genome is None:
+                    genome = encoded[index] = env.genome_engine.genome_of(cell)
+                cell.genome = genome
+            env.cells.append(cell)
+        env.genes_shared = bool(genomes) and not copy_genes
         env.env_stats = EnvStats.from_dict(stats_data)
+        if env.lineage is not None and "lineage" in data:
+            env.lineage = Lineage.from_dict(data["lineage"])
 
         return env
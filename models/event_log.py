@@ -0,0 +1,442 @@
+"""
+Компактный бинарный журнал событий мира и его воспроизведение.
+
+Формат файла:
+    b"EVLOG\\x01" | u32 длина заголовка | JSON-заголовок (размер мира, таблица веществ)
+    далее записи фиксированного вида, каждая начинается с u8 вида и u32 тика:
+        BIRTH     id, parent_id, x, y, цвет (3 байта)
+        DEATH     id, x, y
+        MUTATION  id, новый цвет
+        EMIT      id, id вещества, x, y, количество   (только крупные выделения)
+        SPAWN     id вещества, x, y, количество
+        KEYFRAME  длина, zlib(клетки + ячейки сетки)
+        MOTION    длина, zlib(id, x, y, vx, vy каждой клетки)   (раз в EVENT_LOG_MOTION_PERIOD тиков)
+
+Журнал пишется в буфер и сбрасывается в файл пачками, поэтому запись
+события стоит один struct.pack, а не сериализацию мира.
+"""
+import json
+import math
+import os
+import struct
+import threading
+import zlib
+from typing import Dict, List, Tuple
+
+from models.cell import Cell
+from models.environment import Environment
+from models.substance_registry import SubstanceRegistry
+from models.world_config import WorldConfig
+
+MAGIC = b"EVLOG\x01"
+
+BIRTH = 1
+DEATH = 2
+MUTATION = 3
+EMIT = 4
+SPAWN = 5
+KEYFRAME = 6
+MOTION = 7
+
+_HEADER_LEN = struct.Struct("<I")
+_KIND_TICK = struct.Struct("<BI")
+_RECORDS = {
+    BIRTH: struct.Struct("<BIIIff3s"),
+    DEATH: struct.Struct("<BIIff"),
+    MUTATION: struct.Struct("<BII3s"),
+    EMIT: struct.Struct("<BIIHHHf"),
+    SPAWN: struct.Struct("<BIHHHf"),
+    KEYFRAME: struct.Struct("<BII"),
+    MOTION: struct.Struct("<BII"),
+}
+# записи с длиной и сжатым телом после заголовка
+_COMPRESSED = (KEYFRAME, MOTION)
+_KEY_CELL = struct.Struct("<Iff3s")
+_KEY_TILE = struct.Struct("<HHHf")
+_KEY_COUNTS = struct.Struct("<II")
+_MOTION_CELL = struct.Struct("<Iffff")
+
+# распределение выделения по 3×3, как в Cell.emit
+_EMIT_DIRECTIONS = [
+    (0, 0), (-1, 0), (1, 0), (0, -1), (0, 1),
+    (-1, -1), (-1, 1), (1, -1), (1, 1),
+]
+
+
+def _color_bytes(color_hex: str | None) -> bytes:
+    return bytes.fromhex(color_hex[1:7]) if color_hex else b"\xbb\xbb\xbb"
+
+
+def _color_hex(raw: bytes) -> str:
+    return "#" + raw.hex().upper()
+
+
+class EventLogWriter:
+    """Пишет события одного мира. Методы вызываются из горячего кода — только упаковка в буфер."""
+
+    FLUSH_BYTES = 64 * 1024
+
+    def __init__(self, path: str, width: int, height: int, substances: SubstanceRegistry,
+                 emit_threshold: float, physics: Dict[str, float] | None = None):
+        self.path = path
+        self.tick = 0
+        self.buffer = bytearray()
+        self.bytes_written = 0
+        self.emit_threshold = emit_threshold
+
+        header = json.dumps({
+            "width": width,
+            "height": height,
+            "substances": substances.to_dict(),
+            "substance_ids": {name: substances.ids[name] for name in substances},
+            # параметры движения: воспроизведение ведёт клетки между записями MOTION
+            "physics": physics or {},
+        }).encode("utf-8")
+        with open(self.path, "wb") as f:
+            f.write(MAGIC + _HEADER_LEN.pack(len(header)) + header)
+
+    def _append(self, data: bytes):
+        self.buffer += data
+        if len(self.buffer) >= self.FLUSH_BYTES:
+            self.flush()
+
+    def birth(self, cell: Cell, parent: Cell):
+        x, y = cell.position
+        self._append(_RECORDS[BIRTH].pack(
+            BIRTH, self.tick, cell.id, parent.id, x, y, _color_bytes(cell.color_hex)
+        ))
+
+    def death(self, cell: Cell):
+        x, y = cell.position
+        self._append(_RECORDS[DEATH].pack(DEATH, self.tick, cell.id, x, y))
+
+    def mutation(self, cell: Cell):
+        self._append(_RECORDS[MUTATION].pack(MUTATION, self.tick, cell.id, _color_bytes(cell.color_hex)))
+
+    def emit(self, cell: Cell, substance_id: int, x: int, y: int, amount: float):
+        if amount < self.emit_threshold:
+            return
+        self._append(_RECORDS[EMIT].pack(EMIT, self.tick, cell.id, substance_id, x, y, amount))
+
+    def spawn(self, substance_id: int, x: int, y: int, amount: float):
+        self._append(_RECORDS[SPAWN].pack(SPAWN, self.tick, substance_id, x, y, amount))
+
+    def keyframe(self, env: Environment):
+        """Полный (но компактный) срез клеток и сетки — точка синхронизации для воспроизведения."""
+        cells = [c for c in env.cells if c.alive] + env.buffer_cells
+        tiles = [(pos, sid, c) for pos, tile in env.grid.grid.items() for sid, c in tile.items()]
+
+        parts = [_KEY_COUNTS.pack(len(cells), len(tiles))]
+        parts.extend(
+            _KEY_CELL.pack(c.id, c.position[0], c.position[1], _color_bytes(c.color_hex)) for c in cells
+        )
+        parts.extend(_KEY_TILE.pack(x, y, sid, c) for (x, y), sid, c in tiles)
+        payload = zlib.compress(b"".join(parts), 1)
+
+        self._append(_RECORDS[KEYFRAME].pack(KEYFRAME, self.tick, len(payload)) + payload)
+        # воспроизведение журнала живого мира видит всё до последнего ключевого кадра
+        self.flush()
+
+    def motion(self, env: Environment):
+        """Позиции и скорости клеток — по ним воспроизведение двигает клетки между ключевыми кадрами."""
+        cells = [c for c in env.cells if c.alive] + env.buffer_cells
+        payload = zlib.compress(b"".join(
+            _MOTION_CELL.pack(c.id, c.position[0], c.position[1], c.velocity[0], c.velocity[1]) for c in cells
+        ), 1)
+        self._append(_RECORDS[MOTION].pack(MOTION, self.tick, len(payload)) + payload)
+
+    def flush(self):
+        if not self.buffer:
+            return
+        with open(self.path, "ab") as f:
+            f.write(self.buffer)
+        self.bytes_written += len(self.buffer)
+        self.buffer = bytearray()
+
+    def close(self):
+        self.flush()
+
+
+class EventLogReader:
+    """
+    Последовательное чтение журнала: header + итератор (вид, тик, поля).
+
+    Записи читаются из файла по одной — журнал не загружается в память целиком.
+    Смещения пройденных ключевых кадров запоминаются (keyframes), поэтому
+    seek_keyframe переходит к нужному кадру без повторного разбора журнала.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.file = open(path, "rb")
+        try:
+            if self.file.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"not an event log: {path}")
+            (header_len,) = _HEADER_LEN.unpack(self.file.read(_HEADER_LEN.size))
+            self.header = json.loads(self.file.read(header_len).decode("utf-8"))
+        except Exception:
+            self.file.close()
+            raise
+        self.start = self.file.tell()
+        # (тик, смещение) ключевых кадров в порядке файла
+        self.keyframes: List[Tuple[int, int]] = []
+
+    def close(self):
+        self.file.close()
+
+    def rewind(self):
+        self.file.seek(self.start)
+
+    def peek_tick(self) -> int | None:
+        offset = self.file.tell()
+        head = self.file.read(_KIND_TICK.size)
+        self.file.seek(offset)
+        if len(head) < _KIND_TICK.size:
+            return None
+        return _KIND_TICK.unpack(head)[1]
+
+    def _read_record(self, payload: bool):
+        """
+        Читает запись с текущего места; payload=False — сжатое тело (ключевой кадр,
+        движение) пропускается без чтения и распаковки. None — конец журнала или обрезанная запись
+        (процесс ещё пишет или упал): позиция чтения не сдвигается.
+        """
+        offset = self.file.tell()
+        head = self.file.read(1)
+        record = _RECORDS.get(head[0]) if head else None
+        data = head + self.file.read(record.size - 1) if record is not None else b""
+        if record is None or len(data) < record.size:
+            self.file.seek(offset)
+            return None
+        fields = record.unpack(data)
+        kind, tick = fields[0], fields[1]
+        if kind not in _COMPRESSED:
+            return kind, tick, fields[2:]
+
+        if kind == KEYFRAME and (not self.keyframes or offset > self.keyframes[-1][1]):
+            self.keyframes.append((tick, offset))
+        length = fields[2]
+        if not payload:
+            if self.file.seek(length, 1) > os.fstat(self.file.fileno()).st_size:
+                self.file.seek(offset)
+                return None
+            return kind, tick, None
+        body = self.file.read(length)
+        if len(body) < length:
+            self.file.seek(offset)
+            return None
+        return kind, tick, zlib.decompress(body)
+
+    def next(self):
+        """Возвращает следующую запись (kind, tick, fields) или None в конце журнала."""
+        return self._read_record(payload=True)
+
+    def seek_keyframe(self, tick: int) -> int | None:
+        """
+        Ставит чтение на последний ключевой кадр не позже tick и возвращает его тик;
+        None — такого кадра нет (чтение с начала журнала).
+        """
+        found = None
+        for keyframe in self.keyframes:
+            if keyframe[0] > tick:
+                break
+            found = keyframe
+        else:
+            # все известные кадры не позже tick — досматриваем журнал без распаковки
+            self.file.seek(self.start if found is None else found[1])
+            while True:
+                record = self._read_record(payload=False)
+                if record is None or record[1] > tick:
+                    break
+                if record[0] == KEYFRAME:
+                    found = self.keyframes[-1]
+
+        if found is None:
+            self.rewind()
+            return None
+        self.file.seek(found[1])
+        return found[0]
+
+
+class ReplayWorld:
+    """
+    Воспроизведение журнала с тем же интерфейсом, что у World (update / tick / env),
+    поэтому его можно подставить в цикл сервера и отрисовывать обычным кадром.
+
+    Журнал проигрывается по тикам. Клетки получают позицию и скорость из записей
+    MOTION, а между ними движутся по скорости с трением и стенами, как в Cell.move
+    (столкновения и ускорения генов не воспроизводятся — их поправит следующая
+    запись). Вещества меняются от записанных выделений и органики и каждый тик
+    выветриваются, как в SubstanceGrid.update; рассеивание по соседним ячейкам,
+    поглощение клетками и мелкие выделения не пишутся, поэтому сетка точна только
+    на ключевых кадрах.
+    Ключевой кадр полностью синхронизирует состояние.
+
+    update сервер вызывает в отдельном потоке: close, пришедший во время update,
+    закрывает журнал после него.
+    """
+
+    def __init__(self, path: str, ticks_per_update: int = 1):
+        self.reader = EventLogReader(path)
+        header = self.reader.header
+        # своя таблица веществ из заголовка (в порядке id журнала): id журнала -> id таблицы
+        ids = header.get("substance_ids", {})
+        substances = SubstanceRegistry()
+        substances.load(dict(sorted(header["substances"].items(), key=lambda item: ids.get(item[0], len(ids)))))
+        self.substance_map: Dict[int, int] = {sid: substances.ids[name] for name, sid in ids.items()}
+        physics = {k: v for k, v in header.get("physics", {}).items() if k in WorldConfig.FIELDS}
+        self.config = WorldConfig(substances=substances, **{**physics, "substance_diffusion_rate": 0.0})
+
+        self.env = Environment(header["width"], header["height"], self.config)
+        self.cells_by_id: Dict[int, Cell] = {}
+        first_tick = self.reader.peek_tick()
+        self.tick = first_tick - 1 if first_tick is not None else 0  # запись могла начаться не с нулевого тика
+        self.tick_time_ms = 0.0
+        self.ticks_per_update = ticks_per_update
+        self.finished = False
+        self.uuid = None
+        self.event_log = None
+        self.closed = False
+        self._updating = False
+        self._lock = threading.Lock()
+
+    def update(self):
+        """Продвигает воспроизведение на ticks_per_update тиков (не дальше конца журнала)."""
+        with self._lock:
+            if self.closed:
+                return
+            self._updating = True
+        try:
+            target = self.tick + self.ticks_per_update
+            while self.tick < target and self.reader.peek_tick() is not None:
+                self._step(self.tick + 1)
+            self.finished = self.reader.peek_tick() is None
+            self.env.cells = list(self.cells_by_id.values())
+            self.env.update_env_stats(self.tick)
+        finally:
+            with self._lock:
+                self._updating = False
+                if self.closed:
+                    self.reader.close()
+
+    def _step(self, tick: int):
+        """Один тик: движение клеток, записи тика, выветривание веществ."""
+        self.tick = tick
+        config = self.config
+        width, height = self.env.grid.width, self.env.grid.height
+        for cell in self.cells_by_id.values():
+            self._drift(cell, config, width, height)
+
+        decayed = False
+        while True:
+            next_tick = self.reader.peek_tick()
+            if next_tick is None or next_tick > tick:
+                break
+            record = self.reader.next()
+            if record is None:
+                break  # запись обрезана: журнал ещё пишется
+            if record[0] in _COMPRESSED and not decayed:
+                # ключевой кадр и движение пишутся после обновления сетки в тике
+                self._decay()
+                decayed = True
+            self._apply(*record)
+        if not decayed:
+            self._decay()
+
+    @staticmethod
+    def _drift(cell: Cell, config: WorldConfig, width: int, height: int):
+        """Сдвиг по скорости с трением, ограничением скорости и стенами (как Cell.move)."""
+        vx, vy = cell.velocity
+        if not vx and not vy:
+            return
+        vx *= config.friction
+        vy *= config.friction
+        speed = math.hypot(vx, vy)
+        if speed > config.max_velocity:
+            vx = vx / speed * config.max_velocity
+            vy = vy / speed * config.max_velocity
+
+        x = cell.position[0] + vx
+        y = cell.position[1] + vy
+        if x < 0:
+            x, vx = config.cell_radius, 0
+        elif x > width:
+            x, vx = width - config.cell_radius, 0
+        if y < 0:
+            y, vy = config.cell_radius, 0
+        elif y > height:
+            y, vy = height - config.cell_radius, 0
+        cell.position = (x, y)
+        cell.velocity = (vx, vy)
+
+    def _decay(self):
+        self.env.cells = list(self.cells_by_id.values())
+        self.env.update_sub_grid()
+
+    def _sid(self, sid: int) -> int:
+        return self.substance_map.get(sid, sid)
+
+    def _apply(self, kind: int, tick: int, fields):
+        grid = self.env.grid
+        if kind == BIRTH:
+            cell_id, _parent_id, x, y, color = fields
+            cell = Cell(position=(x, y), color_hex=_color_hex(color))
+            cell.id = cell_id
+            self.cells_by_id[cell_id] = cell
+        elif kind == DEATH:
+            self.cells_by_id.pop(fields[0], None)
+        elif kind == MUTATION:
+            cell = self.cells_by_id.get(fields[0])
+            if cell is not None:
+                cell.color_hex = _color_hex(fields[1])
+        elif kind == EMIT:
+            _cell_id, sid, cx, cy, amount = fields
+            spread = amount / len(_EMIT_DIRECTIONS)
+            for dx, dy in _EMIT_DIRECTIONS:
+                grid.add_concentration(cx + dx, cy + dy, self._sid(sid), spread)
+        elif kind == SPAWN:
+            sid, x, y, amount = fields
+            grid.add_concentration(x, y, self._sid(sid), amount)
+        elif kind == KEYFRAME:
+            self._apply_keyframe(fields)
+        elif kind == MOTION:
+            cells = self.cells_by_id
+            for cell_id, x, y, vx, vy in _MOTION_CELL.iter_unpack(fields):
+                cell = cells.get(cell_id)
+                if cell is not None:
+                    cell.position = (x, y)
+                    cell.velocity = (vx, vy)
+
+    def _apply_keyframe(self, payload: bytes):
+        cells_count, tiles_count = _KEY_COUNTS.unpack_from(payload, 0)
+        offset = _KEY_COUNTS.size
+
+        self.cells_by_id = {}
+        for cell_id, x, y, color in _KEY_CELL.iter_unpack(payload[offset:offset + cells_count * _KEY_CELL.size]):
+            cell = Cell(position=(x, y), color_hex=_color_hex(color))
+            cell.id = cell_id
+            self.cells_by_id[cell_id] = cell
+        offset += cells_count * _KEY_CELL.size
+
+        self.env = Environment(self.env.grid.width, self.env.grid.height, self.config)
+        grid = self.env.grid
+        for x, y, sid, concentration in _KEY_TILE.iter_unpack(payload[offset:offset + tiles_count * _KEY_TILE.size]):
+            grid.add_concentration(x, y, self._sid(sid), concentration)
+
+    def seek(self, tick: int):
+        """Перематывает к тику: от последнего ключевого кадра не позже него (он восстанавливает состояние)."""
+        keyframe_tick = self.reader.seek_keyframe(tick)
+        self.tick = 0 if keyframe_tick is None else keyframe_tick - 1
+        self.finished = False
+        self.cells_by_id = {}
+        self.env = Environment(self.env.grid.width, self.env.grid.height, self.config)
+        steps = self.ticks_per_update
+        self.ticks_per_update = tick - self.tick
+        self.update()
+        self.ticks_per_update = steps
+
+    def close(self):
+        with self._lock:
+            self.closed = True
+            if not self._updating:
+                self.reader.close()
@@ -1,4 +1,7 @@
 import random
+import sys
+from typing import List
+
 from config import ALL_SUBSTANCE_NAMES
 from models.action import Action
 from models.trigger import Trigger
@@ -10,6 +13,8 @@ class Gene:
     Если условие триггера выполняется, то активируется действие.
     """
 
+    __slots__ = ("receptor", "trigger", "action", "active", "mutation_rate", "fired", "silent")
+
     def __init__(
         self,
         receptor: str,
@@ -24,11 +29,15 @@ class Gene:
         :param action: действие при активации
         :param active: активен ли ген (может быть выключен)
         """
-        self.receptor = receptor
+        self.receptor = sys.intern(receptor)
         self.trigger = trigger
         self.action = action
         self.active = active
         self.mutation_rate = mutation_rate
+        # для обслуживания генома (Cell.maintain_genome): срабатывал ли ген с последнего
+        # учёта и сколько тиков жизни линии он до этого молчал (наследуется при делении)
+        self.fired = False
+        self.silent = 0
 
 
     def try_activate(self, cell: "Cell", environment: "Environment"):
@@ -36,34 +45,39 @@ class Gene:
         if not self.active:
             return
 
+        value = self.receptor_value(cell, environment)
+        if value is None:
+            return
+
+        if self.trigger.check(value):
+            self.fired = True
+            self.action.execute(cell, environment)
+
+    def receptor_value(self, cell: "Cell", environment: "Environment") -> float | None:
+        """Значение, на которое смотрит рецептор: концентрация в ячейке клетки или параметр клетки."""
         value = None
 
         # --- 1. Попробуем получить значение вещества из среды ---
         if self.receptor not in ("energy", "health"):
             x, y = cell.get_int_position()
-            substance = environment.grid.get_substance(x, y, self.receptor)
-            if substance:
-                value = substance.concentration
+            value = environment.grid.find_concentration(x, y, self.receptor)
 
         # --- 2. Если вещество не найдено, пробуем взять из клетки ---
         if value is None:
             value = getattr(cell, self.receptor, None)
 
-        if value is None:
-            return
+        return value
 
-        if self.trigger.check(value):
-            self.action.execute(cell, environment)
 
-
-    def mutate(self):
-        """Простая мутация параметров гена."""
+    def mutate(self, substance_names: List[str] | None = None):
+        """Простая мутация параметров гена (substance_names — вещества мира, по умолчанию все из config)."""
+        substance_names = substance_names or ALL_SUBSTANCE_NAMES
 
         if self.is_triggered_mutation():
             self.active = not self.active
 
         if self.is_triggered_mutation():
-            self.receptor = random.choice(ALL_SUBSTANCE_NAMES)
+            self.receptor = random.choice(substance_names)
 
         if self.is_triggered_mutation():
             if self.receptor in ("energy", "health"):
@@ -75,7 +89,7 @@ class Gene:
             self.action.power = random.uniform(0.1, 10.0)
 
         if self.is_triggered_mutation():
-            return Gene.create_random_gene()
+            return Gene.create_random_gene(substance_names)
 
         if self.is_triggered_mutation():
             self.action.move_mode = random.choice([
@@ -96,11 +110,13 @@ class Gene:
         return random.random() < self.mutation_rate
 
     @classmethod
-    def create_random_gene(cls) -> 'Gene':
+    def create_random_gene(cls, substance_names: List[str] | None = None) -> 'Gene':
         """Создаёт случайный ген."""
+        substance_names = substance_names or ALL_SUBSTANCE_NAMES
+
         # 85% генов реагируют на вещества, 15% — на внутренние параметры клетки
         if random.random() < 0.85:
-            receptor = random.choice(ALL_SUBSTANCE_NAMES)
+            receptor = random.choice(substance_names)
         else:
             receptor = random.choice(["energy", "health"])
 
@@ -123,10 +139,10 @@ class Gene:
                 Action.MOVE_AWAY,
                 Action.MOVE_AROUND,
             ])
-            substance_name = random.choice(ALL_SUBSTANCE_NAMES)
+            substance_name = random.choice(substance_names)
         else:
             move_mode = None
-            substance_name = random.choice(ALL_SUBSTANCE_NAMES)
+            substance_name = random.choice(substance_names)
 
         action = Action(
             type_=action_type,
@@ -143,21 +159,40 @@ class Gene:
 
     def to_tuple(self) -> tuple:
         """Простой стабильный ключ гена."""
+        # используем имена констант, чтобы сигнатура (и цвет вида) не зависела от их кодировки
         return (
             self.receptor,
-            getattr(self.trigger, "mode", ""),
-            round(getattr(self.trigger, "threshold", 0.0), 3),
-            getattr(self.action, "type", ""),
-            round(getattr(self.action, "power", 0.0), 3),
-            getattr(self.action, "substance_name", "") or "",
-            getattr(self.action, "move_mode", "") or "",
+            self.trigger.mode_name,
+            round(self.trigger.threshold, 3),
+            self.action.type_name,
+            round(self.action.power, 3),
+            self.action.substance_name or "",
+            self.action.move_mode_name or "",
             self.active,
         )
 
 
     def clone(self) -> 'Gene':
         """Создаёт копию без мутации."""
-        return Gene.from_dict(self.to_dict())
+        gene = Gene(
+            receptor=self.receptor,
+            trigger=Trigger(self.trigger.threshold, self.trigger.mode),
+            action=self.action.clone(),
+            active=self.active,
+            mutation_rate=self.mutation_rate,
+        )
+        gene.silent = self.silent
+        return gene
+
+    def identity(self) -> tuple:
+        """Точный ключ гена: гены с одинаковым ключом ведут себя одинаково."""
+        trigger, action = self.trigger, self.action
+        return (self.receptor, trigger.threshold, trigger.mode, action.type,
+                action.power, action.substance_name, action.move_mode, self.active)
+
+    def nbytes(self) -> int:
+        """Память под объект гена вместе с триггером и действием."""
+        return sys.getsizeof(self) + sys.getsizeof(self.trigger) + sys.getsizeof(self.action)
 
     def to_dict(self):
         return {
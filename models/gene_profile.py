@@ -0,0 +1,137 @@
+"""
+Профиль активации генов (включается по требованию, WorldConfig.gene_profile).
+
+Пока профилировщик подключён к среде (environment.gene_profiler), гены
+клеток проверяются через него, и для каждой группы генов — тип действия,
+режим движения и категория рецептора (ORGANIC / TOXIN / INORGANIC / CELL) —
+считаются проверки, срабатывания, поглощения из пустой ячейки и время
+проверки / действия. Данные собираются окнами по window тиков; в отчёт
+(и в статистику мира) попадает последнее законченное окно в пересчёте на тик.
+
+Кэш триггеров (SubstanceGrid.trigger_results) на время профилирования не
+используется: измеряется проверка каждого гена. В бэкенде "numpy" гены
+проверяются одной маской — время проверки записывается общим (batch),
+по группам считаются проверки, срабатывания и время действий.
+"""
+import time
+from typing import Dict, List
+
+from models.action import Action
+from models.substance_registry import SubstanceRegistry
+
+# поля счётчиков группы
+_EVALUATIONS, _FIRES, _EMPTY, _EVAL_SECONDS, _ACTION_SECONDS = range(5)
+
+
+class GeneProfiler:
+
+    def __init__(self, substances: SubstanceRegistry, window: int):
+        self.substances = substances
+        self.window = max(1, window)
+        # (тип действия, режим движения, категория рецептора) -> счётчики текущего окна
+        self.groups: Dict[tuple, list] = {}
+        self.batch_seconds = 0.0
+        self.ticks = 0
+        self.last: dict | None = None
+
+    def category(self, receptor: str) -> str:
+        if receptor in ("energy", "health"):
+            return "CELL"
+        sid = self.substances.ids.get(receptor)
+        return self.substances.types[sid] if sid is not None else "UNKNOWN"
+
+    def group(self, gene: "Gene") -> list:
+        action = gene.action
+        key = (action.type, action.move_mode, self.category(gene.receptor))
+        counters = self.groups.get(key)
+        if counters is None:
+            counters = self.groups[key] = [0, 0, 0, 0.0, 0.0]
+        return counters
+
+    def activate(self, cell: "Cell", environment: "Environment"):
+        """Активация генов клетки с замерами (результат тот же, что у Gene.try_activate по очереди)."""
+        perf_counter = time.perf_counter
+        for gene in cell.genes:
+            if not gene.active:
+                continue
+            counters = self.group(gene)
+
+            start = perf_counter()
+            value = gene.receptor_value(cell, environment)
+            triggered = value is not None and gene.trigger.check(value)
+            checked = perf_counter()
+            counters[_EVALUATIONS] += 1
+            counters[_EVAL_SECONDS] += checked - start
+
+            if triggered:
+                gene.fired = True
+                self.execute(gene, counters, cell, environment, checked)
+
+    def execute(self, gene: "Gene", counters: list, cell: "Cell", environment: "Environment",
+                start: float | None = None):
+        action = gene.action
+        if action.type == Action.ABSORB and action.substance_name:
+            x, y = cell.get_int_position()
+            if environment.grid.get_concentration(x, y, action.substance_name) <= 0.01:
+                counters[_EMPTY] += 1
+        if start is None:
+            start = time.perf_counter()
+        action.execute(cell, environment)
+        counters[_FIRES] += 1
+        counters[_ACTION_SECONDS] += time.perf_counter() - start
+
+    def count_evaluations(self, cells: List["Cell"], seconds: float):
+        """Бэкенд "numpy": проверки всех активных генов одной маской за seconds."""
+        for cell in cells:
+            for gene in cell.genes:
+                if gene.active:
+                    self.group(gene)[_EVALUATIONS] += 1
+        self.batch_seconds += seconds
+
+    def end_tick(self):
+        self.ticks += 1
+        if self.ticks >= self.window:
+            self.last = self._window_report()
+            self.groups = {}
+            self.batch_seconds = 0.0
+            self.ticks = 0
+
+    def _window_report(self) -> dict:
+        ticks = max(self.ticks, 1)
+        rows = []
+        for (type_, move_mode, category), c in self.groups.items():
+            rows.append({
+                "action": Action.TYPE_NAMES[type_],
+                "move_mode": Action.MOVE_MODE_NAMES[move_mode] if move_mode else None,
+                "receptor": category,
+                "evaluations": round(c[_EVALUATIONS] / ticks, 1),
+                "fires": round(c[_FIRES] / ticks, 1),
+                "empty": round(c[_EMPTY] / ticks, 1),
+                "eval_us": round(c[_EVAL_SECONDS] * 1e6 / ticks, 1),
+                "action_us": round(c[_ACTION_SECONDS] * 1e6 / ticks, 1),
+            })
+        rows.sort(key=lambda r: r["eval_us"] + r["action_us"], reverse=True)
+        return {
+            "ticks": self.ticks,
+            "batch_eval_us": round(self.batch_seconds * 1e6 / ticks, 1),
+            "groups": rows,
+        }
+
+    def report(self) -> dict:
+        """Последнее законченное окно (до первого — текущее), значения на тик."""
+        return self.last if self.last is not None else self._window_report()
+
+
+def format_gene_profile(report: dict, limit: int = 15) -> str:
+    """Текстовый вид отчёта для консоли."""
+    lines = [f"🧬 Активация генов (на тик, окно {report['ticks']} тиков):",
+             f"  {'action':<8} {'move':<7} {'receptor':<9} {'evals':>8} {'fires':>7} {'empty':>6} "
+             f"{'eval µs':>9} {'action µs':>10}"]
+    for row in report["groups"][:limit]:
+        lines.append(
+            f"  {row['action']:<8} {row['move_mode'] or '-':<7} {row['receptor']:<9} {row['evaluations']:8.1f} "
+            f"{row['fires']:7.1f} {row['empty']:6.1f} {row['eval_us']:9.1f} {row['action_us']:10.1f}"
+        )
+    if report["batch_eval_us"]:
+        lines.append(f"  проверка маской (numpy): {report['batch_eval_us']:.1f} µs")
+    return "\n".join(lines)
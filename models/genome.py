@@ -0,0 +1,420 @@
+"""
+Векторное представление генома (GENOME_BACKEND = "numpy").
+
+Гены клетки кодируются строками структурного массива NumPy. Массивы всех
+клеток склеены в одну таблицу (PopulationTable), которая живёт между тиками:
+рождения и смерти переносят её строки, заново она собирается лишь при смене
+генома живущей клетки. Значения рецепторов читаются без обхода генов в Python,
+триггеры проверяются одной булевой маской, а в Python вызываются только
+сработавшие действия. Мутация новорождённых выполняется
+пакетом случайных чисел в конце фазы клеток.
+
+Отличия от объектного режима:
+  * рецепторы читаются один раз в начале фазы генов: ген, зависящий от энергии,
+    не видит изменений, сделанных другими генами той же клетки в этом тике;
+  * движение и смерть клеток обрабатываются после действий всех клеток.
+
+Объекты Gene остаются основным представлением (сериализация, статистика,
+цвет вида); массив — кэш в Cell.genome, общий у клеток-копий.
+"""
+import operator
+import random
+import time
+from itertools import chain, repeat
+from typing import List
+
+import numpy as np
+
+from models.action import Action
+from models.gene import Gene
+from models.substance_registry import SubstanceRegistry
+from models.trigger import Trigger
+
+GENE_DTYPE = np.dtype([
+    ("receptor", np.int16),       # id вещества или RECEPTOR_ENERGY / RECEPTOR_HEALTH
+    ("mode", np.int8),            # Trigger.LESS / Trigger.GREATER
+    ("threshold", np.float64),
+    ("action", np.int8),          # Action.DIVIDE ... Action.HEALS
+    ("power", np.float64),
+    ("substance", np.int16),      # id вещества действия или -1
+    ("move_mode", np.int8),       # 0 — нет режима
+    ("active", np.bool_),
+    ("mutation_rate", np.float64),
+])
+
+RECEPTOR_ENERGY = -1
+RECEPTOR_HEALTH = -2
+RECEPTOR_UNKNOWN = -3  # рецептор не вещество и не параметр клетки — ген никогда не срабатывает
+
+_CELL_RECEPTORS = {"energy": RECEPTOR_ENERGY, "health": RECEPTOR_HEALTH}
+_RECEPTOR_NAMES = {RECEPTOR_ENERGY: "energy", RECEPTOR_HEALTH: "health"}
+
+_GENOME = operator.attrgetter("genome")
+_GENES = operator.attrgetter("genes")
+_ENERGY = operator.attrgetter("energy")
+_HEALTH = operator.attrgetter("health")
+_POSITION = operator.attrgetter("position")
+_NO_SUBSTANCES: dict = {}
+
+_MOVE_MODES = np.array([
+    Action.MOVE_RANDOM, Action.MOVE_TOWARD, Action.MOVE_AWAY, Action.MOVE_AROUND, 0,
+], dtype=np.int8)
+_ACTION_TYPES = np.array([
+    Action.DIVIDE, Action.EMIT, Action.ABSORB, Action.MOVE, Action.HEALS,
+], dtype=np.int8)
+
+
+def concat_genomes(genomes: List[np.ndarray]) -> np.ndarray:
+    """
+    Склеивает геномы клеток. np.concatenate для структурных dtype на каждом
+    массиве заново сводит поля, поэтому склеиваем байтовые представления.
+    """
+    if not genomes:
+        return np.zeros(0, dtype=GENE_DTYPE)
+    return np.concatenate([g.view(np.uint8) for g in genomes]).view(GENE_DTYPE)
+
+
+def _receptor_code(name: str, substances: SubstanceRegistry) -> int:
+    code = _CELL_RECEPTORS.get(name)
+    if code is not None:
+        return code
+    return substances.ids.get(name, RECEPTOR_UNKNOWN)
+
+
+def _receptor_name(code: int, substances: SubstanceRegistry) -> str | None:
+    """Имя рецептора по коду; None для RECEPTOR_UNKNOWN — имя такого рецептора в таблице не хранится."""
+    if code == RECEPTOR_UNKNOWN:
+        return None
+    return _RECEPTOR_NAMES.get(code) or substances.names[code]
+
+
+def encode_genes(genes: List[Gene], substances: SubstanceRegistry) -> np.ndarray:
+    """Кодирует список генов в строки GENE_DTYPE (id веществ — из таблицы мира)."""
+    ids = substances.ids
+    return np.array([
+        (
+            _receptor_code(g.receptor, substances),
+            g.trigger.mode,
+            g.trigger.threshold,
+            g.action.type,
+            g.action.power,
+            ids.get(g.action.substance_name, -1) if g.action.substance_name else -1,
+            g.action.move_mode or 0,
+            g.active,
+            g.mutation_rate,
+        )
+        for g in genes
+    ], dtype=GENE_DTYPE)
+
+
+def decode_gene(row, substances: SubstanceRegistry) -> Gene:
+    """Создаёт объект Gene из строки GENE_DTYPE."""
+    substance = int(row["substance"])
+    receptor = _receptor_name(int(row["receptor"]), substances)
+    if receptor is None:
+        raise ValueError("gene row with an unknown receptor cannot be decoded")
+    return Gene(
+        receptor=receptor,
+        trigger=Trigger(float(row["threshold"]), int(row["mode"])),
+        action=Action(
+            type_=int(row["action"]),
+            power=float(row["power"]),
+            substance_name=substances.names[substance] if substance >= 0 else None,
+            move_mode=int(row["move_mode"]) or None,
+        ),
+        active=bool(row["active"]),
+        mutation_rate=float(row["mutation_rate"]),
+    )
+
+
+class PopulationTable:
+    """
+    Гены популяции одной таблицей и то, что из неё не меняется между тиками:
+    владелец и номер каждого гена, маски срабатывания, строки с рецепторами
+    веществ. Значения рецепторов собираются заново каждый тик.
+    """
+
+    def __init__(self, cells: List["Cell"], genomes: List[np.ndarray], rows: np.ndarray | None = None):
+        self.cells = list(cells)
+        self.genomes = genomes
+        self.gene_counts = list(map(len, genomes))
+        lengths = np.array(self.gene_counts, dtype=np.intp)
+        if rows is None:
+            rows = concat_genomes(genomes)
+        self.rows = rows
+
+        self.owner = np.repeat(np.arange(len(cells)), lengths)
+        # номер гена внутри клетки
+        self.local = np.arange(len(rows)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+
+        receptor = rows["receptor"]
+        mode = rows["mode"]
+        self.threshold = rows["threshold"]
+        self.less = rows["active"] & (mode == Trigger.LESS)
+        self.greater = rows["active"] & (mode == Trigger.GREATER)
+
+        self.substance_rows = np.flatnonzero(receptor >= 0)
+        self.substance_ids = receptor[self.substance_rows].tolist()
+        self.substance_owner = self.owner[self.substance_rows]
+        self.energy_rows = np.flatnonzero(receptor == RECEPTOR_ENERGY)
+        self.energy_owner = self.owner[self.energy_rows]
+        self.health_rows = np.flatnonzero(receptor == RECEPTOR_HEALTH)
+        self.health_owner = self.owner[self.health_rows]
+
+    def carry_over(self, cells: List["Cell"], genomes: List[np.ndarray]) -> "PopulationTable | None":
+        """
+        Таблица для нового состава клеток из строк этой: строки выбывших клеток
+        вырезаются маской, геномы новых дописываются в конец. None — если порядок
+        оставшихся клеток изменился или у какой-то из них сменился геном.
+        """
+        index = dict(zip(map(id, self.cells), range(len(self.cells))))
+        found = list(map(index.get, map(id, cells), repeat(-1)))
+        kept = len(found) - found.count(-1)
+        if found[kept:].count(-1) != len(found) - kept:
+            return None  # новые клетки не только в конце списка
+        kept_index = np.array(found[:kept], dtype=np.intp)
+        if np.any(np.diff(kept_index) <= 0):
+            return None
+        if not all(map(operator.is_, genomes[:kept], map(self.genomes.__getitem__, found[:kept]))):
+            return None
+
+        keep = np.zeros(len(self.cells), dtype=bool)
+        keep[kept_index] = True
+        rows = concat_genomes([self.rows[keep[self.owner]], *genomes[kept:]])
+        return PopulationTable(cells, genomes, rows)
+
+    def receptor_values(self, grid) -> np.ndarray:
+        """Значения рецепторов всех генов: концентрация в ячейке клетки или энергия/здоровье."""
+        cells = self.cells
+        count = len(cells)
+        values = np.full(len(self.rows), np.nan)
+
+        if len(self.energy_rows):
+            energy = np.fromiter(map(_ENERGY, cells), dtype=np.float64, count=count)
+            values[self.energy_rows] = energy[self.energy_owner]
+        if len(self.health_rows):
+            health = np.fromiter(map(_HEALTH, cells), dtype=np.float64, count=count)
+            values[self.health_rows] = health[self.health_owner]
+
+        if len(self.substance_rows):
+            # ячейки клеток (int() — отбрасывание дробной части, как в Cell.get_int_position)
+            positions = np.fromiter(
+                chain.from_iterable(map(_POSITION, cells)), dtype=np.float64, count=2 * count
+            ).astype(np.intp).reshape(count, 2)
+            x = positions[:, 0] - positions[:, 0].min()
+            y = positions[:, 1] - positions[:, 1].min()
+            _, first, cell_tile = np.unique(x * (y.max() + 1) + y, return_index=True, return_inverse=True)
+            tile_subs = np.empty(len(first), dtype=object)
+            tile_subs[:] = list(map(grid.grid.get, map(tuple, positions[first].tolist()), repeat(_NO_SUBSTANCES)))
+            row_subs = tile_subs[cell_tile.reshape(-1)[self.substance_owner]].tolist()
+            values[self.substance_rows] = np.fromiter(
+                map(dict.get, row_subs, self.substance_ids, repeat(np.nan)),
+                dtype=np.float64, count=len(row_subs),
+            )
+        return values
+
+
+class GenomeEngine:
+    """Вычисление генов всей популяции за тик и пакетная мутация."""
+
+    def __init__(self, substances: SubstanceRegistry, seed: int | None = None):
+        if seed is None:
+            # наследуем детерминизм от random.seed()
+            seed = random.getrandbits(64)
+        self.substances = substances
+        self.rng = np.random.default_rng(seed)
+        self.pending_mutations: List["Cell"] = []
+        self.table: PopulationTable | None = None
+        self.table_builds = 0
+
+    def __getstate__(self):
+        # таблица пересобирается по клеткам, копировать её вместе с миром незачем
+        state = self.__dict__.copy()
+        state["table"] = None
+        return state
+
+    def reseed(self, seed: int):
+        self.rng = np.random.default_rng(seed)
+
+    def genome_of(self, cell: "Cell") -> np.ndarray:
+        genome = cell.genome
+        if genome is None or len(genome) != len(cell.genes):
+            genome = cell.genome = encode_genes(cell.genes, self.substances)
+        return genome
+
+    def schedule_mutation(self, cell: "Cell"):
+        self.pending_mutations.append(cell)
+
+    def update_cells(self, environment: "Environment"):
+        """Фаза клеток: начало тика, все гены разом, действия, движение и смерть."""
+        cells = [c for c in environment.cells if c.alive]
+        if not cells:
+            return
+
+        for cell in cells:
+            cell.begin_update(environment)
+
+        self.activate_genes(cells, environment)
+
+        for cell in cells:
+            cell.finish_update(environment)
+
+        self.apply_pending_mutations(environment)
+
+    def population_table(self, cells: List["Cell"]) -> "PopulationTable":
+        """
+        Склеенная таблица генов популяции, общая для тиков. Клетки и их массивы
+        сравниваются по идентичности: без рождений, смертей и мутаций таблица
+        берётся как есть; рождения и смерти переносят её строки (carry_over);
+        заново она склеивается, только если сменился геном живущей клетки
+        (чистка генома) или порядок клеток.
+        """
+        table = self.table
+        if (
+            table is not None
+            and len(cells) == len(table.cells)
+            and all(map(operator.is_, cells, table.cells))
+            and all(map(operator.is_, map(_GENOME, cells), table.genomes))
+            and list(map(len, map(_GENES, cells))) == table.gene_counts
+        ):
+            return table
+        genomes = list(map(_GENOME, cells))
+        if any(map(operator.is_, genomes, repeat(None))) or list(map(len, map(_GENES, cells))) != list(map(len, genomes)):
+            genomes = [self.genome_of(c) for c in cells]
+        if table is not None:
+            table = table.carry_over(cells, genomes)
+        if table is None:
+            table = PopulationTable(cells, genomes)
+            self.table_builds += 1
+        self.table = table
+        return table
+
+    def activate_genes(self, cells: List["Cell"], environment: "Environment"):
+        population = self.population_table(cells)
+        if not len(population.rows):
+            return
+
+        profiler = environment.gene_profiler
+        start = time.perf_counter()
+        values = population.receptor_values(environment.grid)
+
+        # NaN (вещества нет в ячейке) не проходит ни одно сравнение — как и в Gene.try_activate
+        threshold = population.threshold
+        fired = (population.less & (values < threshold)) | (population.greater & (values > threshold))
+
+        fired_rows = np.flatnonzero(fired)
+        if profiler is not None:
+            profiler.count_evaluations(cells, time.perf_counter() - start)
+        for i, k in zip(population.owner[fired_rows].tolist(), population.local[fired_rows].tolist()):
+            cell = cells[i]
+            gene = cell.genes[k]
+            gene.fired = True
+            if profiler is None:
+                gene.action.execute(cell, environment)
+            else:
+                profiler.execute(gene, profiler.group(gene), cell, environment)
+
+    # --- мутация ---
+
+    def apply_pending_mutations(self, environment: "Environment"):
+        """Мутирует геномы всех новорождённых тика одним пакетом (аналог Gene.mutate)."""
+        cells = self.pending_mutations
+        if not cells:
+            return
+        self.pending_mutations = []
+
+        genomes = [self.genome_of(c) for c in cells]
+        lengths = np.fromiter((len(g) for g in genomes), dtype=np.intp, count=len(genomes))
+        if not lengths.sum():
+            return
+
+        before = concat_genomes(genomes)
+        table = before.copy()
+        owner = np.repeat(np.arange(len(cells)), lengths)
+        n = len(table)
+        rng = self.rng
+        ids = self.substances.ids
+        substance_ids = np.array([ids[name] for name in self.substances.visible_names()], dtype=np.int16)
+
+        # семь независимых бросков на ген, как в Gene.mutate
+        hit = rng.random((n, 7)) < table["mutation_rate"][:, None]
+
+        table["active"] ^= hit[:, 0]
+
+        table["receptor"] = np.where(hit[:, 1], rng.choice(substance_ids, n), table["receptor"])
+
+        # как в Gene.mutate: неизвестный рецептор получает порог вещества
+        receptor = table["receptor"]
+        on_cell = (receptor == RECEPTOR_ENERGY) | (receptor == RECEPTOR_HEALTH)
+        new_threshold = np.where(on_cell, rng.uniform(1, 100.0, n), rng.uniform(0.1, 10.0, n))
+        table["threshold"] = np.where(hit[:, 2], new_threshold, table["threshold"])
+
+        table["power"] = np.where(hit[:, 3], rng.uniform(0.1, 10.0, n), table["power"])
+
+        # появление нового гена обрывает мутацию гена (оставшиеся броски не применяются)
+        spawned = hit[:, 4]
+        late = ~spawned
+        table["move_mode"] = np.where(hit[:, 5] & late, rng.choice(_MOVE_MODES, n), table["move_mode"])
+
+        scale = rng.choice((1.15, 0.85), n)
+        table["mutation_rate"] = np.where(
+            hit[:, 6] & late, np.minimum(table["mutation_rate"] * scale, 1.0), table["mutation_rate"]
+        )
+
+        new_rows = self.random_rows(int(spawned.sum()), substance_ids)
+        new_owner = owner[spawned]
+
+        changed_rows = before != table
+        changed_cells = np.zeros(len(cells), dtype=bool)
+        changed_cells[owner[changed_rows]] = True
+        changed_cells[new_owner] = True
+
+        offsets = np.cumsum(lengths) - lengths
+        for i in np.flatnonzero(changed_cells).tolist():
+            cell = cells[i]
+            start = offsets[i]
+            rows = table[start:start + lengths[i]]
+            for local in np.flatnonzero(changed_rows[start:start + lengths[i]]).tolist():
+                self._write_back(cell.genes[local], rows[local])
+
+            extra = new_rows[new_owner == i]
+            cell.genes.extend(decode_gene(r, self.substances) for r in extra)
+            cell.genome = concat_genomes([rows, extra])
+
+            cell.speciate(environment)
+
+    def random_rows(self, count: int, substance_ids: np.ndarray) -> np.ndarray:
+        """Пакетный аналог Gene.create_random_gene."""
+        rng = self.rng
+        rows = np.zeros(count, dtype=GENE_DTYPE)
+        if not count:
+            return rows
+
+        on_substance = rng.random(count) < 0.85
+        rows["receptor"] = np.where(
+            on_substance,
+            rng.choice(substance_ids, count),
+            rng.choice(np.array([RECEPTOR_ENERGY, RECEPTOR_HEALTH], dtype=np.int16), count),
+        )
+        rows["threshold"] = np.where(
+            on_substance, rng.uniform(0.1, 10.0, count), rng.uniform(1, 100.0, count)
+        )
+        rows["mode"] = rng.choice(np.array([Trigger.LESS, Trigger.GREATER], dtype=np.int8), count)
+        rows["action"] = rng.choice(_ACTION_TYPES, count)
+        rows["move_mode"] = np.where(rows["action"] == Action.MOVE, rng.choice(_MOVE_MODES[:4], count), 0)
+        rows["substance"] = rng.choice(substance_ids, count)
+        rows["power"] = rng.uniform(0.1, 10.0, count)
+        rows["active"] = True
+        rows["mutation_rate"] = 0.07
+        return rows
+
+    def _write_back(self, gene: Gene, row):
+        """Переносит мутировавшую строку в объект гена (гены новорождённого — уже копии)."""
+        receptor = _receptor_name(int(row["receptor"]), self.substances)
+        if receptor is not None:  # неизвестный рецептор не мутировал — имя гена прежнее
+            gene.receptor = receptor
+        gene.active = bool(row["active"])
+        gene.trigger.threshold = float(row["threshold"])
+        gene.action.power = float(row["power"])
+        gene.action.move_mode = int(row["move_mode"]) or None
+        gene.mutation_rate = float(row["mutation_rate"])
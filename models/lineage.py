@@ -0,0 +1,312 @@
+"""
+Родословная клеток и видов с ограниченным потреблением памяти.
+
+Узлы хранятся не объектами, а в параллельных растущих массивах (array):
+одна запись на клетку (родитель, тик рождения, тик смерти, вид) и одна
+запись на вид (вид-предок, тик появления, тик вымирания, цвет, число живых).
+Родитель всегда записан раньше потомка, поэтому индекс родителя меньше
+индекса потомка — обход предков и обрезка делаются одним проходом.
+
+Раз в LINEAGE_PRUNE_PERIOD тиков prune():
+  * удаляет клетки без живых потомков;
+  * «склеивает» мёртвые клетки с единственным оставшимся потомком
+    (в дереве клеток остаются только живые клетки и точки ветвления,
+    т.е. не больше 2×живых узлов);
+  * так же поступает с видами: удаляет вымершие виды без живых видов-потомков
+    и склеивает вымершие виды с единственным оставшимся видом-потомком
+    (species_ancestors возвращает только точки ветвления, видов в дереве
+    не больше 2×живых).
+"""
+from array import array
+from typing import Dict, List
+
+ALIVE = -1
+NO_PARENT = -1
+
+
+class Lineage:
+    """Родословная одного мира. Методы birth/death/speciate вызываются из горячего кода."""
+
+    def __init__(self):
+        self.tick = 0
+
+        # --- клетки ---
+        self.cell_slot: Dict[int, int] = {}  # id клетки -> индекс узла
+        self.cell_id = array("q")
+        self.cell_parent = array("i")
+        self.cell_born = array("q")
+        self.cell_died = array("q")
+        self.cell_species = array("q")
+
+        # --- виды ---
+        self.species_slot: Dict[int, int] = {}  # id вида -> индекс узла
+        self.species_id = array("q")
+        self.species_parent = array("i")
+        self.species_born = array("q")
+        self.species_extinct = array("q")
+        self.species_color = array("i")
+        self.species_living = array("i")
+
+    # --- запись событий ---
+
+    def _add_species(self, species_id: int, parent_slot: int, color_hex: str | None) -> int:
+        slot = len(self.species_id)
+        self.species_slot[species_id] = slot
+        self.species_id.append(species_id)
+        self.species_parent.append(parent_slot)
+        self.species_born.append(self.tick)
+        self.species_extinct.append(ALIVE)
+        self.species_color.append(int(color_hex[1:7], 16) if color_hex else 0)
+        self.species_living.append(0)
+        return slot
+
+    def _species_of(self, cell: "Cell") -> int:
+        slot = self.species_slot.get(cell.species_id)
+        if slot is None:
+            slot = self._add_species(cell.species_id, NO_PARENT, cell.color_hex)
+        return slot
+
+    def _change_living(self, species_slot: int, delta: int):
+        living = self.species_living[species_slot] + delta
+        self.species_living[species_slot] = living
+        if living <= 0:
+            self.species_extinct[species_slot] = self.tick
+        elif delta > 0:
+            self.species_extinct[species_slot] = ALIVE
+
+    def _add_cell(self, cell: "Cell", parent_slot: int, born: int) -> int:
+        slot = len(self.cell_id)
+        self.cell_slot[cell.id] = slot
+        self.cell_id.append(cell.id)
+        self.cell_parent.append(parent_slot)
+        self.cell_born.append(born)
+        self.cell_died.append(ALIVE)
+        self.cell_species.append(cell.species_id)
+        self._change_living(self._species_of(cell), 1)
+        return slot
+
+    def adopt(self, cell: "Cell") -> int:
+        """Индекс узла клетки; неизвестная клетка (начальная или загруженная) становится корнем."""
+        slot = self.cell_slot.get(cell.id)
+        if slot is None:
+            slot = self._add_cell(cell, NO_PARENT, self.tick - cell.age)
+        return slot
+
+    def birth(self, cell: "Cell", parent: "Cell"):
+        self._add_cell(cell, self.adopt(parent), self.tick)
+
+    def death(self, cell: "Cell"):
+        slot = self.cell_slot.get(cell.id)
+        if slot is None or self.cell_died[slot] != ALIVE:
+            return
+        self.cell_died[slot] = self.tick
+        self._change_living(self.species_slot[self.cell_species[slot]], -1)
+
+    def speciate(self, cell: "Cell", parent_species: int):
+        """Клетка (уже с новым species_id) отделилась от вида parent_species."""
+        slot = self.adopt(cell)
+        old = self.cell_species[slot]
+        if old == cell.species_id:
+            return
+        self._change_living(self.species_slot[old], -1)
+        parent_slot = self.species_slot.get(parent_species, NO_PARENT)
+        self.cell_species[slot] = cell.species_id
+        self._change_living(self._add_species(cell.species_id, parent_slot, cell.color_hex), 1)
+
+    # --- обрезка ---
+
+    def prune(self, cells: List["Cell"]):
+        """Удаляет ветви без живых потомков; cells — живые клетки мира."""
+        for cell in cells:
+            if cell.alive:
+                self.adopt(cell)
+        self._prune_cells()
+        self._prune_species()
+
+    def _prune_cells(self):
+        n = len(self.cell_id)
+        parent = self.cell_parent
+        died = self.cell_died
+
+        # узел нужен, если он жив или у него есть живые потомки
+        keep = bytearray(n)
+        for i in range(n - 1, -1, -1):
+            if died[i] == ALIVE:
+                keep[i] = 1
+            if keep[i] and parent[i] != NO_PARENT:
+                keep[parent[i]] = 1
+
+        # мёртвый узел с единственным потомком ничего не добавляет к ветвлению
+        children = bytearray(n)
+        for i in range(n):
+            p = parent[i]
+            if keep[i] and p != NO_PARENT and children[p] < 2:
+                children[p] += 1
+        for i in range(n):
+            if keep[i] and died[i] != ALIVE and children[i] == 1:
+                keep[i] = 0
+                children[i] = 2  # признак «склеен»: потомки переходят к его предку
+
+        # новый индекс сохранённого узла или ближайшего сохранённого предка склеенного
+        remap = array("i", [NO_PARENT]) * n
+        next_parent = array("i", [NO_PARENT]) * n
+        kept = 0
+        for i in range(n):
+            p = parent[i]
+            ancestor = NO_PARENT if p == NO_PARENT else remap[p]
+            if keep[i]:
+                remap[i] = kept
+                next_parent[kept] = ancestor
+                kept += 1
+            elif children[i] == 2:
+                remap[i] = ancestor
+
+        if kept == n:
+            return
+
+        self.cell_id = array("q", (v for i, v in enumerate(self.cell_id) if keep[i]))
+        self.cell_parent = next_parent[:kept]
+        self.cell_born = array("q", (v for i, v in enumerate(self.cell_born) if keep[i]))
+        self.cell_died = array("q", (v for i, v in enumerate(died) if keep[i]))
+        self.cell_species = array("q", (v for i, v in enumerate(self.cell_species) if keep[i]))
+        self.cell_slot = {cell_id: slot for slot, cell_id in enumerate(self.cell_id)}
+
+    def _prune_species(self):
+        n = len(self.species_id)
+        parent = self.species_parent
+
+        keep = bytearray(n)
+        for i in range(n - 1, -1, -1):
+            if self.species_living[i] > 0:
+                keep[i] = 1
+            if keep[i] and parent[i] != NO_PARENT:
+                keep[parent[i]] = 1
+
+        # вымерший вид с единственным видом-потомком ничего не добавляет к ветвлению
+        living = self.species_living
+        children = bytearray(n)
+        for i in range(n):
+            p = parent[i]
+            if keep[i] and p != NO_PARENT and children[p] < 2:
+                children[p] += 1
+        for i in range(n):
+            if keep[i] and living[i] <= 0 and children[i] == 1:
+                keep[i] = 0
+                children[i] = 2  # признак «склеен»: потомки переходят к его предку
+
+        if all(keep):
+            return
+
+        # новый индекс сохранённого вида или ближайшего сохранённого предка склеенного
+        remap = array("i", [NO_PARENT]) * n
+        next_parent = array("i", [NO_PARENT]) * n
+        kept = 0
+        for i in range(n):
+            p = parent[i]
+            ancestor = NO_PARENT if p == NO_PARENT else remap[p]
+            if keep[i]:
+                remap[i] = kept
+                next_parent[kept] = ancestor
+                kept += 1
+            elif children[i] == 2:
+                remap[i] = ancestor
+
+        def compact(values, typecode):
+            return array(typecode, (v for i, v in enumerate(values) if keep[i]))
+
+        self.species_id = compact(self.species_id, "q")
+        self.species_parent = next_parent[:kept]
+        self.species_born = compact(self.species_born, "q")
+        self.species_extinct = compact(self.species_extinct, "q")
+        self.species_color = compact(self.species_color, "i")
+        self.species_living = compact(self.species_living, "i")
+        self.species_slot = {species_id: slot for slot, species_id in enumerate(self.species_id)}
+
+    # --- запросы ---
+
+    def species_ancestors(self, species_id: int) -> List[int]:
+        """Сохранённые предки вида от ближайшего к самому древнему (склеенные звенья пропущены)."""
+        slot = self.species_slot.get(species_id)
+        if slot is None:
+            return []
+        result = []
+        slot = self.species_parent[slot]
+        while slot != NO_PARENT:
+            result.append(self.species_id[slot])
+            slot = self.species_parent[slot]
+        return result
+
+    def cell_ancestors(self, cell_id: int) -> List[int]:
+        """Сохранённые предки клетки (склеенные звенья цепочки пропущены)."""
+        slot = self.cell_slot.get(cell_id)
+        if slot is None:
+            return []
+        result = []
+        slot = self.cell_parent[slot]
+        while slot != NO_PARENT:
+            result.append(self.cell_id[slot])
+            slot = self.cell_parent[slot]
+        return result
+
+    def species_info(self, species_id: int) -> dict | None:
+        slot = self.species_slot.get(species_id)
+        if slot is None:
+            return None
+        parent = self.species_parent[slot]
+        extinct = self.species_extinct[slot]
+        return {
+            "id": species_id,
+            "parent": None if parent == NO_PARENT else self.species_id[parent],
+            "born": self.species_born[slot],
+            "extinct": None if extinct == ALIVE else extinct,
+            "color_hex": f"#{self.species_color[slot]:06X}",
+            "living": self.species_living[slot],
+        }
+
+    def size(self) -> dict:
+        return {"cells": len(self.cell_id), "species": len(self.species_id)}
+
+    # --- сериализация ---
+
+    def to_dict(self) -> dict:
+        return {
+            "tick": self.tick,
+            "cells": {
+                "id": self.cell_id.tolist(),
+                "parent": self.cell_parent.tolist(),
+                "born": self.cell_born.tolist(),
+                "died": self.cell_died.tolist(),
+                "species": self.cell_species.tolist(),
+            },
+            "species": {
+                "id": self.species_id.tolist(),
+                "parent": self.species_parent.tolist(),
+                "born": self.species_born.tolist(),
+                "extinct": self.species_extinct.tolist(),
+                "color": self.species_color.tolist(),
+                "living": self.species_living.tolist(),
+            },
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Lineage":
+        lineage = cls()
+        lineage.tick = data.get("tick", 0)
+
+        cells = data.get("cells", {})
+        lineage.cell_id = array("q", cells.get("id", []))
+        lineage.cell_parent = array("i", cells.get("parent", []))
+        lineage.cell_born = array("q", cells.get("born", []))
+        lineage.cell_died = array("q", cells.get("died", []))
+        lineage.cell_species = array("q", cells.get("species", []))
+        lineage.cell_slot = {cell_id: slot for slot, cell_id in enumerate(lineage.cell_id)}
+
+        species = data.get("species", {})
+        lineage.species_id = array("q", species.get("id", []))
+        lineage.species_parent = array("i", species.get("parent", []))
+        lineage.species_born = array("q", species.get("born", []))
+        lineage.species_extinct = array("q", species.get("extinct", []))
+        lineage.species_color = array("i", species.get("color", []))
+        lineage.species_living = array("i", species.get("living", []))
+        lineage.species_slot = {species_id: slot for slot, species_id in enumerate(lineage.species_id)}
+        return lineage
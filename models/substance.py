@@ -1,7 +1,12 @@
-from config import SUBSTANCES
+class Substance:
+    """
+    Порция вещества: id типа из таблицы веществ мира + концентрация.
+    Имя, тип, энергия и летучесть не копируются в каждый экземпляр,
+    а читаются из таблицы (registry) по id.
+    """
 
+    __slots__ = ("registry", "id", "concentration")
 
-class Substance:
     ORGANIC = 'ORGANIC'
     INORGANIC = 'INORGANIC'
     TOXIN = 'TOXIN'
@@ -12,13 +17,42 @@ class Substance:
         type_: str,
         concentration: float,
         energy: float,
-        volatility: float = 0.01
+        volatility: float = 0.01,
+        *,
+        registry: "SubstanceRegistry",
     ):
-        self.name = name
-        self.type = type_
+        sid = registry.ids.get(name)
+        if sid is None or name not in registry:
+            # неизвестное вещество (например, из старого сохранения) — регистрируем
+            sid = registry.register(name, type_, energy, volatility)
+        self.registry = registry
+        self.id = sid
         self.concentration = concentration
-        self.energy = energy
-        self.volatility = volatility  # 0.0 — стабильное, 0.9 — быстро распадается
+
+    @classmethod
+    def from_id(cls, registry: "SubstanceRegistry", substance_id: int, concentration: float) -> 'Substance':
+        """Создаёт вещество по id типа без поиска по имени."""
+        obj = cls.__new__(cls)
+        obj.registry = registry
+        obj.id = substance_id
+        obj.concentration = concentration
+        return obj
+
+    @property
+    def name(self) -> str:
+        return self.registry.names[self.id]
+
+    @property
+    def type(self) -> str:
+        return self.registry.types[self.id]
+
+    @property
+    def energy(self) -> float:
+        return self.registry.energies[self.id]
+
+    @property
+    def volatility(self) -> float:
+        return self.registry.volatilities[self.id]  # 0.0 — стабильное, 0.9 — быстро распадается
 
     def update(self):
         """Естественное рассеивание."""
@@ -30,13 +64,13 @@ class Substance:
         return self.concentration > 0
 
     @staticmethod
-    def find_substance(name: str):
-        data = SUBSTANCES[name]
-        return data
+    def find_substance(registry: "SubstanceRegistry", name: str) -> dict:
+        """Свойства типа вещества по имени (type, energy, volatility) из таблицы мира."""
+        return registry[name]
 
     def clone(self) -> 'Substance':
         """Создаёт копию вещества"""
-        return Substance.from_dict(self.to_dict())
+        return Substance.from_id(self.registry, self.id, self.concentration)
 
     def to_dict(self):
         return {
@@ -48,16 +82,17 @@ class Substance:
         }
 
     @classmethod
-    def from_dict(cls, data):
+    def from_dict(cls, data, registry: "SubstanceRegistry"):
         return cls(
             name=data["name"],
             type_=data["type"],
             concentration=data["concentration"],
             energy=data["energy"],
-            volatility=data["volatility"]
+            volatility=data["volatility"],
+            registry=registry,
         )
 
     def __repr__(self):
         return (f"Substance(name={self.name}, type={self.type}, "
                 f"conc={self.concentration:.3f}, energy={self.energy:.2f}, "
-                f"volatility={self.volatility:.3f})")
\ No newline at end of file
+                f"volatility={self.volatility:.3f})")
@@ -1,156 +1,360 @@
-from typing import Dict, List, Tuple
+from typing import Dict, Iterable, Iterator, List, Set, Tuple
 
 from models.substance import Substance
-from config import SUBSTANCE_DIFFUSION_RATE
+from models.world_config import WorldConfig
 
 
 class SubstanceGrid:
     """
     Сетка веществ (химическая среда).
-    Каждая ячейка хранит список веществ с концентрациями.
+    Каждая ячейка хранит словарь {id вещества: концентрация};
+    статические свойства веществ лежат в таблице веществ мира (config.substances).
     Клетки не "сидят" на этой сетке — они лишь взаимодействуют с ней.
+
+    Сетка разбита на чанки chunk_size × chunk_size. В update/diffuse
+    обрабатываются только активные чанки (есть клетки или вещество выше
+    порога). Спящий чанк просыпается, когда в него что-то записали
+    (dirty), в него перетекло вещество от соседа или в него вошла клетка.
+
+    Между begin_writes() и flush_writes() добавления веществ не меняют сетку,
+    а копятся в буфере и применяются разом (см. WorldConfig.deferred_substance_writes).
+
+    У каждой ячейки есть версия — номер последней записи в неё. Часы записей
+    общие для сетки, поэтому версия не повторяется даже после удаления и
+    повторного создания ячейки. По версии проверяется кэш триггеров (trigger_results).
     """
 
-    def __init__(self, width: int, height: int):
+    def __init__(self, width: int, height: int, config: WorldConfig | None = None):
         self.width = width
         self.height = height
+        self.config = config = config or WorldConfig()
+        self.substances = config.substances
+        self.chunk_size = config.chunk_size
+        self.read_config()
 
-        # сетка: (x, y) -> список веществ
+        # сетка: (x, y) -> {id вещества: концентрация}
         # храним в виде словаря ради гибкости (позже можно заменить на массив)
-        self.grid: Dict[Tuple[int, int], List[Substance]] = {}
+        self.grid: Dict[Tuple[int, int], Dict[int, float]] = {}
+
+        # чанк (cx, cy) -> занятые позиции внутри него
+        self.chunk_tiles: Dict[Tuple[int, int], Set[Tuple[int, int]]] = {}
+        # чанки, которые обрабатываются в update
+        self.active_chunks: Set[Tuple[int, int]] = set()
+        # чанки, изменённые с последнего update (будут обработаны на следующем)
+        self.dirty_chunks: Set[Tuple[int, int]] = set()
+        # чанки, в которых сейчас находятся клетки
+        self.occupied_chunks: Set[Tuple[int, int]] = set()
+
+        # буфер отложенных записей (x, y, id вещества, количество); None — пишем сразу
+        self.write_buffer: List[Tuple[int, int, int, float]] | None = None
+
+        # версии ячеек: (x, y) -> значение часов записей при последнем изменении
+        self.tile_versions: Dict[Tuple[int, int], int] = {}
+        self.write_clock = 0
+        # кэш триггеров: (x, y) -> (версия ячейки, {(рецептор, порог, режим): результат}); None — выключен
+        self.trigger_cache: Dict[Tuple[int, int], Tuple[int, dict]] | None = {} if config.trigger_cache else None
+
+    def read_config(self):
+        """Параметры мира, которые читаются в горячих циклах (заново — после WorldConfig.update)."""
+        config = self.config
+        self.diffusion_rate = config.substance_diffusion_rate
+        self.active_threshold = config.substance_active_threshold
+        self.deferred_writes = config.deferred_substance_writes
+
+    # --- чанки ---
+
+    def chunk_key(self, x: int, y: int) -> Tuple[int, int]:
+        return x // self.chunk_size, y // self.chunk_size
+
+    def mark_dirty(self, x: int, y: int):
+        """Помечает чанк ячейки изменённым — он проснётся на следующем update."""
+        self.dirty_chunks.add(self.chunk_key(x, y))
+
+    def set_occupied(self, positions: Iterable[Tuple[int, int]]):
+        """Запоминает чанки с клетками: они всегда активны."""
+        self.occupied_chunks = {self.chunk_key(x, y) for x, y in positions}
+
+    def tiles_in(self, x0: int, y0: int, x1: int, y1: int) -> Iterator[Tuple[Tuple[int, int], Dict[int, float]]]:
+        """Ячейки с веществами в прямоугольнике [x0, x1) × [y0, y1) — через индекс чанков."""
+        size = self.chunk_size
+        for cx in range(x0 // size, (x1 - 1) // size + 1):
+            for cy in range(y0 // size, (y1 - 1) // size + 1):
+                for pos in self.chunk_tiles.get((cx, cy), ()):
+                    if x0 <= pos[0] < x1 and y0 <= pos[1] < y1:
+                        yield pos, self.grid[pos]
+
+    def _touch(self, pos: Tuple[int, int]):
+        """Ячейка изменилась: новая версия (прежние результаты триггеров для неё устарели)."""
+        self.write_clock += 1
+        self.tile_versions[pos] = self.write_clock
+
+    def _put_tile(self, pos: Tuple[int, int], subs: Dict[int, float]):
+        self.grid[pos] = subs
+        self._touch(pos)
+        self.chunk_tiles.setdefault(self.chunk_key(*pos), set()).add(pos)
+
+    def _remove_tile(self, pos: Tuple[int, int]):
+        del self.grid[pos]
+        del self.tile_versions[pos]
+        if self.trigger_cache is not None:
+            self.trigger_cache.pop(pos, None)
+        key = self.chunk_key(*pos)
+        tiles = self.chunk_tiles.get(key)
+        if tiles is not None:
+            tiles.discard(pos)
+            if not tiles:
+                del self.chunk_tiles[key]
+
+    def _is_hot(self, key: Tuple[int, int]) -> bool:
+        """Есть ли в чанке вещество выше порога активности."""
+        threshold = self.active_threshold
+        for pos in self.chunk_tiles.get(key, ()):
+            for concentration in self.grid[pos].values():
+                if concentration > threshold:
+                    return True
+        return False
 
     def update(self):
         """Обновляет вещества и удаляет неактивные (с нулевой концентрацией)."""
+        # просыпаются изменённые чанки и чанки с клетками
+        self.active_chunks |= self.dirty_chunks
+        self.active_chunks |= self.occupied_chunks
+        self.dirty_chunks = set()
+
         # Рассеивание происходит только если включено в конфигурации
-        if SUBSTANCE_DIFFUSION_RATE > 0:
+        if self.diffusion_rate > 0:
             self.diffuse()
-        for pos in list(self.grid.keys()):
-            new_subs = []
-            for sub in self.grid[pos]:
-                sub.update()
-                if sub.is_active():
-                    new_subs.append(sub)
 
-            if new_subs:
-                self.grid[pos] = new_subs
-            else:
-                del self.grid[pos]
+        # естественное рассеивание (см. Substance.update); все ячейки прохода получают одну новую версию
+        volatilities = self.substances.volatilities
+        self.write_clock += 1
+        clock = self.write_clock
+        versions = self.tile_versions
+        for key in list(self.active_chunks):
+            for pos in list(self.chunk_tiles.get(key, ())):
+                new_subs = {}
+                for sid, concentration in self.grid[pos].items():
+                    concentration *= (1.0 - volatilities[sid])
+                    if concentration >= 0.01:
+                        new_subs[sid] = concentration
+
+                if new_subs:
+                    self.grid[pos] = new_subs
+                    versions[pos] = clock
+                else:
+                    self._remove_tile(pos)
+
+        # засыпают чанки без клеток и без заметных концентраций
+        self.active_chunks = {
+            key for key in self.active_chunks
+            if key in self.occupied_chunks or self._is_hot(key)
+        }
 
 
     def diffuse(self, rate: float = None):
         """
         Простое рассеивание веществ по соседним ячейкам.
         Рассеивает вещества между соседними ячейками без потери общей концентрации.
+        Обрабатываются только активные чанки; перетекание в спящий чанк будит его.
         """
         if rate is None:
-            rate = SUBSTANCE_DIFFUSION_RATE
-        
+            rate = self.diffusion_rate
+
         if rate <= 0:
             return
-        
-        new_grid: Dict[Tuple[int, int], List[Substance]] = {}
 
-        for (x, y), subs in self.grid.items():
-            for sub in subs:
-                if sub.concentration < 0.01:
-                    continue
-
-                # используем исходную концентрацию для расчёта долей
-                original_concentration = sub.concentration
-
-                # часть концентрации остаётся на месте
-                main_part = original_concentration * (1 - rate)
-                
-                # оставшаяся часть распределяется по соседям (равномерно на 4 стороны)
-                spread_per_neighbor = (original_concentration * rate) / 4
-                neighbor_count = 0
-                
-                for dx, dy in [(1, 0), (-1, 0), (0, 1), (0, -1)]:
-                    nx, ny = x + dx, y + dy
-                    if 0 <= nx < self.width and 0 <= ny < self.height:
-                        neighbor_count += 1
-                        new_grid.setdefault((nx, ny), []).append(
-                            Substance(sub.name, sub.type, spread_per_neighbor, sub.energy, sub.volatility)
-                        )
-
-                # Если не все соседи доступны (на границе), оставшаяся часть возвращается в текущую ячейку
-                if neighbor_count < 4:
-                    main_part += spread_per_neighbor * (4 - neighbor_count)
-                
-                # вернуть основную часть вещества в текущую клетку
-                if main_part > 0.01:
-                    new_grid.setdefault((x, y), []).append(
-                        Substance(sub.name, sub.type, main_part, sub.energy, sub.volatility)
-                    )
-
-        # слияние ячеек, чтобы объединить одинаковые вещества
-        merged: Dict[Tuple[int, int], List[Substance]] = {}
-        for pos, subs in new_grid.items():
-            by_name: Dict[str, Substance] = {}
-            for s in subs:
-                if s.name in by_name:
-                    by_name[s.name].concentration += s.concentration
-                else:
-                    by_name[s.name] = s.clone()
-            merged[pos] = list(by_name.values())
+        new_grid: Dict[Tuple[int, int], Dict[int, float]] = {}
 
-        self.grid = merged
+        for key in self.active_chunks:
+            for (x, y) in self.chunk_tiles.get(key, ()):
+                for sid, original_concentration in self.grid[(x, y)].items():
+                    if original_concentration < 0.01:
+                        continue
+
+                    # часть концентрации остаётся на месте
+                    main_part = original_concentration * (1 - rate)
+
+                    # оставшаяся часть распределяется по соседям (равномерно на 4 стороны)
+                    spread_per_neighbor = (original_concentration * rate) / 4
+                    neighbor_count = 0
+
+                    for dx, dy in [(1, 0), (-1, 0), (0, 1), (0, -1)]:
+                        nx, ny = x + dx, y + dy
+                        if 0 <= nx < self.width and 0 <= ny < self.height:
+                            neighbor_count += 1
+                            target = new_grid.setdefault((nx, ny), {})
+                            target[sid] = target.get(sid, 0.0) + spread_per_neighbor
+
+                    # Если не все соседи доступны (на границе), оставшаяся часть возвращается в текущую ячейку
+                    if neighbor_count < 4:
+                        main_part += spread_per_neighbor * (4 - neighbor_count)
+
+                    # вернуть основную часть вещества в текущую клетку
+                    if main_part > 0.01:
+                        target = new_grid.setdefault((x, y), {})
+                        target[sid] = target.get(sid, 0.0) + main_part
+
+        # старое содержимое активных чанков полностью заменяется результатом
+        for key in self.active_chunks:
+            for pos in list(self.chunk_tiles.get(key, ())):
+                self._remove_tile(pos)
+
+        for pos, subs in new_grid.items():
+            key = self.chunk_key(*pos)
+            if key not in self.active_chunks:
+                # вещество перетекло в спящий чанк — смешиваем с тем, что там лежит
+                existing = self.grid.get(pos)
+                if existing:
+                    for sid, concentration in subs.items():
+                        existing[sid] = existing.get(sid, 0.0) + concentration
+                    subs = existing
+                self.dirty_chunks.add(key)
+            self._put_tile(pos, subs)
 
 
     def get_substances(self, x: int, y: int) -> List[Substance]:
-        """Возвращает список веществ в ячейке (может быть пустым)."""
-        return self.grid.get((x, y), [])
+        """Возвращает список веществ в ячейке (копии, может быть пустым)."""
+        return [Substance.from_id(self.substances, sid, c) for sid, c in self.grid.get((x, y), {}).items()]
 
     def get_substance(self, x: int, y: int, substance_name: str) -> Substance | None:
-        for sub in self.grid.get((x, y), []):
-            if sub.name == substance_name:
-                return sub
-        return None
+        """Возвращает копию вещества из ячейки (изменения не попадают в сетку)."""
+        concentration = self.find_concentration(x, y, substance_name)
+        if concentration is None:
+            return None
+        return Substance.from_id(self.substances, self.substances.ids[substance_name], concentration)
+
+    def take_substance(self, x: int, y: int, substance_name: str,
+                       min_concentration: float = 0.01) -> Substance | None:
+        """
+        Забирает вещество из ячейки целиком (концентрация в ячейке обнуляется).
+        Если концентрация не больше min_concentration — ничего не забирает.
+        """
+        tile = self.grid.get((x, y))
+        sid = self.substances.ids.get(substance_name)
+        if not tile or sid is None:
+            return None
+        concentration = tile.get(sid, 0.0)
+        if concentration <= min_concentration:
+            return None
+        tile[sid] = 0.0
+        self._touch((x, y))
+        self.mark_dirty(x, y)
+        return Substance.from_id(self.substances, sid, concentration)
 
     def set_substances(self, x: int, y: int, substances: List[Substance]):
         """Полностью заменяет содержимое ячейки."""
         if not (0 <= x < self.width and 0 <= y < self.height):
             return
-        self.grid[(x, y)] = substances
+        tile: Dict[int, float] = {}
+        for sub in substances:
+            tile[sub.id] = tile.get(sub.id, 0.0) + sub.concentration
+        self._put_tile((x, y), tile)
+        self.mark_dirty(x, y)
 
     def add_substance(self, x: int, y: int, substance: Substance):
         """Добавляет вещество в ячейку (если есть — смешивает)."""
+        self.add_concentration(x, y, substance.id, substance.concentration)
+
+    def begin_writes(self):
+        """Начинает фазу отложенной записи (если она включена в конфигурации)."""
+        if self.deferred_writes:
+            self.write_buffer = []
+
+    def flush_writes(self):
+        """Применяет накопленные записи и возвращается к немедленной записи."""
+        buffer = self.write_buffer
+        if buffer is None:
+            return
+        self.write_buffer = None
+        self.scatter_add(buffer)
+
+    def scatter_add(self, records: Iterable[Tuple[int, int, int, float]]):
+        """Пакетное сложение записей (x, y, id, количество); координаты уже проверены."""
+        grid = self.grid
+        chunk_size = self.chunk_size
+        touched = set()
+        self.write_clock += 1
+        clock = self.write_clock
+        versions = self.tile_versions
+
+        for x, y, sid, amount in records:
+            pos = (x, y)
+            tile = grid.get(pos)
+            if tile is None:
+                grid[pos] = tile = {}
+                self.chunk_tiles.setdefault((x // chunk_size, y // chunk_size), set()).add(pos)
+            tile[sid] = tile.get(sid, 0.0) + amount
+            versions[pos] = clock
+            touched.add(pos)
+
+        self.dirty_chunks.update((x // chunk_size, y // chunk_size) for x, y in touched)
+
+    def add_concentration(self, x: int, y: int, substance_id: int, amount: float):
+        """Добавляет концентрацию вещества по id (без создания объектов)."""
         if not (0 <= x < self.width and 0 <= y < self.height):
             return
 
-        cell = self.grid.setdefault((x, y), []) # get cell by (x, y) or create default empty list
-        for existing in cell:
-            if existing.name == substance.name:
-                existing.concentration += substance.concentration
-                return
+        if self.write_buffer is not None:
+            self.write_buffer.append((x, y, substance_id, amount))
+            return
+
+        self.mark_dirty(x, y)
+        tile = self.grid.get((x, y))
+        if tile is None:
+            tile = {}
+            self._put_tile((x, y), tile)
+
+        tile[substance_id] = tile.get(substance_id, 0.0) + amount
+        self._touch((x, y))
+
+    def trigger_results(self, x: int, y: int) -> dict | None:
+        """
+        Кэш результатов триггеров для текущей версии ячейки:
+        {(рецептор, порог, режим): сработал ли триггер; None — вещества в ячейке нет}.
+        Запись в ячейку меняет её версию, и кэш начинается заново. None — ячейки нет.
+        """
+        pos = (x, y)
+        version = self.tile_versions.get(pos)
+        if version is None:
+            return None
+        entry = self.trigger_cache.get(pos)
+        if entry is None or entry[0] != version:
+            entry = self.trigger_cache[pos] = (version, {})
+        return entry[1]
 
-        # если такого вещества нет — добавить новое
-        cell.append(substance.clone())
+    def find_concentration(self, x: int, y: int, name: str) -> float | None:
+        """Концентрация вещества в ячейке или None, если его там нет."""
+        tile = self.grid.get((x, y))
+        if not tile:
+            return None
+        sid = self.substances.ids.get(name)
+        if sid is None:
+            return None
+        return tile.get(sid)
 
     def get_concentration(self, x: int, y: int, name: str) -> float:
         """Возвращает концентрацию указанного вещества в ячейке."""
-        for sub in self.grid.get((x, y), []):
-            if sub.name == name:
-                return sub.concentration
-        return 0.0
+        concentration = self.find_concentration(x, y, name)
+        return 0.0 if concentration is None else concentration
 
     def to_dict(self):
         all_subs = []
         for (x, y), subs in self.grid.items():
-            for s in subs:
-                d = s.to_dict()
+            for sid, concentration in subs.items():
+                d = Substance.from_id(self.substances, sid, concentration).to_dict()
                 d["x"], d["y"] = x, y
                 all_subs.append(d)
         return {"width": self.width, "height": self.height, "substances": all_subs}
 
     @classmethod
-    def from_dict(cls, data):
-        grid = cls(data["width"], data["height"])
+    def from_dict(cls, data, config: WorldConfig | None = None):
+        grid = cls(data["width"], data["height"], config)
         for sub in data["substances"]:
-            grid.add_substance(sub["x"], sub["y"], Substance.from_dict(sub))
+            grid.add_substance(sub["x"], sub["y"], Substance.from_dict(sub, grid.substances))
         return grid
 
     def __repr__(self):
         active_cells = len(self.grid)
         total_subs = sum(len(v) for v in self.grid.values())
-        return f"SubstanceGrid({self.width}x{self.height}, cells={active_cells}, substances={total_subs})"
+        return (f"SubstanceGrid({self.width}x{self.height}, cells={active_cells}, substances={total_subs}, "
+                f"chunks={len(self.active_chunks)}/{len(self.chunk_tiles)} active)")
@@ -0,0 +1,100 @@
+from collections.abc import Mapping
+from typing import Dict, List
+
+
+class SubstanceRegistry(Mapping):
+    """
+    Таблица типов веществ (flyweight).
+
+    Статические свойства вещества (имя, тип, энергия, летучесть) хранятся
+    один раз в параллельных списках и адресуются целым id. В сетке веществ
+    лежат только пары (id, концентрация).
+
+    Снаружи таблица выглядит как старый словарь SUBSTANCES:
+        {"ORGANIC_0": {"type": "ORGANIC", "energy": 1.5}, ...}
+
+    id закрепляется за именем навсегда (в пределах процесса): clear() и
+    повторная регистрация не меняют id, поэтому сетки уже созданных миров
+    остаются корректными.
+    """
+
+    DEFAULT_VOLATILITY = 0.01
+
+    def __init__(self):
+        self.ids: Dict[str, int] = {}
+        self.names: List[str] = []
+        self.types: List[str] = []
+        self.energies: List[float] = []
+        self.volatilities: List[float] = []
+        # какие id сейчас видны через интерфейс словаря
+        self._registered: Dict[str, int] = {}
+        self._visible_names: List[str] | None = None
+
+    def register(self, name: str, type_: str, energy: float,
+                 volatility: float = DEFAULT_VOLATILITY) -> int:
+        """Регистрирует (или обновляет) тип вещества и возвращает его id."""
+        sid = self.ids.get(name)
+        if sid is None:
+            sid = len(self.names)
+            self.ids[name] = sid
+            self.names.append(name)
+            self.types.append(type_)
+            self.energies.append(energy)
+            self.volatilities.append(volatility)
+        else:
+            self.types[sid] = type_
+            self.energies[sid] = energy
+            self.volatilities[sid] = volatility
+        if name not in self._registered:
+            self._visible_names = None
+        self._registered[name] = sid
+        return sid
+
+    def id_of(self, name: str) -> int:
+        return self.ids[name]
+
+    def visible_names(self) -> List[str]:
+        """Имена видимых веществ (кэш; словарь рецепторов для случайных генов)."""
+        if self._visible_names is None:
+            self._visible_names = list(self._registered)
+        return self._visible_names
+
+    def clear(self):
+        """Скрывает все типы (id сохраняются за именами)."""
+        self._registered.clear()
+        self._visible_names = None
+
+    def load(self, data: dict):
+        """Заменяет содержимое таблицы словарём в формате SUBSTANCES."""
+        self.clear()
+        for name, props in data.items():
+            self[name] = props
+
+    def to_dict(self) -> dict:
+        return {name: self[name] for name in self._registered}
+
+    # --- интерфейс словаря (совместимость со старым SUBSTANCES) ---
+
+    def __setitem__(self, name: str, props: dict):
+        self.register(
+            name,
+            props["type"],
+            props["energy"],
+            props.get("volatility", self.DEFAULT_VOLATILITY),
+        )
+
+    def __getitem__(self, name: str) -> dict:
+        sid = self._registered[name]
+        return {"type": self.types[sid], "energy": self.energies[sid], "volatility": self.volatilities[sid]}
+
+    def __contains__(self, name) -> bool:
+        return name in self._registered
+
+    def __iter__(self):
+        return iter(self._registered)
+
+    def __len__(self) -> int:
+        return len(self._registered)
+
+    def __repr__(self):
+        return f"SubstanceRegistry(types={len(self._registered)}, ids={len(self.names)})"
@@ -1,10 +1,16 @@
 class Trigger:
-    LESS = 'LESS'
-    GREATER = 'GREATER'
+    __slots__ = ("threshold", "mode")
 
-    def __init__(self, threshold: float, mode: str = LESS):
+    # режимы хранятся как маленькие int; в сохранениях — по имени
+    LESS = 0
+    GREATER = 1
+
+    MODE_NAMES = ('LESS', 'GREATER')
+    MODE_IDS = {name: i for i, name in enumerate(MODE_NAMES)}
+
+    def __init__(self, threshold: float, mode: int | str = LESS):
         self.threshold = threshold
-        self.mode = mode
+        self.mode = Trigger.MODE_IDS[mode] if isinstance(mode, str) else mode
 
     def check(self, value: float) -> bool:
         if self.mode == Trigger.LESS:
@@ -13,13 +19,16 @@ class Trigger:
             return value > self.threshold
         return False
 
+    @property
+    def mode_name(self) -> str:
+        return Trigger.MODE_NAMES[self.mode]
+
     def to_dict(self):
-        return {"threshold": self.threshold, "mode": self.mode}
+        return {"threshold": self.threshold, "mode": self.mode_name}
 
     @classmethod
     def from_dict(cls, data):
         return cls(threshold=data["threshold"], mode=data["mode"])
 
     def __repr__(self):
-        return f"Trigger(threshold={self.threshold}, mode={self.mode})"
-
+        return f"Trigger(threshold={self.threshold}, mode={self.mode_name})"
@@ -1,35 +1,105 @@
+import gzip
 import json
+import multiprocessing
+import multiprocessing.connection
 import os
+import random
+import threading
 import time
+import traceback
 import uuid
+from collections import deque
+from typing import Callable, List
 
-from config import AUTO_SAVE, TICK_SAVE_PERIOD, SAVES_DIR
+from config import SAVES_DIR, SNAPSHOT_GZIP_LEVEL
+from models.env_stats import StatsWorker
 from models.environment import Environment
+from models.event_log import EventLogWriter
+from models.world_config import WorldConfig
 
 
 class World:
     """Мир симуляции: управляет временем и средой."""
-    def __init__(self, width: int, height: int, tick: int = 0, tick_time_ms: float = 0.0):
-        self.env = Environment(width, height)
+    def __init__(self, width: int, height: int, tick: int = 0, tick_time_ms: float = 0.0,
+                 config: WorldConfig | None = None):
+        self.config = config or WorldConfig()
+        self.env = Environment(width, height, self.config)
         self.tick: int = tick
         self.tick_time_ms = tick_time_ms
         self.uuid = str(uuid.uuid4())
+        self.event_log: EventLogWriter | None = None
+        # профилировщик выделений памяти (alloc_profile.AllocationProfiler), если включён
+        self.profiler = None
+        # автосохранения (путь, длительность в секундах), ещё не переданные планировщику
+        # (метрики и восстановление после падения воркера, см. Scheduler.advance)
+        self.autosaves: deque = deque(maxlen=64)
+
+    def start_recording(self, path: str | None = None):
+        """Начинает запись журнала событий (первая запись — ключевой кадр текущего состояния)."""
+        if path is None:
+            os.makedirs(SAVES_DIR, exist_ok=True)
+            path = os.path.join(SAVES_DIR, f"events_{self.uuid}.evlog")
+        self.event_log = EventLogWriter(
+            path, self.env.grid.width, self.env.grid.height,
+            self.config.substances, self.config.event_log_emit_threshold,
+            physics={field: getattr(self.config, field) for field in ("friction", "max_velocity", "cell_radius")},
+        )
+        self.event_log.tick = self.tick
+        self.event_log.keyframe(self.env)
+        self.event_log.motion(self.env)
+
+    def stop_recording(self):
+        if self.event_log is not None:
+            self.event_log.close()
+            self.event_log = None
+        self.env.event_log = None
 
     def update(self):
         start_time = time.perf_counter()
+        config = self.config
+        if config.event_log and self.event_log is None:
+            self.start_recording()
         self.tick += 1
-        self.env.update_cells()
-        self.env.apply_physics()
-        self.env.spawn_random_organic()
-        self.env.update_sub_grid()
-        self.env.update_env_stats()
+        if self.event_log is not None:
+            self.event_log.tick = self.tick
+            self.env.event_log = self.event_log
+        if self.env.lineage is not None:
+            self.env.lineage.tick = self.tick
+        env = self.env
+        profiler = self.profiler
+        if profiler is None:
+            env.update_cells()
+            env.apply_physics()
+            env.spawn_random_organic()
+            env.update_sub_grid()
+            env.update_env_stats(self.tick)
+        else:
+            profiler.measure("cells", env.update_cells)
+            profiler.measure("physics", env.apply_physics)
+            profiler.measure("spawn", env.spawn_random_organic)
+            profiler.measure("substances", env.update_sub_grid)
+            profiler.measure("stats", env.update_env_stats, self.tick)
+            profiler.end_tick(self.tick)
         if not self.env.cells:
             self.restore_last_save()
+            if self.event_log is not None:
+                self.event_log.tick = self.tick
+                self.event_log.keyframe(self.env)
+                self.event_log.motion(self.env)
             return
-        if AUTO_SAVE and self.tick % TICK_SAVE_PERIOD == 0:
+        if self.env.lineage is not None and self.tick % config.lineage_prune_period == 0:
+            self.env.lineage.prune(self.env.cells)
+        if self.event_log is not None:
+            if self.tick % config.event_log_keyframe_period == 0:
+                self.event_log.keyframe(self.env)
+            if config.event_log_motion_period and self.tick % config.event_log_motion_period == 0:
+                self.event_log.motion(self.env)
+        if config.auto_save and self.tick % config.tick_save_period == 0:
             os.makedirs(SAVES_DIR, exist_ok=True)
             save_path = os.path.join(SAVES_DIR, f"simulation_state_{self.uuid}_{self.tick}.json")
+            start = time.perf_counter()
             self.save(save_path)
+            self.autosaves.append((save_path, time.perf_counter() - start))
         self.tick_time_ms = (time.perf_counter() - start_time) * 1000
 
     def restore_last_save(self):
@@ -57,53 +127,181 @@ class World:
         # загружаем мир из него
         restored_world = World.load(last_file)
 
+        self.config = restored_world.config
         self.env = restored_world.env
         self.tick = restored_world.tick
         self.tick_time_ms = restored_world.tick_time_ms
         self.uuid = restored_world.uuid
 
+    def configure(self, **overrides):
+        """Меняет параметры живого мира (кроме WorldConfig.FIXED_FIELDS)."""
+        self.config.update(**overrides)
+        self.env.grid.read_config()
+        if self.config.genome_maintenance:
+            self.env.unshare_genes()
+
+    def fork(self, branches: List[dict], ticks: int, report: Callable[["World"], object] | None = None,
+             processes: int | None = None) -> list:
+        """
+        Ветки «что если» от текущего состояния. Ветка — словарь переопределений
+        параметров мира (см. configure) и необязательный "seed"; каждая ветка —
+        независимая копия мира, которая считает ticks тиков и возвращает
+        report(мир ветки) (по умолчанию branch_summary). Результаты — по порядку веток.
+
+        Где есть fork (Linux, macOS), ветки считаются в дочерних процессах: мир
+        достаётся им копированием страниц при записи, без сериализации, обратно
+        по каналу идёт только результат report. processes — сколько веток
+        считается одновременно (по умолчанию — число ядер). Без fork, а также в
+        процессе с другими потоками (fork копирует только вызывающий поток, и
+        замок, захваченный другим потоком, в дочернем процессе не освободится
+        никогда) ветки считаются по очереди в этом процессе на копиях через
+        to_dict / from_dict.
+        Ветка без seed продолжает случайную последовательность мира — с теми же
+        параметрами она повторит мир. Сам мир не меняется.
+        """
+        report = report or branch_summary
+        for branch in branches:
+            WorldConfig.check_update({k: v for k, v in branch.items() if k != "seed"})
+        if "fork" not in multiprocessing.get_all_start_methods() or threading.active_count() > 1:
+            state = random.getstate()
+            results = []
+            for branch in branches:
+                random.setstate(state)
+                world = World.from_dict(self.to_dict())
+                world.uuid = str(uuid.uuid4())
+                results.append(_run_branch(world, branch, ticks, report))
+            random.setstate(state)
+            return results
+
+        context = multiprocessing.get_context("fork")
+        processes = max(1, processes or os.cpu_count() or 1)
+        waiting = deque(enumerate(branches))
+        running = {}  # канал результата -> (номер ветки, процесс)
+        results = [None] * len(branches)
+        try:
+            while waiting or running:
+                while waiting and len(running) < processes:
+                    index, branch = waiting.popleft()
+                    receiver, sender = context.Pipe(duplex=False)
+                    process = context.Process(
+                        target=_branch_process, args=(self, branch, ticks, report, sender),
+                        name=f"world-fork-{index}",
+                    )
+                    process.start()
+                    sender.close()
+                    running[receiver] = (index, process)
+
+                for receiver in multiprocessing.connection.wait(list(running)):
+                    index, process = running.pop(receiver)
+                    try:
+                        ok, result = receiver.recv()
+                    except EOFError:
+                        ok, result = False, f"branch process exited with code {process.exitcode}"
+                    receiver.close()
+                    process.join()
+                    if not ok:
+                        raise RuntimeError(f"world fork branch {index} failed:\n{result}")
+                    results[index] = result
+        finally:
+            for receiver, (_, process) in running.items():
+                process.terminate()
+                process.join()
+                receiver.close()
+        return results
+
     def to_dict(self):
         """Сериализация мира"""
-        from config import SUBSTANCES
         return {
             "uuid": self.uuid,
             "tick": self.tick,
             "tick_time_ms": self.tick_time_ms,
             "environment": self.env.to_dict(),
-            "substances": SUBSTANCES
+            "config": self.config.to_dict(),
+            "substances": self.config.substances.to_dict()
         }
 
     @classmethod
-    def from_dict(cls, data):
-        """Создаёт объект мира из словаря."""
+    def from_dict(cls, data, config: WorldConfig | None = None):
+        """
+        Создаёт объект мира из словаря. Параметры и таблица веществ берутся из
+        сохранения (старые сохранения — из config.py); config их заменяет.
+        """
         env_data = data.get("environment", {})
         grid_data = env_data.get("grid", {})
-        import config as _config
-        subs = data.get("substances")
-        if subs is not None:
-            _config.SUBSTANCES = subs
-        else:
-            from helpers import generate_substances
-            generate_substances(_config.SUBSTANCES)
+        if config is None:
+            config = WorldConfig.from_dict(data.get("config"), data.get("substances"))
 
         # создаём сам мир и окружение
         world = cls(
             grid_data["width"],
             grid_data["height"],
             data.get("tick", 0),
-            data.get("tick_time_ms", 0)
+            data.get("tick_time_ms", 0),
+            config,
         )
         world.uuid = data.get("uuid")
-        world.env = Environment.from_dict(env_data)
+        world.env = Environment.from_dict(env_data, config)
 
         return world
 
     def save(self, filename: str):
+        """Сохраняет мир в JSON; файл *.gz пишется сжатым и без отступов."""
+        if filename.endswith(".gz"):
+            with gzip.open(filename, "wt", encoding="utf-8", compresslevel=SNAPSHOT_GZIP_LEVEL) as f:
+                json.dump(self.to_dict(), f, ensure_ascii=False, separators=(",", ":"))
+            return
         with open(filename, "w", encoding="utf-8") as f:
             json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
 
     @classmethod
     def load(cls, filename: str):
-        with open(filename, "r", encoding="utf-8") as f:
+        """Загружает мир из JSON (сжатый gzip файл распознаётся по сигнатуре)."""
+        with open(filename, "rb") as f:
+            compressed = f.read(2) == b"\x1f\x8b"
+        opener = gzip.open if compressed else open
+        with opener(filename, "rt", encoding="utf-8") as f:
             data = json.load(f)
         return cls.from_dict(data)
+
+
+def branch_summary(world: World) -> dict:
+    """Итог ветки World.fork по умолчанию."""
+    cells = world.env.cells
+    return {
+        "tick": world.tick,
+        "cells": len(cells),
+        "species": len({c.species_id for c in cells}),
+        "env_stats": world.env.env_stats.to_dict(),
+    }
+
+
+def _run_branch(world: World, branch: dict, ticks: int, report: Callable[[World], object]):
+    overrides = dict(branch)
+    seed = overrides.pop("seed", None)
+    world.configure(**overrides)
+    if seed is not None:
+        random.seed(seed)
+        if world.env.genome_engine is not None:
+            world.env.genome_engine.reseed(seed)
+    for _ in range(ticks):
+        world.update()
+    return report(world)
+
+
+def _branch_process(world: World, branch: dict, ticks: int, report: Callable[[World], object], sender):
+    """Дочерний процесс World.fork: мир — копия родительского после fork."""
+    # пулы статистики родителя после fork не работают (их потоков и процессов здесь нет)
+    StatsWorker._executors = {}
+    if world.env.stats_worker is not None:
+        world.env.stats_worker.pending = None
+    # журнал событий родителя не пишем и не сбрасываем (его буфер допишет родитель);
+    # свой uuid — чтобы автосохранения и журнал ветки не смешивались с родительскими
+    world.event_log = None
+    world.env.event_log = None
+    world.uuid = str(uuid.uuid4())
+    try:
+        sender.send((True, _run_branch(world, branch, ticks, report)))
+    except BaseException:
+        sender.send((False, traceback.format_exc()))
+    finally:
+        sender.close()
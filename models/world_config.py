@@ -0,0 +1,123 @@
+import config
+from models.substance import Substance
+from models.substance_registry import SubstanceRegistry
+
+
+class WorldConfig:
+    """
+    Параметры одного мира: физика, пределы, сетка веществ, режимы расчёта
+    и собственная таблица веществ.
+
+    Значения по умолчанию берутся из config.py в момент создания объекта,
+    поэтому миры с разными параметрами (и разными таблицами веществ) могут
+    жить в одном процессе. Модели читают параметры через environment.config
+    (горячие значения SubstanceGrid кэширует в своих атрибутах).
+    """
+
+    # параметры, которые сохраняются вместе с миром (имя атрибута -> константа config.py)
+    FIELDS = {
+        "cells_limit": "CELLS_LIMIT",
+        "cell_radius": "CELL_RADIUS",
+        "cell_repulsion_force": "CELL_REPULSION_FORCE",
+        "friction": "FRICTION",
+        "max_velocity": "MAX_VELOCITY",
+        "acceleration_factor": "ACCELERATION_FACTOR",
+        "max_acceleration": "MAX_ACCELERATION",
+        "sleep_velocity": "SLEEP_VELOCITY",
+        "sleep_ticks": "SLEEP_TICKS",
+        "organic_spawn_probability": "ORGANIC_SPAWN_PROBABILITY_PER_CELL_PER_TICK",
+        "substance_diffusion_rate": "SUBSTANCE_DIFFUSION_RATE",
+        "chunk_size": "CHUNK_SIZE",
+        "substance_active_threshold": "SUBSTANCE_ACTIVE_THRESHOLD",
+        "deferred_substance_writes": "DEFERRED_SUBSTANCE_WRITES",
+        "trigger_cache": "TRIGGER_CACHE",
+        "genome_backend": "GENOME_BACKEND",
+        "genome_maintenance": "GENOME_MAINTENANCE",
+        "genome_silent_ticks": "GENOME_SILENT_TICKS",
+        "genome_max_genes": "GENOME_MAX_GENES",
+        "gene_profile": "GENE_PROFILE",
+        "gene_profile_window": "GENE_PROFILE_WINDOW",
+        "stats_mode": "STATS_MODE",
+        "stats_period": "STATS_PERIOD",
+        "stats_extended": "STATS_EXTENDED",
+        "lineage": "LINEAGE",
+        "lineage_prune_period": "LINEAGE_PRUNE_PERIOD",
+        "event_log": "EVENT_LOG",
+        "event_log_keyframe_period": "EVENT_LOG_KEYFRAME_PERIOD",
+        "event_log_motion_period": "EVENT_LOG_MOTION_PERIOD",
+        "event_log_emit_threshold": "EVENT_LOG_EMIT_THRESHOLD",
+        "auto_save": "AUTO_SAVE",
+        "tick_save_period": "TICK_SAVE_PERIOD",
+        "organic_types": "ORGANIC_TYPES",
+        "toxin_types": "TOXIN_TYPES",
+        "inorganic_types": "INORGANIC_TYPES",
+    }
+
+    # параметры, которые читаются только при создании мира (структуры сетки, бэкенд генома,
+    # пулы статистики, таблица веществ): у живого мира их не поменять (см. update)
+    FIXED_FIELDS = frozenset((
+        "chunk_size", "trigger_cache", "genome_backend", "gene_profile", "gene_profile_window",
+        "stats_mode", "stats_period", "stats_extended", "lineage",
+        "organic_types", "toxin_types", "inorganic_types",
+    ))
+
+    def __init__(self, substances: SubstanceRegistry | None = None, **overrides):
+        for field, constant in WorldConfig.FIELDS.items():
+            setattr(self, field, getattr(config, constant))
+        for field, value in overrides.items():
+            if field not in WorldConfig.FIELDS:
+                raise TypeError(f"unknown world config field: {field}")
+            setattr(self, field, value)
+
+        if substances is None:
+            substances = SubstanceRegistry()
+            self.register_substances(substances)
+        self.substances = substances
+
+    def register_substances(self, substances: SubstanceRegistry):
+        """Заполняет таблицу веществами из organic_types / toxin_types / inorganic_types."""
+        substances.clear()
+        for type_, types in (
+            (Substance.ORGANIC, self.organic_types),
+            (Substance.TOXIN, self.toxin_types),
+            (Substance.INORGANIC, self.inorganic_types),
+        ):
+            for data in types:
+                substances.register(data["name"], type_, data["energy"])
+
+    @staticmethod
+    def check_update(overrides: dict):
+        """Проверяет, что параметры можно поменять у живого мира (см. update)."""
+        for field in overrides:
+            if field not in WorldConfig.FIELDS:
+                raise TypeError(f"unknown world config field: {field}")
+            if field in WorldConfig.FIXED_FIELDS:
+                raise ValueError(f"world config field {field} is fixed at world creation")
+
+    def update(self, **overrides):
+        """Меняет параметры живого мира (после — World.configure обновляет кэши моделей)."""
+        WorldConfig.check_update(overrides)
+        for field, value in overrides.items():
+            setattr(self, field, value)
+
+    def copy(self, **overrides) -> "WorldConfig":
+        """Копия параметров (таблица веществ — тоже копия)."""
+        substances = SubstanceRegistry()
+        substances.load(self.substances.to_dict())
+        return WorldConfig(substances=substances, **{**self.to_dict(), **overrides})
+
+    def to_dict(self) -> dict:
+        return {field: getattr(self, field) for field in WorldConfig.FIELDS}
+
+    @classmethod
+    def from_dict(cls, data: dict | None, substances: dict | None = None) -> "WorldConfig":
+        """Параметры из сохранения (отсутствующие — из config.py); substances — таблица веществ мира."""
+        known = {k: v for k, v in (data or {}).items() if k in cls.FIELDS}
+        registry = None
+        if substances is not None:
+            registry = SubstanceRegistry()
+            registry.load(substances)
+        return cls(substances=registry, **known)
+
+    def __repr__(self):
+        return f"WorldConfig({self.to_dict()}, substances={self.substances!r})"
@@ -0,0 +1,154 @@
+"""
+Облегчённое состояние мира для фронта (кадр отрисовки).
+
+Кадр собирается в два шага: capture_frame() снимает с мира компактный
+неизменяемый снимок тика (FrameView), frame_state() / encode_frame()
+превращают его в JSON. Снимок не ссылается на изменяемые объекты мира
+(числа копируются колонками в array — из процесса-воркера снимок уходит
+одним блоком байт), поэтому кодировать его можно в другом потоке или
+процессе, пока мир уже считает следующий тик (FRAME_PIPELINE = "double_buffer").
+
+Кадры уходят клиенту реже, чем считаются тики (NETWORK_FPS): у каждой клетки
+в кадре есть id и скорость (клеток сетки за тик), между кадрами фронт
+интерполирует позиции клеток по id, а после последнего кадра — продолжает
+движение по скорости.
+"""
+import json
+import math
+from array import array
+
+
+class FrameView:
+    """
+    Снимок тика для кадра: только то, что нужно отрисовке, без ссылок на живой мир.
+    Числа лежат колонками в array (сериализуются одним блоком байт), цвета — списком строк.
+    """
+
+    __slots__ = (
+        "tick", "tick_time_ms", "cell_radius", "width", "height", "substance_step",
+        "substance_types", "substance_xy", "substance_ids", "concentrations",
+        "cell_ids", "cell_xy", "cell_velocity", "cell_colors", "env_stats",
+    )
+
+    def __init__(self, tick: int, tick_time_ms: float, cell_radius: float, width: int, height: int,
+                 substance_step: int, substance_types: list, substance_xy: array, substance_ids: array,
+                 concentrations: array, cell_ids: array, cell_xy: array, cell_velocity: array,
+                 cell_colors: list, env_stats: dict):
+        self.tick = tick
+        self.tick_time_ms = tick_time_ms
+        self.cell_radius = cell_radius
+        self.width = width
+        self.height = height
+        self.substance_step = substance_step
+        self.substance_types = substance_types  # тип вещества по id
+        self.substance_xy = substance_xy        # x0, y0, x1, y1, ...
+        self.substance_ids = substance_ids
+        self.concentrations = concentrations
+        self.cell_ids = cell_ids
+        self.cell_xy = cell_xy                  # x0, y0, x1, y1, ...
+        self.cell_velocity = cell_velocity      # vx0, vy0, vx1, vy1, ...
+        self.cell_colors = cell_colors
+        self.env_stats = env_stats
+
+
+def capture_frame(world: "World", viewport: tuple | None = None) -> FrameView:
+    """
+    Снимок тика для кадра.
+
+    viewport — (x, y, ширина, высота, zoom): видимая клиенту область в клетках
+    сетки и масштаб в пикселях на клетку. В кадр попадают только клетки и
+    вещества внутри области; при zoom < 1 ячейки веществ сводятся в блоки
+    substance_step × substance_step (максимум концентрации каждого типа).
+    """
+    env = world.env
+    grid = env.grid
+    cell_radius = env.config.cell_radius
+
+    step = 1
+    if viewport is None:
+        tiles = grid.grid.items()
+        cells = env.cells
+    else:
+        x, y, width, height, zoom = viewport
+        # область обрезается по границам мира
+        x0 = max(0, math.floor(x))
+        y0 = max(0, math.floor(y))
+        x1 = min(grid.width, math.ceil(x + width))
+        y1 = min(grid.height, math.ceil(y + height))
+        tiles = grid.tiles_in(x0, y0, x1, y1) if x0 < x1 and y0 < y1 else ()
+        cells = env.cells_in(x - cell_radius, y - cell_radius,
+                             x + width + cell_radius, y + height + cell_radius, world.tick)
+        step = max(1, math.ceil(1 / zoom))
+
+    if step == 1:
+        substances = [
+            (tx, ty, sid, concentration)
+            for (tx, ty), subs in tiles
+            for sid, concentration in subs.items()
+            if concentration > 0
+        ]
+    else:
+        blocks = {}
+        for (tx, ty), subs in tiles:
+            bx, by = tx - tx % step, ty - ty % step
+            for sid, concentration in subs.items():
+                key = (bx, by, sid)
+                if concentration > blocks.get(key, 0.0):
+                    blocks[key] = concentration
+        substances = [(bx, by, sid, concentration) for (bx, by, sid), concentration in blocks.items()]
+
+    return FrameView(
+        world.tick, world.tick_time_ms, cell_radius, grid.width, grid.height, step,
+        list(env.config.substances.types),
+        array("i", [v for x, y, _, _ in substances for v in (x, y)]),
+        array("i", [sid for _, _, sid, _ in substances]),
+        array("d", [concentration for _, _, _, concentration in substances]),
+        array("q", [c.id for c in cells]),
+        array("d", [v for c in cells for v in c.position]),
+        array("d", [v for c in cells for v in c.velocity]),
+        [c.color_hex for c in cells],
+        env.env_stats.to_dict(),
+    )
+
+
+def frame_state(view: FrameView) -> dict:
+    """Кадр в виде, который ждёт фронт."""
+    types = view.substance_types
+    substance_xy = iter(view.substance_xy.tolist())
+    cell_xy = iter(view.cell_xy.tolist())
+    velocity = iter(view.cell_velocity.tolist())
+    return {
+        "tick": view.tick,
+        "tick_time_ms": view.tick_time_ms,
+        "cell_radius": view.cell_radius,
+        "environment": {
+            "grid": {
+                "width": view.width,
+                "height": view.height,
+                "substance_step": view.substance_step,
+                "substances": [
+                    {"x": x, "y": y, "type": types[sid], "concentration": concentration}
+                    for (x, y), sid, concentration in zip(
+                        zip(substance_xy, substance_xy), view.substance_ids.tolist(), view.concentrations.tolist()
+                    )
+                ],
+            },
+            "cells": [
+                {"id": id_, "position": position, "velocity": (round(vx, 4), round(vy, 4)), "color_hex": color}
+                for id_, position, (vx, vy), color in zip(
+                    view.cell_ids.tolist(), zip(cell_xy, cell_xy), zip(velocity, velocity), view.cell_colors
+                )
+            ],
+            "env_stats": view.env_stats,
+        },
+    }
+
+
+def encode_frame(view: FrameView) -> str:
+    """JSON кадра; не обращается к миру, можно вызывать из другого потока."""
+    return json.dumps(frame_state(view))
+
+
+def build_render_state(world: "World", viewport: tuple | None = None) -> dict:
+    """Формирует облегчённое состояние для фронта (только отрисовка и статистика)."""
+    return frame_state(capture_frame(world, viewport))
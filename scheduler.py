@@ -0,0 +1,726 @@
+"""
+Планировщик миров: владеет мирами всех сессий и распределяет их тики.
+
+Миры живут в воркерах — SCHEDULER_WORKERS отдельных процессах (или в
+процессе сервера при SCHEDULER_WORKERS = 0). Новый мир попадает в наименее
+нагруженный воркер и дальше считается только там; сервер обращается к нему
+операциями (_OPS): посчитать N тиков и вернуть кадр, сохранить, и т.д.
+
+Справедливость и пределы:
+  * воркер выполняет операции по одной; очередь упорядочена по
+    виртуальному времени сессии — потраченному на неё времени воркера,
+    делённому на приоритет (взвешенная справедливая очередь);
+  * у каждой сессии есть предел тиков в секунду (max_tps, ведро токенов);
+  * если клиент давно не присылал ack (страница закрыта или зависла),
+    мир притормаживается до SCHEDULER_IDLE_TPS, а затем ставится на паузу;
+    подключённые сессии в режиме max speed (кадров нет, вкладка в фоне,
+    таймеры браузера редки) не притормаживаются.
+
+Сессия переживает отключение клиента: новое подключение с её токеном
+продолжает тот же мир (attach). Мир без клиента дольше
+SESSION_HIBERNATE_SECONDS выгружается из воркера в сжатый снимок
+(hibernate); то же происходит с давно не использованными мирами без
+клиента или на паузе, если оценка памяти миров превышает
+SESSION_MEMORY_BUDGET. Выгруженный мир загружается в наименее
+нагруженный воркер при первой операции над ним.
+
+Падение процесса-воркера (например, OOM) не ломает сервер: воркер
+перезапускается, а миры его сессий восстанавливаются из последнего
+автосохранения (тик откатывается); сессии без автосохранения
+закрываются, клиент получает ошибку world_lost.
+"""
+import asyncio
+import heapq
+import itertools
+import json
+import multiprocessing
+import os
+import secrets
+import shutil
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List
+
+from alloc_profile import AllocationProfiler
+from config import ALLOC_PROFILE, SCHEDULER_WORKERS, SCHEDULER_MAX_TPS, SCHEDULER_IDLE_SECONDS, \
+    SCHEDULER_IDLE_TPS, SCHEDULER_SUSPEND_SECONDS, SCHEDULER_STATS_WINDOW, FRAME_PIPELINE, SAVES_DIR, \
+    SESSION_HIBERNATE_SECONDS, SESSION_EXPIRE_SECONDS, SESSION_MEMORY_BUDGET, SESSION_CELL_BYTES, \
+    SESSION_TILE_BYTES, SESSION_SWEEP_SECONDS
+from metrics import WORLDS, HIBERNATED, WORLDS_MEMORY, TICKS, TICKS_PER_SECOND, TICK_SECONDS, POPULATION, \
+    FRAME_ENCODE_SECONDS, SNAPSHOT_WRITE_SECONDS
+from models.cell import Cell
+from models.world import World
+from render import FrameView, build_render_state, capture_frame
+
+
+# === Операции над мирами (выполняются в процессе, где живёт мир) ===
+
+# миры этого процесса: id сессии -> мир
+_WORLDS: Dict[int, World] = {}
+
+
+def _op_add(session_id: int, world: World) -> int:
+    # таблица веществ и параметры приходят вместе с миром (world.config);
+    # id клеток уникальны в пределах процесса — мир мог прийти из другого
+    env = world.env
+    cell_ids = [c.id for c in env.cells + env.buffer_cells]
+    species_ids = [c.species_id for c in env.cells + env.buffer_cells]
+    if env.lineage is not None:
+        cell_ids.extend(env.lineage.cell_id)
+        species_ids.extend(env.lineage.species_id)
+    Cell.reserve_ids(max(cell_ids, default=0), max(species_ids, default=0))
+    if ALLOC_PROFILE and world.profiler is None:
+        world.profiler = AllocationProfiler()
+        world.profiler.start()
+    _WORLDS[session_id] = world
+    return world.tick
+
+
+def _op_remove(session_id: int):
+    world = _WORLDS.pop(session_id, None)
+    if world is not None:
+        world.stop_recording()
+        if world.profiler is not None:
+            world.profiler.stop()
+
+
+def _op_advance(session_id: int, ticks: int, render: bool, viewport: tuple | None = None, capture: bool = False):
+    """
+    Считает ticks тиков; возвращает (тик, время тика, длительности посчитанных
+    тиков в мс, клеток, кадр JSON или None, время сборки кадра в секундах,
+    автосохранения за эти тики — пары (путь, длительность в секундах)).
+    Кадр собирается только для видимой области viewport (см. build_render_state);
+    capture — вместо JSON вернуть снимок тика (render.FrameView), его кодирует сервер.
+    """
+    world = _WORLDS[session_id]
+    durations = []
+    for _ in range(ticks):
+        world.update()
+        durations.append(world.tick_time_ms)
+    frame = None
+    encode_seconds = 0.0
+    if render:
+        start = time.perf_counter()
+        if capture:
+            build = lambda: capture_frame(world, viewport)
+        else:
+            build = lambda: json.dumps(build_render_state(world, viewport))
+        frame = build() if world.profiler is None else world.profiler.measure("render", build)
+        encode_seconds = time.perf_counter() - start
+    saves = list(world.autosaves)
+    world.autosaves.clear()
+    return world.tick, world.tick_time_ms, durations, len(world.env.cells), frame, encode_seconds, saves
+
+
+def _op_save_file(session_id: int, path: str) -> int:
+    """Пишет снимок мира в файл (для скачивания по HTTP); возвращает тик снимка."""
+    world = _WORLDS[session_id]
+    world.save(path)
+    return world.tick
+
+
+def _op_load_file(session_id: int, path: str) -> int:
+    """Подменяет мир сессии миром из файла; при ошибке чтения старый мир остаётся."""
+    world = World.load(path)
+    _op_remove(session_id)
+    return _op_add(session_id, world)
+
+
+def _op_hibernate(session_id: int, path: str) -> int:
+    """Пишет снимок мира в файл и выгружает мир из воркера; возвращает тик снимка."""
+    world = _WORLDS[session_id]
+    world.save(path)
+    _op_remove(session_id)
+    return world.tick
+
+
+def _op_memory(session_id: int) -> int:
+    """Оценка памяти мира в байтах (по числу клеток и ячеек веществ)."""
+    env = _WORLDS[session_id].env
+    return (len(env.cells) + len(env.buffer_cells)) * SESSION_CELL_BYTES + len(env.grid.grid) * SESSION_TILE_BYTES
+
+
+def _op_event_log_path(session_id: int) -> str | None:
+    world = _WORLDS[session_id]
+    if world.event_log is None:
+        return None
+    world.event_log.flush()
+    return world.event_log.path
+
+
+def _op_lineage(session_id: int, species_id: int) -> dict | None:
+    lineage = _WORLDS[session_id].env.lineage
+    if lineage is None:
+        return None
+    return {
+        "species": lineage.species_info(species_id),
+        "ancestors": [lineage.species_info(s) for s in lineage.species_ancestors(species_id)],
+    }
+
+
+def _op_alloc_profile(session_id: int, action: str) -> dict | None:
+    """Профилирование выделений мира: start / stop / report; возвращает отчёт."""
+    world = _WORLDS[session_id]
+    if action == "start":
+        if world.profiler is None:
+            world.profiler = AllocationProfiler()
+        world.profiler.start()
+    elif action == "stop" and world.profiler is not None:
+        # отчёт до остановки: после неё снимок tracemalloc для сравнения уже не доступен
+        report = world.profiler.report()
+        world.profiler.stop()
+        report["running"] = False
+        return report
+    return world.profiler.report() if world.profiler is not None else None
+
+
+_OPS = {
+    "add": _op_add,
+    "remove": _op_remove,
+    "advance": _op_advance,
+    "save_file": _op_save_file,
+    "load_file": _op_load_file,
+    "hibernate": _op_hibernate,
+    "memory": _op_memory,
+    "event_log_path": _op_event_log_path,
+    "lineage": _op_lineage,
+    "alloc_profile": _op_alloc_profile,
+}
+
+
+def _run_op(op: str, session_id: int, args: tuple):
+    return _OPS[op](session_id, *args)
+
+
+# операции с файлами снимков: в процессе сервера выполняются в потоке, а не в event loop
+_BLOCKING_OPS = {"save_file", "load_file", "hibernate"}
+
+
+class WorkerCrashed(RuntimeError):
+    """Процесс воркера упал; операция не выполнена, миры его сессий потеряны."""
+
+
+class SessionLost(RuntimeError):
+    """Мир сессии пропал вместе с процессом воркера, восстановить его не из чего."""
+
+
+# === Учёт нагрузки ===
+
+class RateWindow:
+    """Сумма значений за последние window секунд (загрузка воркера, тики сессии)."""
+
+    def __init__(self, window: float = SCHEDULER_STATS_WINDOW):
+        self.window = window
+        self.events: deque = deque()
+        self.total = 0.0
+
+    def add(self, value: float, now: float | None = None):
+        now = time.monotonic() if now is None else now
+        self.events.append((now, value))
+        self.total += value
+        self._expire(now)
+
+    def _expire(self, now: float):
+        while self.events and self.events[0][0] < now - self.window:
+            self.total -= self.events.popleft()[1]
+
+    def per_second(self, now: float | None = None) -> float:
+        self._expire(time.monotonic() if now is None else now)
+        return self.total / self.window
+
+
+# === Сессии и воркеры ===
+
+class Session:
+    """Настройки и учёт одной клиентской сессии (сам мир — в воркере)."""
+
+    _ids = itertools.count(1)
+
+    def __init__(self, priority: float = 1.0, max_tps: float = SCHEDULER_MAX_TPS):
+        self.id = next(Session._ids)
+        self.worker: "Worker | None" = None
+        self.priority = priority
+        self.max_tps = max_tps
+
+        # управление с клиента
+        self.running = True
+        self.max_speed = False
+        self.ticks_per_frame = 1
+        self.pending_steps = 0
+        self.redraw = False  # отправить кадр, даже если мир не менялся (после загрузки)
+        self.viewport: tuple | None = None  # (x, y, ширина, высота, zoom) видимой области; None — весь мир
+        self.replay = None  # ReplayWorld — воспроизведение идёт в процессе сервера
+
+        # последнее известное состояние мира
+        self.tick = 0
+        self.tick_time_ms = 0.0
+        self.cells = 0
+
+        # планирование
+        now = time.monotonic()
+        self.vtime = 0.0
+        self.tokens = 0.0
+        self.tokens_time = now
+        self.last_ack = now
+        self.ticks_window = RateWindow()
+
+        # переподключение и выгрузка (Scheduler.attach / hibernate)
+        self.token = secrets.token_urlsafe(16)
+        self.attached = True
+        self.snapshot_path: str | None = None  # снимок выгруженного мира; None — мир в воркере
+        self.last_save: str | None = None  # последнее автосохранение мира (восстановление после падения воркера)
+        self.lost = False  # мир пропал с упавшим воркером (см. Scheduler._worker_crashed)
+        self.memory = 0  # оценка памяти мира в воркере, байт
+        # смена воркера (выгрузка / загрузка) не пересекается с операциями над миром
+        self.lock = asyncio.Lock()
+
+    def stop_replay(self):
+        """Заканчивает воспроизведение журнала (ReplayWorld держит файл открытым)."""
+        if self.replay is not None:
+            self.replay.close()
+            self.replay = None
+
+    def ack(self):
+        """Клиент на связи (страница открыта)."""
+        self.last_ack = time.monotonic()
+
+    def activity(self, now: float | None = None) -> str:
+        if self.max_speed and self.attached:
+            return "active"
+        idle = (time.monotonic() if now is None else now) - self.last_ack
+        if idle >= SCHEDULER_SUSPEND_SECONDS:
+            return "suspended"
+        if idle >= SCHEDULER_IDLE_SECONDS:
+            return "idle"
+        return "active"
+
+    def tick_rate(self, now: float) -> float:
+        """Предел тиков в секунду сейчас (0 — тики запрещены, inf — без предела)."""
+        activity = self.activity(now)
+        if activity == "suspended":
+            return 0.0
+        limit = self.max_tps if self.max_tps > 0 else float("inf")
+        if activity == "idle":
+            limit = min(limit, SCHEDULER_IDLE_TPS)
+        return limit
+
+    def take_ticks(self, wanted: int, now: float | None = None) -> int:
+        """Сколько из wanted тиков можно посчитать сейчас (ведро токенов ёмкостью в секунду)."""
+        now = time.monotonic() if now is None else now
+        rate = self.tick_rate(now)
+        if rate == float("inf"):
+            return wanted
+        self.tokens = min(self.tokens + (now - self.tokens_time) * rate, max(rate, 1.0))
+        self.tokens_time = now
+        ticks = min(wanted, int(self.tokens))
+        self.tokens -= ticks
+        return ticks
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "worker": self.worker.index if self.worker is not None else None,
+            "priority": self.priority,
+            "max_tps": self.max_tps,
+            "running": self.running,
+            "max_speed": self.max_speed,
+            "replay": self.replay is not None,
+            "attached": self.attached,
+            "hibernated": self.snapshot_path is not None,
+            "memory": self.memory,
+            "activity": self.activity(),
+            "tick": self.tick,
+            "tps": round(self.ticks_window.per_second(), 2),
+            "tick_time_ms": round(self.tick_time_ms, 3),
+            "cells": self.cells,
+        }
+
+
+class Worker:
+    """
+    Исполнитель операций над мирами: процесс с одним потоком (или
+    сам сервер, если process=False). Операции выполняются по одной,
+    первой — у сессии с наименьшим виртуальным временем.
+    """
+
+    def __init__(self, index: int, process: bool):
+        self.index = index
+        self.executor = self._spawn() if process else None
+        # вызывается с воркером и сессиями, чьи миры пропали при падении процесса
+        self.on_crash = None
+        self.sessions: set[Session] = set()
+        self.queue: list = []
+        self.order = itertools.count()
+        self.wakeup = asyncio.Event()
+        self.busy = RateWindow()
+        self.task: asyncio.Task | None = None
+
+    @staticmethod
+    def _spawn() -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn"))
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self._dispatch())
+
+    def _crashed(self):
+        """Процесс упал: новый процесс, операции из очереди отменяются, сессии — планировщику."""
+        print(f"💥 Worker {self.index} process died, restarting")
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.executor = self._spawn()
+        queued, self.queue = self.queue, []
+        for *_, future in queued:
+            if not future.done():
+                future.set_exception(WorkerCrashed(f"worker {self.index} crashed"))
+        lost, self.sessions = self.sessions, set()
+        if self.on_crash is not None:
+            self.on_crash(self, lost)
+
+    def min_vtime(self) -> float:
+        return min((s.vtime for s in self.sessions), default=0.0)
+
+    async def call(self, session: Session, op: str, *args):
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self.queue, (session.vtime, next(self.order), session, op, args, future))
+        self.wakeup.set()
+        return await future
+
+    async def _dispatch(self):
+        while True:
+            if not self.queue:
+                self.wakeup.clear()
+                await self.wakeup.wait()
+                continue
+
+            _, _, session, op, args, future = heapq.heappop(self.queue)
+            start = time.perf_counter()
+            try:
+                result = await self._execute(session, op, args)
+            except BrokenProcessPool:
+                self._crashed()
+                if not future.done():
+                    future.set_exception(WorkerCrashed(f"worker {self.index} crashed"))
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            else:
+                if not future.done():
+                    future.set_result(result)
+            elapsed = time.perf_counter() - start
+            self.busy.add(elapsed)
+            session.vtime += elapsed / max(session.priority, 1e-6)
+
+    async def _execute(self, session: Session, op: str, args: tuple):
+        if self.executor is not None:
+            return await asyncio.wrap_future(self.executor.submit(_run_op, op, session.id, args))
+
+        if op == "advance":
+            # в процессе сервера тики считаются по одному, отдавая управление event loop
+            ticks, render, viewport, capture = args
+            durations, saves = [], []
+            for _ in range(ticks):
+                result = _run_op(op, session.id, (1, False))
+                durations.extend(result[2])
+                saves.extend(result[6])
+                await asyncio.sleep(0)
+            tick, tick_time_ms, _, cells, frame, encode_seconds, _ = _run_op(
+                op, session.id, (0, render, viewport, capture)
+            )
+            return tick, tick_time_ms, durations, cells, frame, encode_seconds, saves
+        if op in _BLOCKING_OPS:
+            return await asyncio.to_thread(_run_op, op, session.id, args)
+        return _run_op(op, session.id, args)
+
+    def to_dict(self) -> dict:
+        return {
+            "index": self.index,
+            "process": self.executor is not None,
+            "worlds": len(self.sessions),
+            "queue": len(self.queue),
+            "load": round(self.busy.per_second(), 3),
+        }
+
+    async def close(self):
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+class Scheduler:
+    """Все сессии сервера и воркеры, на которых считаются их миры."""
+
+    def __init__(self, workers: int = SCHEDULER_WORKERS, frame_pipeline: str = FRAME_PIPELINE,
+                 sessions_dir: str = os.path.join(SAVES_DIR, "sessions"),
+                 memory_budget: int = SESSION_MEMORY_BUDGET):
+        # "double_buffer" — advance возвращает снимок тика (FrameView), JSON собирает сервер
+        self.frame_pipeline = frame_pipeline
+        self.capture_frames = frame_pipeline == "double_buffer"
+        if workers > 0:
+            self.workers: List[Worker] = [Worker(i, process=True) for i in range(workers)]
+        else:
+            self.workers = [Worker(0, process=False)]
+        for worker in self.workers:
+            worker.on_crash = self._worker_crashed
+        self.sessions: Dict[int, Session] = {}
+        self.tokens: Dict[str, Session] = {}
+        # снимки выгруженных миров и бюджет памяти миров в воркерах
+        self.sessions_dir = os.path.abspath(sessions_dir)
+        self.memory_budget = memory_budget
+        self.memory = 0
+        self.sweeper: asyncio.Task | None = None
+
+    def start(self):
+        for worker in self.workers:
+            worker.start()
+        self.restore_hibernated()
+        if self.sweeper is None:
+            self.sweeper = asyncio.create_task(self._sweep_loop())
+
+    def _pick_worker(self) -> Worker:
+        return min(self.workers, key=lambda w: (len(w.sessions), w.busy.per_second()))
+
+    def _join(self, session: Session, worker: Worker):
+        session.worker = worker
+        session.vtime = worker.min_vtime()  # сессия не получает накопленного «долга» других
+        worker.sessions.add(session)
+
+    def _leave(self, session: Session):
+        if session.worker is not None:
+            session.worker.sessions.discard(session)
+            session.worker = None
+
+    async def open(self, world: World) -> Session:
+        """Регистрирует мир новой сессии на наименее загруженном воркере."""
+        session = Session()
+        self._join(session, self._pick_worker())
+        self.sessions[session.id] = session
+        self.tokens[session.token] = session
+        try:
+            session.tick = await session.worker.call(session, "add", world)
+        except Exception:
+            await self.close(session)
+            raise
+        return session
+
+    def attach(self, token: str) -> Session | None:
+        """Сессия по токену для нового подключения (мир загрузится при первой операции)."""
+        session = self.tokens.get(token)
+        if session is None or session.attached:
+            return None
+        session.attached = True
+        session.ack()
+        return session
+
+    def detach(self, session: Session):
+        """Клиент отключился: мир остаётся и ждёт переподключения (см. sweep)."""
+        session.attached = False
+        session.ack()  # простой без клиента отсчитывается от отключения
+
+    async def close(self, session: Session):
+        async with session.lock:
+            self.sessions.pop(session.id, None)
+            self.tokens.pop(session.token, None)
+            session.stop_replay()
+            for metric in (TICKS, TICK_SECONDS, POPULATION, TICKS_PER_SECOND):
+                metric.remove(session.id)
+            worker = session.worker
+            if worker is not None:
+                self._leave(session)
+                try:
+                    await worker.call(session, "remove")
+                except WorkerCrashed:
+                    pass  # мира уже нет
+            if session.snapshot_path is not None:
+                _remove_file(session.snapshot_path)
+                session.snapshot_path = None
+
+    async def _ensure_resident(self, session: Session):
+        """Загружает выгруженный мир в наименее нагруженный воркер (вызывается под session.lock)."""
+        if session.snapshot_path is None:
+            return
+        self._join(session, self._pick_worker())
+        try:
+            session.tick = await session.worker.call(session, "load_file", session.snapshot_path)
+        except Exception:
+            self._leave(session)
+            raise
+        _remove_file(session.snapshot_path)
+        session.snapshot_path = None
+        print(f"☀️  Session {session.id} resumed -> worker {session.worker.index}, tick={session.tick}")
+
+    async def hibernate(self, session: Session) -> bool:
+        """Выгружает мир сессии в сжатый снимок; False — уже выгружен или сессия закрыта."""
+        async with session.lock:
+            if session.snapshot_path is not None or session.worker is None or self.sessions.get(session.id) is not session:
+                return False
+            os.makedirs(self.sessions_dir, exist_ok=True)
+            path = os.path.join(self.sessions_dir, f"{session.token}.json.gz")
+            worker = session.worker
+            start = time.perf_counter()
+            session.tick = await worker.call(session, "hibernate", path)
+            SNAPSHOT_WRITE_SECONDS.labels("hibernate").observe(time.perf_counter() - start)
+            self._leave(session)
+            session.snapshot_path = path
+            session.memory = 0
+        print(f"💤 Session {session.id} hibernated, tick={session.tick} ({os.path.getsize(path) / 1024:.0f} KiB)")
+        return True
+
+    def restore_hibernated(self):
+        """Снимки выгруженных сессий прошлого запуска: к ним можно переподключиться по токену."""
+        if not os.path.isdir(self.sessions_dir):
+            return
+        now, wall = time.monotonic(), time.time()
+        for name in os.listdir(self.sessions_dir):
+            if not name.endswith(".json.gz"):
+                continue
+            path = os.path.join(self.sessions_dir, name)
+            session = Session()
+            session.token = name[:-len(".json.gz")]
+            session.attached = False
+            session.snapshot_path = path
+            session.last_ack = now - (wall - os.path.getmtime(path))
+            self.sessions[session.id] = session
+            self.tokens[session.token] = session
+
+    async def sweep(self, now: float | None = None):
+        """Выгружает миры без клиента, соблюдает бюджет памяти, удаляет старые снимки."""
+        now = time.monotonic() if now is None else now
+        for session in list(self.sessions.values()):
+            if session.attached:
+                continue
+            idle = now - session.last_ack
+            if session.snapshot_path is None and idle >= SESSION_HIBERNATE_SECONDS:
+                await self.hibernate(session)
+            elif session.snapshot_path is not None and idle >= SESSION_EXPIRE_SECONDS:
+                print(f"🗑️  Session {session.id} expired")
+                await self.close(session)
+
+        if self.memory_budget <= 0:
+            return
+        resident = [s for s in self.sessions.values() if s.snapshot_path is None and s.worker is not None]
+        for session in resident:
+            session.memory = await self.call(session, "memory")
+        self.memory = sum(s.memory for s in resident)
+        # давно не использованные первыми; мир, который клиент смотрит, не трогаем
+        idle = sorted(
+            (s for s in resident if not s.attached or s.activity(now) == "suspended"),
+            key=lambda s: s.last_ack,
+        )
+        for session in idle:
+            if self.memory <= self.memory_budget:
+                break
+            memory = session.memory
+            if await self.hibernate(session):
+                self.memory -= memory
+
+    async def _sweep_loop(self):
+        while True:
+            await asyncio.sleep(SESSION_SWEEP_SECONDS)
+            try:
+                await self.sweep()
+            except Exception as e:
+                print(f"❌ Session sweep failed: {e}")
+
+    def _worker_crashed(self, worker: Worker, sessions: set):
+        """
+        Миры сессий упавшего воркера: восстанавливаются из последнего автосохранения
+        (копия становится снимком выгруженного мира и загрузится при следующей
+        операции); сессии без автосохранения закрываются.
+        """
+        for session in sessions:
+            session.worker = None
+            session.memory = 0
+            if session.snapshot_path is not None:
+                continue  # мир как раз загружался из снимка выгрузки — снимок цел
+            if session.last_save is not None and os.path.exists(session.last_save):
+                os.makedirs(self.sessions_dir, exist_ok=True)
+                path = os.path.join(self.sessions_dir, f"{session.token}.json.gz")
+                shutil.copyfile(session.last_save, path)
+                session.snapshot_path = path
+                print(f"🩹 Session {session.id} will resume from {session.last_save}")
+            else:
+                session.lost = True
+                print(f"💀 Session {session.id} lost with worker {worker.index}")
+                asyncio.create_task(self.close(session))
+
+    async def call(self, session: Session, op: str, *args):
+        async with session.lock:
+            for retry in (False, True):
+                try:
+                    if session.lost:
+                        raise SessionLost(f"session {session.id} lost with its worker")
+                    await self._ensure_resident(session)
+                    return await session.worker.call(session, op, *args)
+                except WorkerCrashed:
+                    if session.lost:
+                        raise SessionLost(f"session {session.id} lost with its worker") from None
+                    # мир восстановлен из автосохранения — операция повторяется над ним один раз
+                    if retry or session.snapshot_path is None:
+                        raise
+
+    async def advance(self, session: Session, ticks: int, render: bool = True) -> str | FrameView | None:
+        """
+        Считает ticks тиков мира сессии и возвращает кадр, если render: JSON или,
+        при frame_pipeline = "double_buffer", снимок тика (кодирует encode_frame).
+        """
+        capture = self.capture_frames
+        tick, tick_time_ms, durations, cells, frame, encode_seconds, saves = await self.call(
+            session, "advance", ticks, render, session.viewport, capture
+        )
+        session.tick = tick
+        session.tick_time_ms = tick_time_ms
+        session.cells = cells
+        if durations:
+            session.ticks_window.add(len(durations))
+            TICKS.labels(session.id).inc(len(durations))
+            tick_seconds = TICK_SECONDS.labels(session.id)
+            for ms in durations:
+                tick_seconds.observe(ms / 1000)
+        POPULATION.labels(session.id).set(cells)
+        for path, seconds in saves:
+            SNAPSHOT_WRITE_SECONDS.labels("autosave").observe(seconds)
+            session.last_save = path
+        if frame is not None and not capture:
+            FRAME_ENCODE_SECONDS.observe(encode_seconds)
+        return frame
+
+    def update_metrics(self):
+        """Значения, которые считаются только при чтении /metrics."""
+        WORLDS.set(len(self.sessions))
+        HIBERNATED.set(sum(1 for s in self.sessions.values() if s.snapshot_path is not None))
+        WORLDS_MEMORY.set(self.memory)
+        for session in self.sessions.values():
+            TICKS_PER_SECOND.labels(session.id).set(session.ticks_window.per_second())
+
+    def load(self) -> dict:
+        """Текущая нагрузка для /admin/load."""
+        return {
+            "workers": [w.to_dict() for w in self.workers],
+            "sessions": [s.to_dict() for s in self.sessions.values()],
+            "memory": self.memory,
+            "memory_budget": self.memory_budget,
+        }
+
+    async def shutdown(self):
+        """Останов сервера: миры в воркерах выгружаются на диск (restore_hibernated при следующем запуске)."""
+        if self.sweeper is not None:
+            self.sweeper.cancel()
+            await asyncio.gather(self.sweeper, return_exceptions=True)
+        for session in list(self.sessions.values()):
+            try:
+                await self.hibernate(session)
+            except Exception as e:
+                print(f"❌ Session {session.id} hibernation failed: {e}")
+        for worker in self.workers:
+            await worker.close()
+
+
+def _remove_file(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
@@ -1,12 +1,17 @@
 import asyncio
 import json
+import math
 from aiohttp import web
 import os
 import time
 
-from config import WORLD_WIDTH, WORLD_HEIGHT, FRAME_TIME, CELL_RADIUS
-from models.world import World
-from helpers import populate_world
+from config import FRAME_TIME, NETWORK_FPS, SAVES_DIR, MAX_TICKS_PER_FRAME, MAX_STEP_TICKS, ADMIN_TOKEN
+from metrics import REGISTRY, CLIENTS, FRAME_BYTES, FRAMES_DROPPED, SNAPSHOT_WRITE_SECONDS, FRAME_ENCODE_SECONDS
+from models.event_log import ReplayWorld
+from render import FrameView, build_render_state, encode_frame
+from scheduler import Scheduler, Session, SessionLost
+from snapshots import TransferTokens, SAVE, LOAD, send_file, receive_file
+from world_pool import WorldPool
 
 
 # === Маршруты HTTP ===
@@ -15,45 +20,204 @@ async def index(request):
     return web.FileResponse("static/index.html")
 
 
-async def client_simulation_loop(ws: web.WebSocketResponse, state: dict):
-    """
-    Отдельный цикл симуляции для каждого клиента.
-    state = {
-        "world": World,
-        "sim_running": bool,
-        "max_speed": bool,
-        "last_state": dict,
-    }
-    """
-    while not ws.closed:
-        # === Режим "max speed": считаем тики, но НЕ шлём кадры на фронт ===
-        if state["sim_running"] and state["max_speed"]:
-            state["world"].update()
-            # здесь нет build_render_state и send_str
-            await asyncio.sleep(0)  # просто отдаём управление event loop
-            continue
+def check_admin(request):
+    if ADMIN_TOKEN is not None and request.headers.get("X-Admin-Token") != ADMIN_TOKEN:
+        raise web.HTTPForbidden()
+
+
+async def admin_load(request):
+    """Текущая нагрузка планировщика: воркеры и сессии."""
+    check_admin(request)
+    return web.json_response(request.app[SCHEDULER].load())
+
+
+async def admin_session(request):
+    """Меняет приоритет / предел тиков / паузу сессии."""
+    check_admin(request)
+    try:
+        session_id = int(request.match_info["session_id"])
+    except ValueError:
+        raise web.HTTPBadRequest(text="invalid_session_id")
+    session = request.app[SCHEDULER].sessions.get(session_id)
+    if session is None:
+        raise web.HTTPNotFound()
+
+    try:
+        data = await request.json()
+    except json.JSONDecodeError:
+        raise web.HTTPBadRequest(text="invalid_json")
+    if not isinstance(data, dict):
+        raise web.HTTPBadRequest(text="invalid_json")
+    priority = data.get("priority")
+    if isinstance(priority, (int, float)) and priority > 0:
+        session.priority = float(priority)
+    max_tps = data.get("max_tps")
+    if isinstance(max_tps, (int, float)) and max_tps >= 0:
+        session.max_tps = float(max_tps)
+    running = data.get("running")
+    if isinstance(running, bool):
+        session.running = running
+    return web.json_response(session.to_dict())
+
+
+async def metrics(request):
+    """Метрики сервера в текстовом формате Prometheus."""
+    request.app[SCHEDULER].update_metrics()
+    return web.Response(text=REGISTRY.render(), content_type="text/plain", charset="utf-8",
+                        headers={"X-Prometheus-Format": "0.0.4"})
+
+
+async def snapshot_download(request):
+    """Скачивание снимка мира по токену из команды save."""
+    transfer = request.app[TRANSFERS].take(request.match_info["token"], SAVE)
+    if transfer is None:
+        raise web.HTTPNotFound()
+    try:
+        start = time.perf_counter()
+        tick = await request.app[SCHEDULER].call(transfer.session, "save_file", transfer.path)
+        SNAPSHOT_WRITE_SECONDS.labels("download").observe(time.perf_counter() - start)
+        filename = f"world_state_tick_{tick}.json"
+        print(f"💾 Snapshot download -> {filename}")
+        return await send_file(request, transfer.path, filename)
+    finally:
+        transfer.discard()
+
 
-        # === Обычный режим (или пауза) c ограничением FPS и отрисовкой ===
-        start_time = time.perf_counter()
+async def snapshot_upload(request):
+    """Загрузка сохранения по токену из команды load: мир сессии подменяется миром из файла."""
+    transfer = request.app[TRANSFERS].take(request.match_info["token"], LOAD)
+    if transfer is None:
+        raise web.HTTPNotFound()
+    session = transfer.session
+    try:
+        size = await receive_file(request, transfer.path)
+        tick = await request.app[SCHEDULER].call(session, "load_file", transfer.path)
+        session.last_save = None  # автосохранения прежнего мира к загруженному не относятся
+    except Exception as e:
+        print(f"❌ Load failed: {e}")
+        raise web.HTTPBadRequest(text="load_failed")
+    finally:
+        transfer.discard()
 
-        if state["sim_running"]:
-            state["world"].update()
+    session.tick = tick
+    session.stop_replay()
+    session.running = True  # после загрузки продолжаем симуляцию
+    session.redraw = True
+    print(f"📂 World loaded via HTTP ({size} bytes), tick={tick}")
+    return web.json_response({"loaded_tick": tick, "running": session.running})
 
-        state["last_state"] = build_render_state(state["world"])
-        message = json.dumps(state["last_state"])
 
-        try:
-            await ws.send_str(message)
-        except ConnectionResetError:
-            break
+def status_message(session: Session, **extra) -> str:
+    """Служебное сообщение о режиме симуляции клиента."""
+    return json.dumps({
+        "type": "status",
+        "running": session.running,
+        "max_speed": session.max_speed,
+        "ticks_per_frame": session.ticks_per_frame,
+        **extra,
+    })
+
+
+async def send_frame_view(ws: web.WebSocketResponse, view: FrameView) -> bool:
+    """Собирает JSON кадра из снимка тика в потоке и отправляет; False — клиент отключился."""
+    start = time.perf_counter()
+    frame = await asyncio.to_thread(encode_frame, view)
+    FRAME_ENCODE_SECONDS.observe(time.perf_counter() - start)
+    try:
+        await ws.send_str(frame)
+    except ConnectionResetError:
+        return False
+    FRAME_BYTES.observe(len(frame))
+    return True
 
-        elapsed = time.perf_counter() - start_time
-        delay = FRAME_TIME - elapsed
 
-        if delay > 0:
-            await asyncio.sleep(delay)
-        else:
-            await asyncio.sleep(0)
+async def client_simulation_loop(ws: web.WebSocketResponse, scheduler: Scheduler, session: Session):
+    """
+    Отдельный цикл симуляции для каждого клиента. Тики считает планировщик
+    (в воркере мира) в пределах бюджета сессии каждые FRAME_TIME; кадр
+    отправляется, только если мир изменился, и не чаще NETWORK_FPS раз в
+    секунду (кадр по команде — на паузе, после загрузки — сразу).
+
+    При FRAME_PIPELINE = "double_buffer" планировщик возвращает снимок тика:
+    кадр собирается и отправляется отдельной задачей, а цикл тем временем
+    просит у воркера следующие тики. В полёте не больше одного кадра.
+    """
+    send_frame = True  # первый кадр — сразу после подключения
+    changed = False    # мир изменился после последнего отправленного кадра
+    network_frame_time = 1 / NETWORK_FPS if NETWORK_FPS > 0 else 0.0
+    next_frame_time = 0.0
+    replaying = False
+    sending: asyncio.Task | None = None  # отправка предыдущего снимка тика
+    try:
+        while not ws.closed:
+            start_time = time.perf_counter()
+            if replaying != (session.replay is not None):
+                replaying = session.replay is not None
+                send_frame = True
+            if session.redraw:
+                session.redraw = False
+                send_frame = True
+            frame_due = start_time >= next_frame_time
+
+            if session.replay is not None:
+                # === Воспроизведение журнала: в процессе сервера, вне цикла событий ===
+                replay = session.replay
+                if session.running:
+                    await asyncio.to_thread(replay.update)
+                    changed = True
+                render = send_frame or (changed and frame_due)
+                frame = json.dumps(build_render_state(replay, session.viewport)) if render else None
+            else:
+                if session.running:
+                    # K тиков на кадр; в режиме "max speed" — пачка без отрисовки
+                    wanted = MAX_TICKS_PER_FRAME if session.max_speed else session.ticks_per_frame
+                    ticks = session.take_ticks(wanted)
+                else:
+                    ticks, session.pending_steps = session.pending_steps, 0
+                    # шаг на паузе показываем сразу
+                    send_frame = send_frame or ticks > 0
+                changed = changed or ticks > 0
+
+                render = (send_frame or (changed and frame_due)) and not (session.running and session.max_speed)
+                frame = None
+                if ticks or render:
+                    try:
+                        frame = await scheduler.advance(session, ticks, render)
+                    except SessionLost:
+                        # воркер упал, а восстановить мир не из чего (см. Scheduler._worker_crashed)
+                        await ws.send_str(status_message(session, error="world_lost"))
+                        await ws.close()
+                        break
+
+            if frame is not None:
+                changed = False
+                next_frame_time = start_time + network_frame_time
+
+            if isinstance(frame, FrameView):
+                if sending is not None and not await sending:
+                    break
+                sending = asyncio.create_task(send_frame_view(ws, frame))
+            elif frame is not None:
+                try:
+                    await ws.send_str(frame)
+                except ConnectionResetError:
+                    break
+                FRAME_BYTES.observe(len(frame))
+            send_frame = False
+
+            elapsed = time.perf_counter() - start_time
+            delay = FRAME_TIME - elapsed
+
+            if delay > 0:
+                await asyncio.sleep(delay)
+            else:
+                # цикл не уложился в кадр: пропущенные кадровые интервалы
+                FRAMES_DROPPED.inc(int(elapsed / FRAME_TIME))
+                await asyncio.sleep(0)
+    finally:
+        if sending is not None:
+            sending.cancel()
+            await asyncio.gather(sending, return_exceptions=True)
 
 
 async def websocket_handler(request):
@@ -63,28 +227,24 @@ async def websocket_handler(request):
 
     print("🌐 Клиент подключён")
 
-    # === Инициализируем отдельный мир ДЛЯ ЭТОГО клиента ===
-    world = World(WORLD_WIDTH, WORLD_HEIGHT)
-    populate_world(world)
-
-    state = {
-        "world": world,
-        "sim_running": True,
-        "max_speed": False,
-        "last_state": build_render_state(world),
-    }
-
-    # при подключении сразу отправим статус
-    await ws.send_str(json.dumps({
-        "type": "status",
-        "running": state["sim_running"],
-        "max_speed": state["max_speed"],
-    }))
+    # === Своя сессия по токену (перезагрузка страницы) или новый мир из пула готовых миров ===
+    scheduler = request.app[SCHEDULER]
+    session = scheduler.attach(request.query.get("session", ""))
+    if session is not None:
+        print(f"🔁 Session {session.id} reattached")
+    else:
+        world = await request.app[WORLD_POOL].acquire()
+        session = await scheduler.open(world)
+        print(f"🧭 Session {session.id} -> worker {session.worker.index}")
 
     # запускаем клиентский цикл симуляции
-    sim_task = asyncio.create_task(client_simulation_loop(ws, state))
+    CLIENTS.inc()
+    sim_task = asyncio.create_task(client_simulation_loop(ws, scheduler, session))
 
     try:
+        # при подключении сразу отправим статус (и токен для переподключения)
+        await ws.send_str(status_message(session, session_token=session.token))
+
         async for msg in ws:
             if msg.type != web.WSMsgType.TEXT:
                 continue
@@ -93,6 +253,7 @@ async def websocket_handler(request):
 
             # старый ping
             if raw == "ping":
+                session.ack()
                 await ws.send_str("pong")
                 continue
 
@@ -101,136 +262,190 @@ async def websocket_handler(request):
             except json.JSONDecodeError:
                 continue
 
+            # клиент на связи (шлёт, пока открыта страница): без этого мир считается брошенным
+            if data.get("type") == "ack":
+                session.ack()
+                continue
+
             if data.get("type") != "control":
                 continue
 
+            session.ack()
             command = data.get("command")
 
             if command == "start":
-                state["sim_running"] = True
+                session.running = True
                 print("▶️  Simulation started via WS (client)")
-                await ws.send_str(json.dumps({
-                    "type": "status",
-                    "running": state["sim_running"],
-                    "max_speed": state["max_speed"],
-                }))
+                await ws.send_str(status_message(session))
 
             elif command == "stop":
-                state["sim_running"] = False
+                session.running = False
                 print("⏸️  Simulation stopped via WS (client)")
-                await ws.send_str(json.dumps({
-                    "type": "status",
-                    "running": state["sim_running"],
-                    "max_speed": state["max_speed"],
-                }))
+                await ws.send_str(status_message(session))
 
             elif command == "speed":
                 max_speed = data.get("max_speed")
                 if isinstance(max_speed, bool):
-                    state["max_speed"] = max_speed
+                    session.max_speed = max_speed
                     print(f"⚙️  Speed mode changed via WS (client): max_speed={max_speed}")
-                await ws.send_str(json.dumps({
-                    "type": "status",
-                    "running": state["sim_running"],
-                    "max_speed": state["max_speed"],
-                }))
+                ticks_per_frame = data.get("ticks_per_frame")
+                if isinstance(ticks_per_frame, int) and not isinstance(ticks_per_frame, bool):
+                    session.ticks_per_frame = max(1, min(ticks_per_frame, MAX_TICKS_PER_FRAME))
+                    print(f"⚙️  Speed changed via WS (client): x{session.ticks_per_frame} ticks/frame")
+                await ws.send_str(status_message(session))
+
+            elif command == "step":
+                # пошаговый режим: N тиков и один кадр, только на паузе
+                ticks = data.get("ticks", 1)
+                if not session.running and isinstance(ticks, int) and ticks > 0:
+                    session.pending_steps += min(ticks, MAX_STEP_TICKS)
+                    print(f"⏭️  Step requested via WS (client): {ticks} ticks")
+                await ws.send_str(status_message(session))
+
+            elif command == "replay":
+                # воспроизведение журнала событий: файл из SAVES_DIR или журнал текущего мира
+                name = data.get("file")
+                if name:
+                    path = os.path.join(SAVES_DIR, os.path.basename(name))
+                else:
+                    path = await scheduler.call(session, "event_log_path")
+
+                speed = data.get("speed", 10)
+                try:
+                    replay = ReplayWorld(path, ticks_per_update=max(1, min(int(speed), MAX_TICKS_PER_FRAME)))
+                except Exception as e:
+                    print(f"❌ Replay failed: {e}")
+                    await ws.send_str(status_message(session, error="replay_failed"))
+                    continue
 
-            elif command == "save":
-                full_state = state["world"].to_dict()
-                filename = f"world_state_tick_{state['world'].tick}.json"
-                print(f"💾 Save requested via WS -> {filename}")
+                session.stop_replay()
+                session.replay = replay
+                session.running = True
+                print(f"⏪ Replay started via WS (client): {path}, x{replay.ticks_per_update}")
+                await ws.send_str(status_message(session, replay=True))
+
+            elif command == "replay_stop":
+                if session.replay is not None:
+                    session.stop_replay()
+                    print("⏹️  Replay stopped via WS (client)")
+                await ws.send_str(status_message(session, replay=False))
+
+            elif command == "lineage":
+                # родословная вида: сам вид и его предки (от ближайшего к древнему)
+                species_id = data.get("species_id")
+                lineage = None
+                if isinstance(species_id, int):
+                    lineage = await scheduler.call(session, "lineage", species_id)
+                if lineage is None:
+                    await ws.send_str(status_message(session, error="lineage_unavailable"))
+                    continue
+                await ws.send_str(json.dumps({"type": "lineage", **lineage}))
+
+            elif command == "viewport":
+                # видимая область клиента в клетках сетки и масштаб (пикселей на клетку);
+                # без координат — снова весь мир
+                rect = [data.get(k) for k in ("x", "y", "width", "height", "zoom")]
+                if all(v is None for v in rect):
+                    session.viewport = None
+                elif all(isinstance(v, (int, float)) and not isinstance(v, bool) and math.isfinite(v) for v in rect) \
+                        and rect[2] > 0 and rect[3] > 0 and rect[4] > 0:
+                    session.viewport = tuple(float(v) for v in rect)
+                else:
+                    await ws.send_str(status_message(session, error="invalid_viewport"))
+                    continue
+                session.redraw = True  # на паузе кадр с новой областью тоже нужен
+
+            elif command == "alloc_profile":
+                # профилирование выделений памяти мира: start / stop / report
+                action = data.get("action", "report")
+                if action not in ("start", "stop", "report"):
+                    await ws.send_str(status_message(session, error="invalid_action"))
+                    continue
+                report = await scheduler.call(session, "alloc_profile", action)
+                print(f"🧠 Alloc profile via WS (client): {action}")
+                await ws.send_str(json.dumps({"type": "alloc_profile", "report": report}))
 
+            elif command == "save":
+                # сам снимок скачивается по HTTP: по WebSocket — только токен
+                if session.replay is not None:
+                    await ws.send_str(status_message(session, error="replay_active"))
+                    continue
+                transfer = request.app[TRANSFERS].issue(session, SAVE)
+                print("💾 Save requested via WS (client)")
                 await ws.send_str(json.dumps({
                     "type": "save",
-                    "filename": filename,
-                    "state": full_state,
+                    "filename": f"world_state_tick_{session.tick}.json",
+                    "url": f"/snapshots/{transfer.token}",
                 }))
 
             elif command == "load":
-                save_state = data.get("state")
-                if not isinstance(save_state, dict):
-                    await ws.send_str(json.dumps({
-                        "type": "status",
-                        "running": state["sim_running"],
-                        "max_speed": state["max_speed"],
-                        "error": "invalid_state"
-                    }))
-                    continue
-
-                try:
-                    # создаём новый мир из словаря
-                    new_world = World.from_dict(save_state)
-                    state["world"] = new_world
-                    state["last_state"] = build_render_state(new_world)
-                    state["sim_running"] = True  # после загрузки продолжаем симуляцию
-
-                    print(f"📂 World loaded via WS (client), tick={new_world.tick}")
-
-                    # отправим статус и один кадр, чтобы фронт сразу обновился
-                    await ws.send_str(json.dumps({
-                        "type": "status",
-                        "running": state["sim_running"],
-                        "max_speed": state["max_speed"],
-                        "loaded_tick": new_world.tick
-                    }))
-                    await ws.send_str(json.dumps(state["last_state"]))
-
-                except Exception as e:
-                    print(f"❌ Load failed: {e}")
-                    await ws.send_str(json.dumps({
-                        "type": "status",
-                        "running": state["sim_running"],
-                        "max_speed": state["max_speed"],
-                        "error": "load_failed"
-                    }))
+                # файл сохранения клиент отправит POST-запросом на выданный адрес
+                transfer = request.app[TRANSFERS].issue(session, LOAD)
+                await ws.send_str(json.dumps({
+                    "type": "load",
+                    "url": f"/snapshots/{transfer.token}",
+                }))
 
+    except SessionLost:
+        await ws.send_str(status_message(session, error="world_lost"))
+        await ws.close()
     finally:
         print("❌ Клиент отключён")
+        CLIENTS.dec()
         sim_task.cancel()
         await asyncio.gather(sim_task, return_exceptions=True)
+        # мир ждёт переподключения, без клиента со временем выгружается на диск (Scheduler.sweep)
+        scheduler.detach(session)
 
     return ws
 
 
-# === Формирование облегчённого state для фронта ===
-def build_render_state(world: World) -> dict:
-    """Формирует облегчённое состояние для фронта (только отрисовка и статистика)."""
-    env = world.env
+# === Инициализация приложения ===
+WORLD_POOL = web.AppKey("world_pool", WorldPool)
+SCHEDULER = web.AppKey("scheduler", Scheduler)
+TRANSFERS = web.AppKey("transfers", TransferTokens)
 
-    substances = []
-    for (x, y), subs in env.grid.grid.items():
-        for s in subs:
-            if s.concentration <= 0:
-                continue
-            substances.append({
-                "x": x,
-                "y": y,
-                "type": s.type,
-                "concentration": s.concentration,
-            })
-
-    cells = [{"position": c.position, "color_hex": c.color_hex} for c in env.cells]
-
-    return {
-        "tick": world.tick,
-        "tick_time_ms": world.tick_time_ms,
-        "cell_radius": CELL_RADIUS,
-        "environment": {
-            "grid": {
-                "width": env.grid.width,
-                "height": env.grid.height,
-                "substances": substances,
-            },
-            "cells": cells,
-            "env_stats": env.env_stats.to_dict(),
-        },
-    }
+
+async def start_world_pool(app):
+    app[WORLD_POOL] = WorldPool()
+    app[WORLD_POOL].refill()
+
+
+async def stop_world_pool(app):
+    await app[WORLD_POOL].close()
+
+
+async def start_scheduler(app):
+    app[SCHEDULER] = Scheduler()
+    app[SCHEDULER].start()
+
+
+async def stop_scheduler(app):
+    await app[SCHEDULER].shutdown()
+
+
+async def start_transfers(app):
+    app[TRANSFERS] = TransferTokens()
+
+
+async def stop_transfers(app):
+    app[TRANSFERS].close()
 
 
-# === Инициализация приложения ===
 app = web.Application()
+app.on_startup.append(start_world_pool)
+app.on_startup.append(start_scheduler)
+app.on_startup.append(start_transfers)
+app.on_cleanup.append(stop_world_pool)
+app.on_cleanup.append(stop_scheduler)
+app.on_cleanup.append(stop_transfers)
 app.router.add_get("/", index)
 app.router.add_get("/ws", websocket_handler)
+app.router.add_get("/snapshots/{token}", snapshot_download)
+app.router.add_post("/snapshots/{token}", snapshot_upload)
+app.router.add_get("/metrics", metrics)
+app.router.add_get("/admin/load", admin_load)
+app.router.add_post("/admin/sessions/{session_id}", admin_session)
 app.router.add_static("/static/", path=os.path.join(os.getcwd(), "static"), name="static")
 
 if __name__ == "__main__":
@@ -0,0 +1,131 @@
+"""
+Передача сохранений мира по HTTP вместо сообщений WebSocket.
+
+По WebSocket клиент получает только одноразовый токен, а сам снимок идёт
+отдельным HTTP-запросом:
+  * скачивание (GET /snapshots/<token>) — воркер мира пишет снимок в
+    сжатый временный файл, сервер отдаёт его кусками (chunked); если клиент
+    не принимает gzip, куски распаковываются на лету;
+  * загрузка (POST /snapshots/<token>) — тело запроса кусками пишется во
+    временный файл, мир из него читает воркер.
+
+Мир не проходит через процесс сервера целиком, чтение и запись файла
+выполняются в потоках — event loop не блокируется даже на снимках в
+сотни мегабайт.
+"""
+import asyncio
+import os
+import secrets
+import time
+import zlib
+from typing import Dict
+
+from aiohttp import web
+
+from config import SAVES_DIR, SNAPSHOT_TOKEN_TTL, SNAPSHOT_CHUNK_BYTES
+
+SAVE = "save"
+LOAD = "load"
+
+
+class Transfer:
+    """Одна выданная передача: чья сессия, в какую сторону, временный файл."""
+
+    def __init__(self, token: str, session: "Session", kind: str, path: str, ttl: float):
+        self.token = token
+        self.session = session
+        self.kind = kind
+        self.path = path
+        self.expires = time.monotonic() + ttl
+
+    def discard(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+class TransferTokens:
+    """Одноразовые токены передачи снимков и их временные файлы."""
+
+    def __init__(self, directory: str = os.path.join(SAVES_DIR, "transfers"), ttl: float = SNAPSHOT_TOKEN_TTL):
+        self.directory = os.path.abspath(directory)
+        self.ttl = ttl
+        self.transfers: Dict[str, Transfer] = {}
+
+    def issue(self, session: "Session", kind: str) -> Transfer:
+        self.expire()
+        os.makedirs(self.directory, exist_ok=True)
+        token = secrets.token_urlsafe(24)
+        path = os.path.join(self.directory, f"{token}.json.gz" if kind == SAVE else f"{token}.upload")
+        transfer = Transfer(token, session, kind, path, self.ttl)
+        self.transfers[token] = transfer
+        return transfer
+
+    def take(self, token: str, kind: str) -> Transfer | None:
+        """Забирает токен (повторно им воспользоваться нельзя); просроченный — None."""
+        transfer = self.transfers.get(token)
+        if transfer is None or transfer.kind != kind:
+            return None
+        del self.transfers[token]
+        if transfer.expires < time.monotonic():
+            transfer.discard()
+            return None
+        return transfer
+
+    def expire(self):
+        now = time.monotonic()
+        for token, transfer in list(self.transfers.items()):
+            if transfer.expires < now:
+                del self.transfers[token]
+                transfer.discard()
+
+    def close(self):
+        for transfer in self.transfers.values():
+            transfer.discard()
+        self.transfers.clear()
+
+
+def _read_chunk(f, decompressor) -> bytes:
+    chunk = f.read(SNAPSHOT_CHUNK_BYTES)
+    if decompressor is None:
+        return chunk
+    return decompressor.decompress(chunk) if chunk else decompressor.flush()
+
+
+async def send_file(request: web.Request, path: str, filename: str) -> web.StreamResponse:
+    """Отдаёт сжатый снимок кусками (gzip как Content-Encoding или распакованный JSON)."""
+    gzip_ok = "gzip" in request.headers.get("Accept-Encoding", "")
+    response = web.StreamResponse(headers={
+        "Content-Type": "application/json",
+        "Content-Disposition": f'attachment; filename="{filename}"',
+    })
+    if gzip_ok:
+        response.headers["Content-Encoding"] = "gzip"
+    response.enable_chunked_encoding()
+    await response.prepare(request)
+
+    decompressor = None if gzip_ok else zlib.decompressobj(16 + zlib.MAX_WBITS)
+    loop = asyncio.get_running_loop()
+    with open(path, "rb") as f:
+        while True:
+            chunk = await loop.run_in_executor(None, _read_chunk, f, decompressor)
+            if not chunk:
+                break
+            await response.write(chunk)
+    await response.write_eof()
+    return response
+
+
+async def receive_file(request: web.Request, path: str) -> int:
+    """
+    Пишет тело запроса в файл кусками; возвращает число байт. Content-Encoding: gzip
+    распаковывает aiohttp, сжатый файл без заголовка распознаёт World.load.
+    """
+    loop = asyncio.get_running_loop()
+    size = 0
+    with open(path, "wb") as f:
+        async for chunk in request.content.iter_chunked(SNAPSHOT_CHUNK_BYTES):
+            await loop.run_in_executor(None, f.write, chunk)
+            size += len(chunk)
+    return size
@@ -0,0 +1,51 @@
+"""
+Общие заготовки тестов: небольшой мир с фиксированным seed и сравнимое
+состояние мира. Тесты запускаются из корня репозитория: python -m pytest -q
+"""
+import os
+import random
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from helpers import populate_world  # noqa: E402
+from models.world import World  # noqa: E402
+from models.world_config import WorldConfig  # noqa: E402
+
+
+def build_world(seed: int = 1, size: int = 30, ticks: int = 0, **overrides) -> World:
+    """Мир size × size (populate_world после random.seed(seed)), посчитавший ticks тиков."""
+    random.seed(seed)
+    world = World(size, size, config=WorldConfig(**{"auto_save": False, **overrides}))
+    populate_world(world)
+    for _ in range(ticks):
+        world.update()
+    return world
+
+
+def world_state(world: World) -> tuple:
+    """
+    Состояние мира для сравнения прогонов: клетки по порядку и сетка веществ.
+    id клеток и видов не входят — их счётчики общие на процесс.
+    """
+    cells = [
+        (c.position, c.velocity, c.energy, c.health, c.age, c.alive, c.color_hex, c.mutation_rate)
+        for c in world.env.cells
+    ]
+    grid = {pos: dict(tile) for pos, tile in world.env.grid.grid.items()}
+    return world.tick, cells, grid
+
+
+@pytest.fixture
+def make_world():
+    return build_world
+
+
+@pytest.fixture
+def saves_dir(tmp_path, monkeypatch):
+    """Автосохранения и журналы миров — во временный каталог."""
+    import models.world
+    monkeypatch.setattr(models.world, "SAVES_DIR", str(tmp_path))
+    return tmp_path
@@ -0,0 +1,132 @@
+"""Режимы ускорения дают тот же результат, что и прямой расчёт."""
+import numpy as np
+import pytest
+
+from conftest import build_world, world_state
+from models.cell import Cell
+from models.environment import Environment
+from models.genome import GenomeEngine, RECEPTOR_UNKNOWN, _receptor_name, decode_gene, encode_genes
+from models.substance_grid import SubstanceGrid
+from models.world_config import WorldConfig
+
+
+def test_trigger_cache_matches_direct_checks():
+    cached = build_world(ticks=30, trigger_cache=True)
+    direct = build_world(ticks=30, trigger_cache=False)
+    assert world_state(cached) == world_state(direct)
+
+
+def test_deferred_writes_apply_like_immediate_writes():
+    config = WorldConfig(deferred_substance_writes=True)
+    deferred = SubstanceGrid(10, 10, config)
+    immediate = SubstanceGrid(10, 10, WorldConfig(deferred_substance_writes=False))
+    records = [(1, 1, 0, 2.0), (1, 1, 0, 0.5), (3, 4, 1, 1.0), (9, 9, 2, 0.25), (12, 0, 0, 1.0)]
+
+    deferred.begin_writes()
+    immediate.begin_writes()
+    for x, y, sid, amount in records:
+        deferred.add_concentration(x, y, sid, amount)
+        immediate.add_concentration(x, y, sid, amount)
+    # до конца фазы записи не видны
+    assert deferred.grid == {}
+    deferred.flush_writes()
+    immediate.flush_writes()
+
+    assert deferred.grid == immediate.grid == {(1, 1): {0: 2.5}, (3, 4): {1: 1.0}, (9, 9): {2: 0.25}}
+
+
+def test_deferred_writes_are_reproducible():
+    first = build_world(ticks=30, deferred_substance_writes=True)
+    second = build_world(ticks=30, deferred_substance_writes=True)
+    assert world_state(first) == world_state(second)
+
+
+def test_numpy_backend_fires_the_same_genes():
+    world = build_world(ticks=40)
+    env = world.env
+    cells = [c for c in env.cells if c.alive]
+
+    expected = []
+    for cell in cells:
+        for gene in cell.genes:
+            value = gene.receptor_value(cell, env) if gene.active else None
+            expected.append(value is not None and gene.trigger.check(value))
+
+    table = GenomeEngine(world.config.substances, seed=1).population_table(cells)
+    values = table.receptor_values(env.grid)
+    fired = (table.less & (values < table.threshold)) | (table.greater & (values > table.threshold))
+    assert fired.tolist() == expected
+
+
+def test_numpy_backend_keeps_unknown_receptors(make_world):
+    world = make_world(ticks=1)
+    cell = world.env.cells[0]
+    cell.genes[0].receptor = "NOT_A_SUBSTANCE"
+    rows = encode_genes(cell.genes, world.config.substances)
+    assert rows["receptor"][0] == RECEPTOR_UNKNOWN
+    assert _receptor_name(RECEPTOR_UNKNOWN, world.config.substances) is None
+    with pytest.raises(ValueError):
+        decode_gene(rows[0], world.config.substances)
+
+    engine = GenomeEngine(world.config.substances, seed=1)
+    row = rows[0].copy()
+    row["threshold"] = 1.5
+    engine._write_back(cell.genes[0], row)
+    assert cell.genes[0].receptor == "NOT_A_SUBSTANCE"
+    assert cell.genes[0].trigger.threshold == 1.5
+
+
+def _physics_env(sleep_ticks: int) -> Environment:
+    """Спящие клетки далеко друг от друга, бодрствующие толкаются рядом с ними."""
+    env = Environment(20, 20, WorldConfig(sleep_ticks=sleep_ticks))
+    layout = [
+        ((2.0, 2.0), 11), ((8.0, 2.0), 11), ((2.0, 8.0), 11),  # спят
+        ((8.3, 2.2), 0), ((8.9, 2.5), 0), ((5.0, 5.0), 0), ((5.4, 5.1), 0),
+    ]
+    for position, rest in layout:
+        cell = Cell(position=position, velocity=(0.001, -0.002), genes=[])
+        cell.rest_ticks = rest if sleep_ticks else 0
+        env.cells.append(cell)
+    return env
+
+
+def test_sleeping_pairs_skip_only_non_overlapping_checks():
+    asleep = _physics_env(sleep_ticks=10)
+    awake = _physics_env(sleep_ticks=0)
+    asleep.apply_physics()
+    awake.apply_physics()
+    assert [c.velocity for c in asleep.cells] == [c.velocity for c in awake.cells]
+    # контакт с бодрствующей будит спящую клетку, остальные спят дальше
+    assert [c.rest_ticks for c in asleep.cells[:3]] == [11, 0, 11]
+
+
+def test_sleeping_cell_keeps_its_velocity():
+    env = Environment(20, 20, WorldConfig(sleep_ticks=3, sleep_velocity=0.005))
+    cell = Cell(position=(10.0, 10.0), velocity=(0.002, 0.001), genes=[])
+    cell.rest_ticks = 3
+    env.cells.append(cell)
+
+    env.apply_physics()
+    assert cell.rest_ticks == 4
+    assert cell.velocity == (0.002, 0.001)
+
+    before = cell.position
+    cell.move(env)
+    assert cell.position == before
+    assert cell.velocity == (0.002, 0.001)
+
+    # пробуждение: движение продолжается с сохранённой скоростью
+    cell.rest_ticks = 0
+    cell.move(env)
+    friction = env.config.friction
+    assert cell.position == (10.0 + 0.002 * friction, 10.0 + 0.001 * friction)
+
+
+def test_population_table_cache_matches_fresh_table():
+    world = build_world(ticks=20, genome_backend="numpy")
+    engine = world.env.genome_engine
+    cells = [c for c in world.env.cells if c.alive]
+    cached = engine.population_table(cells)
+    fresh = GenomeEngine(world.config.substances, seed=1).population_table(cells)
+    assert np.array_equal(cached.rows, fresh.rows)
+    assert np.array_equal(cached.owner, fresh.owner)
@@ -0,0 +1,93 @@
+"""Журнал событий: запись, чтение по ключевым кадрам, воспроизведение."""
+import asyncio
+
+from conftest import build_world
+from models.event_log import KEYFRAME, MOTION, EventLogReader, ReplayWorld
+
+
+def _record(path, ticks: int, **overrides):
+    world = build_world(ticks=1, **overrides)
+    world.start_recording(str(path))
+    positions = {}
+    for _ in range(ticks):
+        world.update()
+        positions[world.tick] = {c.id: c.position for c in world.env.cells if c.alive}
+    world.stop_recording()
+    return world, positions
+
+
+def test_keyframes_reach_the_disk_while_recording(tmp_path):
+    path = tmp_path / "live.evlog"
+    world = build_world(ticks=1)
+    world.start_recording(str(path))
+    # журнал ещё пишется: первый ключевой кадр уже читается
+    replay = ReplayWorld(str(path))
+    replay.update()
+    assert replay.tick == world.tick
+    assert {c.id for c in replay.env.cells} == {c.id for c in world.env.cells if c.alive}
+    replay.close()
+    world.stop_recording()
+
+
+def test_replay_matches_the_world_on_motion_records(tmp_path):
+    path = tmp_path / "world.evlog"
+    world, positions = _record(path, 40, event_log_keyframe_period=20, event_log_motion_period=10)
+
+    replay = ReplayWorld(str(path))
+    checked = 0
+    while not replay.finished:
+        replay.update()
+        if replay.tick % 10 == 0 and replay.tick in positions:
+            cells = {c.id: c.position for c in replay.env.cells}
+            expected = positions[replay.tick]
+            assert cells.keys() == expected.keys()
+            for cell_id, (x, y) in expected.items():
+                rx, ry = cells[cell_id]
+                assert abs(rx - x) < 1e-3 and abs(ry - y) < 1e-3
+            checked += 1
+    replay.close()
+    assert checked >= 3
+    assert replay.tick == world.tick
+
+
+def test_seek_keyframe_gives_the_same_state_as_playing_through(tmp_path):
+    path = tmp_path / "world.evlog"
+    _record(path, 60, event_log_keyframe_period=20)
+
+    reader = EventLogReader(str(path))
+    kinds = []
+    while (record := reader.next()) is not None:
+        kinds.append(record[0])
+    assert kinds.count(KEYFRAME) >= 3 and MOTION in kinds
+    assert reader.seek_keyframe(45) == max(t for t, _ in reader.keyframes if t <= 45)
+    reader.close()
+
+    straight = ReplayWorld(str(path))
+    while straight.tick < 50:
+        straight.update()
+    seeked = ReplayWorld(str(path))
+    seeked.seek(45)
+    while seeked.tick < 50:
+        seeked.update()
+    assert sorted((c.id, c.position) for c in seeked.env.cells) == \
+        sorted((c.id, c.position) for c in straight.env.cells)
+    straight.close()
+    seeked.close()
+
+
+def test_close_during_threaded_update_waits_for_it(tmp_path):
+    path = tmp_path / "world.evlog"
+    _record(path, 60)
+
+    async def main():
+        replay = ReplayWorld(str(path), ticks_per_update=60)
+        update = asyncio.create_task(asyncio.to_thread(replay.update))
+        await asyncio.sleep(0)
+        replay.close()
+        await update
+        assert replay.closed and replay.reader.file.closed
+        tick = replay.tick
+        replay.update()  # после close — ничего не делает
+        assert replay.tick == tick
+
+    asyncio.run(main())
@@ -0,0 +1,107 @@
+"""Сохранение и загрузка мира, таблица веществ, родословная."""
+import json
+import random
+
+from conftest import build_world, world_state
+from models.cell import Cell
+from models.lineage import Lineage
+from models.substance_registry import SubstanceRegistry
+from models.world import World
+
+
+def test_dict_round_trip_keeps_the_world():
+    world = build_world(ticks=25)
+    data = json.loads(json.dumps(world.to_dict()))
+    loaded = World.from_dict(data)
+
+    assert world_state(loaded) == world_state(world)
+    assert [(c.id, c.species_id) for c in loaded.env.cells] == [(c.id, c.species_id) for c in world.env.cells]
+    assert json.loads(json.dumps(loaded.to_dict())) == data
+
+
+def test_loaded_world_continues_like_the_original():
+    world = build_world(ticks=20)
+    loaded = World.from_dict(json.loads(json.dumps(world.to_dict())))
+    for w in (world, loaded):
+        random.seed(7)
+        for _ in range(10):
+            w.update()
+    assert world_state(loaded) == world_state(world)
+
+
+def test_file_round_trip(tmp_path):
+    world = build_world(ticks=10)
+    path = tmp_path / "world.json.gz"
+    world.save(str(path))
+    with open(path, "rb") as f:
+        assert f.read(2) == b"\x1f\x8b"
+    assert world_state(World.load(str(path))) == world_state(world)
+
+
+def test_loaded_cells_keep_ids_and_reserve_them():
+    world = build_world(ticks=5)
+    cell = world.env.cells[0]
+    data = json.loads(json.dumps(cell.to_dict()))
+    data["id"] = Cell._next_id + 1000
+    data["species_id"] = Cell._next_species_id + 1000
+
+    loaded = Cell.from_dict(data)
+    assert (loaded.id, loaded.species_id) == (data["id"], data["species_id"])
+    assert loaded.color_hex == cell.color_hex
+    assert [g.to_dict() for g in loaded.genes] == [g.to_dict() for g in cell.genes]
+    assert Cell.new_id() > loaded.id
+    assert Cell.new_species_id() > loaded.species_id
+
+
+def test_substance_ids_survive_clear_and_reload():
+    registry = SubstanceRegistry()
+    registry["A"] = {"type": "ORGANIC", "energy": 1.0}
+    registry["B"] = {"type": "TOXIN", "energy": -1.0}
+    ids = dict(registry.ids)
+
+    registry.load({"B": {"type": "TOXIN", "energy": -2.0}, "C": {"type": "INORGANIC", "energy": 0.5}})
+    assert registry.ids["A"] == ids["A"] and registry.ids["B"] == ids["B"]
+    assert registry.ids["C"] == 2
+    assert list(registry) == ["B", "C"]
+    assert registry["B"]["energy"] == -2.0
+
+
+class _Cell:
+    """Клетка для родословной: только то, что читает Lineage."""
+
+    def __init__(self, id_: int, species_id: int, age: int = 0):
+        self.id = id_
+        self.species_id = species_id
+        self.color_hex = "#102030"
+        self.age = age
+        self.alive = True
+
+
+def test_lineage_prune_splices_single_child_chains():
+    lineage = Lineage()
+    root = _Cell(1, 10)
+    lineage.adopt(root)
+    # цепочка 1 -> 2 -> 3 и ветка 1 -> 4, затем вымирают все, кроме 3 и 4
+    middle, leaf, other = _Cell(2, 10), _Cell(3, 10), _Cell(4, 10)
+    lineage.tick = 1
+    lineage.birth(middle, root)
+    lineage.tick = 2
+    lineage.birth(leaf, middle)
+    lineage.birth(other, root)
+    leaf.species_id = 11
+    lineage.speciate(leaf, 10)
+    lineage.tick = 3
+    lineage.death(root)
+    lineage.death(middle)
+    root.alive = middle.alive = False
+
+    lineage.prune([leaf, other])
+    # звено 2 склеено: у 3 сразу предок 1 (точка ветвления)
+    assert lineage.cell_ancestors(3) == [1]
+    assert lineage.cell_ancestors(4) == [1]
+    assert 2 not in lineage.cell_slot
+    assert lineage.species_ancestors(11) == [10]
+
+    restored = Lineage.from_dict(json.loads(json.dumps(lineage.to_dict())))
+    assert restored.to_dict() == lineage.to_dict()
+    assert restored.cell_ancestors(3) == [1]
@@ -0,0 +1,139 @@
+"""Планировщик: ведро токенов, очередь воркера, выгрузка миров, падение воркера."""
+import asyncio
+import os
+
+import pytest
+
+import scheduler
+from conftest import build_world, world_state
+from scheduler import Scheduler, Session, SessionLost
+
+
+def test_token_bucket_limits_ticks_per_second():
+    session = Session()
+    session.max_tps = 10
+    start = session.tokens_time
+
+    assert session.take_ticks(100, now=start) == 0
+    assert session.take_ticks(100, now=start + 0.5) == 5
+    assert session.take_ticks(100, now=start + 0.75) == 2
+    # простой не копится дольше секунды: ёмкость ведра — max_tps
+    session.last_ack = start + 60
+    assert session.take_ticks(100, now=start + 60) == 10
+    # без подтверждений клиента мир притормаживается до SCHEDULER_IDLE_TPS
+    assert session.take_ticks(100, now=start + 60 + scheduler.SCHEDULER_IDLE_SECONDS + 10) \
+        == int(scheduler.SCHEDULER_IDLE_TPS)
+
+
+def test_unlimited_and_suspended_sessions():
+    session = Session()
+    session.max_tps = 0
+    assert session.take_ticks(250) == 250
+
+    session.last_ack -= scheduler.SCHEDULER_SUSPEND_SECONDS + 1
+    assert session.activity() == "suspended"
+    assert session.take_ticks(250) == 0
+    # фоновая вкладка в режиме max speed не притормаживается
+    session.max_speed = True
+    assert session.activity() == "active"
+
+
+def test_worker_runs_the_session_with_least_virtual_time_first(tmp_path):
+    async def main():
+        s = Scheduler(workers=0, frame_pipeline="serial", sessions_dir=str(tmp_path))
+        s.start()
+        first = await s.open(build_world(seed=1))
+        second = await s.open(build_world(seed=2))
+        worker = first.worker
+        assert second.worker is worker
+
+        first.vtime, second.vtime = 5.0, 1.0
+        order = []
+
+        async def memory(session):
+            await worker.call(session, "memory")
+            order.append(session)
+
+        await asyncio.gather(memory(first), memory(second))
+        assert order == [second, first]
+        # новая сессия не получает «долга»: её время — минимальное у воркера
+        third = await s.open(build_world(seed=3))
+        assert third.vtime < first.vtime
+        await s.shutdown()
+
+    asyncio.run(main())
+
+
+def test_hibernate_round_trip(tmp_path):
+    async def main():
+        s = Scheduler(workers=0, frame_pipeline="serial", sessions_dir=str(tmp_path))
+        s.start()
+        session = await s.open(build_world(ticks=3))
+        await s.advance(session, 5, render=False)
+        before = world_state(scheduler._WORLDS[session.id])
+
+        assert await s.hibernate(session)
+        assert session.worker is None and os.path.exists(session.snapshot_path)
+        assert session.id not in scheduler._WORLDS
+        path = session.snapshot_path
+
+        assert await s.advance(session, 0, render=True) is not None
+        assert session.snapshot_path is None and not os.path.exists(path)
+        assert world_state(scheduler._WORLDS[session.id]) == before
+        assert session.tick == before[0]
+        await s.shutdown()
+
+    asyncio.run(main())
+
+
+def test_shutdown_hibernates_and_next_start_restores(tmp_path):
+    async def main():
+        s = Scheduler(workers=0, frame_pipeline="serial", sessions_dir=str(tmp_path))
+        s.start()
+        session = await s.open(build_world(ticks=2))
+        await s.advance(session, 3, render=False)
+        before = world_state(scheduler._WORLDS[session.id])
+        await s.shutdown()
+        assert os.listdir(tmp_path) == [f"{session.token}.json.gz"]
+
+        restarted = Scheduler(workers=0, frame_pipeline="serial", sessions_dir=str(tmp_path))
+        restarted.start()
+        resumed = restarted.attach(session.token)
+        assert resumed is not None
+        await restarted.advance(resumed, 0, render=False)
+        assert world_state(scheduler._WORLDS[resumed.id]) == before
+        await restarted.shutdown()
+
+    asyncio.run(main())
+
+
+def _kill(worker):
+    for process in list(worker.executor._processes.values()):
+        process.kill()
+
+
+def test_crashed_worker_restores_sessions_from_autosave(tmp_path, monkeypatch):
+    # процесс-воркер пишет автосохранения относительно рабочего каталога
+    monkeypatch.chdir(tmp_path)
+
+    async def main():
+        s = Scheduler(workers=1, frame_pipeline="serial", sessions_dir=str(tmp_path / "sessions"))
+        s.start()
+        saved = await s.open(build_world(auto_save=True, tick_save_period=5))
+        unsaved = await s.open(build_world(seed=2))
+        await s.advance(saved, 7, render=False)
+        await s.advance(unsaved, 3, render=False)
+        assert saved.last_save is not None and unsaved.last_save is None
+
+        _kill(saved.worker)
+        # мир с автосохранением продолжается с тика сохранения
+        await s.advance(saved, 1, render=False)
+        assert saved.tick == 6
+        # мир без автосохранения потерян, сессия закрыта
+        with pytest.raises(SessionLost):
+            await s.advance(unsaved, 1, render=False)
+        await asyncio.sleep(0)
+        assert unsaved.id not in s.sessions
+        await s.shutdown()
+
+    asyncio.run(main())
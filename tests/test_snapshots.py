@@ -0,0 +1,35 @@
+"""Одноразовые токены передачи снимков."""
+import os
+import time
+
+from snapshots import LOAD, SAVE, TransferTokens
+
+
+def test_token_is_single_use_and_bound_to_its_direction(tmp_path):
+    tokens = TransferTokens(directory=str(tmp_path), ttl=60)
+    session = object()
+    transfer = tokens.issue(session, SAVE)
+
+    assert tokens.take(transfer.token, LOAD) is None
+    taken = tokens.take(transfer.token, SAVE)
+    assert taken is transfer and taken.session is session
+    assert tokens.take(transfer.token, SAVE) is None
+
+
+def test_expired_token_discards_its_file(tmp_path):
+    tokens = TransferTokens(directory=str(tmp_path), ttl=60)
+    transfer = tokens.issue(object(), LOAD)
+    with open(transfer.path, "wb") as f:
+        f.write(b"partial upload")
+    transfer.expires = time.monotonic() - 1
+
+    assert tokens.take(transfer.token, LOAD) is None
+    assert not os.path.exists(transfer.path)
+
+
+def test_issue_drops_expired_tokens(tmp_path):
+    tokens = TransferTokens(directory=str(tmp_path), ttl=60)
+    old = tokens.issue(object(), SAVE)
+    old.expires = time.monotonic() - 1
+    fresh = tokens.issue(object(), SAVE)
+    assert list(tokens.transfers) == [fresh.token]
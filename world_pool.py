@@ -0,0 +1,77 @@
+"""
+Пул заранее подготовленных миров для новых WebSocket-подключений.
+
+Создание мира (World + populate_world или загрузка шаблона) выполняется
+в фоновом потоке, а не в обработчике подключения: клиент сразу получает
+готовый мир, остальные клиенты не ждут, пока строится чужой мир.
+
+Используется поток, а не процесс: id клеток и видов уникальны в пределах
+процесса (см. Cell.new_id).
+"""
+import asyncio
+import json
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from config import WORLD_WIDTH, WORLD_HEIGHT, WORLD_POOL_SIZE, WORLD_POOL_TEMPLATE
+from helpers import populate_world
+from models.world import World
+
+
+class WorldPool:
+    """Держит до size готовых миров и пополняется в фоне после каждой выдачи."""
+
+    def __init__(self, size: int = WORLD_POOL_SIZE, template: str | None = WORLD_POOL_TEMPLATE):
+        self.size = max(0, size)
+        self.template = template
+        self.template_data: dict | None = None
+        self.ready: deque[World] = deque()
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="world-pool")
+        self.refill_task: asyncio.Task | None = None
+
+    def make_world(self) -> World:
+        """Создаёт новый мир (вызывается в потоке пула)."""
+        if self.template:
+            if self.template_data is None:
+                with open(self.template, "r", encoding="utf-8") as f:
+                    self.template_data = json.load(f)
+            world = World.from_dict(self.template_data)
+            world.uuid = str(uuid.uuid4())  # автосохранения копий шаблона не должны смешиваться
+            return world
+
+        world = World(WORLD_WIDTH, WORLD_HEIGHT)
+        populate_world(world)
+        return world
+
+    async def acquire(self) -> World:
+        """Отдаёт готовый мир (или дожидается нового, если пул пуст) и запускает пополнение."""
+        if self.ready:
+            world = self.ready.popleft()
+        else:
+            loop = asyncio.get_running_loop()
+            world = await loop.run_in_executor(self.executor, self.make_world)
+        self.refill()
+        return world
+
+    def refill(self):
+        """Запускает фоновое пополнение пула, если оно ещё не идёт."""
+        if self.refill_task is None or self.refill_task.done():
+            self.refill_task = asyncio.create_task(self._refill())
+
+    async def _refill(self):
+        loop = asyncio.get_running_loop()
+        while len(self.ready) < self.size:
+            try:
+                world = await loop.run_in_executor(self.executor, self.make_world)
+            except Exception as e:
+                print(f"❌ World pool refill failed: {e}")
+                return
+            self.ready.append(world)
+
+    async def close(self):
+        if self.refill_task is not None:
+            self.refill_task.cancel()
+            await asyncio.gather(self.refill_task, return_exceptions=True)
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.ready.clear()